@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：归档已完成的历史订单
+- 将完成超过 N 天的订单及其订单记录分批移动到归档表 (orders_archive, order_records_archive)
+- 归档后的订单可在「我的订单」页面通过 include_archived=1 查看
+- 适合通过 cron 定期执行，例如每天凌晨:
+    0 3 * * * cd /home/adminses/My_Projects/shopping_website && venv/bin/python archive_orders.py --days 90
+"""
+
+import argparse
+
+from app import app
+from shop.extensions import db
+from shop.archive import archive_completed_orders
+
+def main():
+    parser = argparse.ArgumentParser(description='归档已完成的历史订单')
+    parser.add_argument('--days', type=int, default=90, help='归档完成超过多少天的订单（默认 90）')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批归档的订单数（默认 500）')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        # 确保归档表存在
+        db.create_all()
+        print(f"正在归档 {args.days} 天前已完成的订单...")
+        archived = archive_completed_orders(args.days, batch_size=args.batch_size)
+        print(f"✅ 已归档 {archived} 个订单")
+
+if __name__ == '__main__':
+    main()
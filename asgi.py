@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASGI 入口
+
+与 WSGI 入口 (app:app) 并存，使用方法:
+    gunicorn --config gunicorn_asgi_config.py asgi:application
+
+请求体和响应体的收发都在事件循环中异步完成，慢速上传和慢速客户端不再占用线程；
+只有 Flask 处理函数本身（数据库和文件操作）在有界线程池中执行。
+"""
+
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+
+# 请求体超过该大小时从内存转存到临时文件
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# _read_body 的返回值：客户端在请求体发送完之前断开了连接
+DISCONNECTED = object()
+
+
+class FlaskASGI:
+    """Serve a WSGI application over ASGI with a bounded handler thread pool"""
+
+    def __init__(self, wsgi_app, max_threads, max_content_length=None):
+        self.wsgi_app = wsgi_app
+        self.max_content_length = max_content_length
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='asgi-handler')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        body = await self._read_body(receive)
+        if body is DISCONNECTED:
+            # The body is incomplete and nobody is left to answer: never run the app on it
+            return
+        if body is None:
+            await self._send_simple(send, 413, b'Request Entity Too Large')
+            return
+
+        try:
+            await self._run_wsgi(scope, body, send)
+        finally:
+            body.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        """Receive the whole request body without blocking a thread
+
+        Returns None if it is too large, DISCONNECTED if the client went away first.
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return DISCONNECTED
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if self.max_content_length and size > self.max_content_length:
+                body.close()
+                return None
+            body.write(chunk)
+            more_body = message.get('more_body', False)
+        body.seek(0)
+        return body
+
+    async def _send_simple(self, send, status, content):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain'), (b'content-length', str(len(content)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    def _build_environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1')
+            value = value.decode('latin-1')
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'content-length':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def _run_wsgi(self, scope, body, send):
+        loop = asyncio.get_running_loop()
+        environ = self._build_environ(scope, body)
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        def next_chunk(iterator):
+            # Generators (streamed responses) may query the database, so pull chunks in the pool too
+            for chunk in iterator:
+                if chunk:
+                    return chunk
+            return None
+
+        result = await loop.run_in_executor(self.executor, self.wsgi_app, environ, start_response)
+        try:
+            iterator = iter(result)
+            chunk = await loop.run_in_executor(self.executor, next_chunk, iterator)
+            await send({
+                'type': 'http.response.start',
+                'status': response_start['status'],
+                'headers': response_start['headers']
+            })
+            if chunk is None:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            while chunk is not None:
+                following = await loop.run_in_executor(self.executor, next_chunk, iterator)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': following is not None})
+                chunk = following
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
+
+
+# 异步工作进程下慢速连接不占用工作进程，开启管理后台的实时事件流
+app.config['SSE_ENABLED'] = True
+
+application = FlaskASGI(
+    app,
+    max_threads=app.config['ASGI_THREADS'],
+    max_content_length=app.config.get('MAX_CONTENT_LENGTH')
+)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：数据库在线备份、WAL 检查点和恢复
+- backup: 使用 SQLite 在线备份 API 复制数据库（WAL 模式下读取一个快照，不阻塞下单），校验完整性后按数量轮换旧备份
+- checkpoint: 执行一次 WAL 检查点
+- daemon: 常驻运行，定期执行检查点和备份
+- list / verify / rotate: 查看备份、校验备份文件、删除超出保留数量的旧备份
+- restore: 从备份恢复（需先停止 Web 服务）
+使用方法:
+    python backup_db.py backup
+    python backup_db.py daemon
+    python backup_db.py restore backups/shopping_website.db.backup_20251119_122924
+也可以通过 cron 定期执行，例如每 6 小时:
+    0 */6 * * * cd /home/adminses/My_Projects/shopping_website && venv/bin/python backup_db.py backup
+"""
+
+import argparse
+import os
+import signal
+import sys
+import time
+
+from app import app
+from shop.backup import (BackupError, backup_database, checkpoint, list_backups,
+                         restore_backup, rotate_backups, sqlite_path, verify_backup)
+
+def run_backup(path, args):
+    print(f"正在备份 {path} ...")
+    backup_path, seconds = backup_database(
+        path, args.backup_dir,
+        pages_per_step=args.pages_per_step,
+        step_sleep=args.step_sleep,
+        max_seconds=args.max_seconds
+    )
+    size_mb = os.path.getsize(backup_path) / 1024 / 1024
+    print(f"✅ 备份完成并通过完整性校验: {backup_path} ({size_mb:.1f} MB, {seconds:.1f} 秒)")
+    for old in rotate_backups(path, args.backup_dir, args.keep):
+        print(f"🗑️  已删除旧备份: {old}")
+
+def run_checkpoint(path, mode):
+    busy, wal_pages, checkpointed = checkpoint(path, mode)
+    if wal_pages < 0:
+        print("ℹ️  数据库未使用 WAL 模式，无需检查点")
+    else:
+        print(f"✅ WAL 检查点 ({mode}): 已写回 {checkpointed}/{wal_pages} 页{'（有连接占用，下次继续）' if busy else ''}")
+
+def run_daemon(path, args):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    print(f"备份守护进程已启动: 每 {args.checkpoint_interval} 秒检查点，每 {args.interval} 秒备份")
+    next_checkpoint = time.monotonic() + args.checkpoint_interval
+    next_backup = time.monotonic()
+    try:
+        while not stopping:
+            now = time.monotonic()
+            backup_due = now >= next_backup
+            try:
+                if backup_due:
+                    run_backup(path, args)
+                    next_backup = now + args.interval
+                    # 备份刚读过整个数据库，顺便截断 WAL 文件
+                    run_checkpoint(path, 'TRUNCATE')
+                    next_checkpoint = now + args.checkpoint_interval
+                elif now >= next_checkpoint:
+                    run_checkpoint(path, 'PASSIVE')
+                    next_checkpoint = now + args.checkpoint_interval
+            except Exception as e:
+                # 单次失败不退出，下个周期重试
+                print(f"❌ {type(e).__name__}: {e}", file=sys.stderr)
+                if backup_due:
+                    next_backup = now + 60
+                next_checkpoint = now + args.checkpoint_interval
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    print("备份守护进程已停止")
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库在线备份、WAL 检查点和恢复')
+    parser.add_argument('--backup-dir', default=app.config['BACKUP_DIR'], help='备份目录')
+    parser.add_argument('--keep', type=int, default=app.config['BACKUP_KEEP'], help='保留的备份数量')
+    parser.add_argument('--pages-per-step', type=int, default=app.config['BACKUP_PAGES_PER_STEP'], help='每一步复制的页数')
+    parser.add_argument('--step-sleep', type=float, default=app.config['BACKUP_STEP_SLEEP'], help='每一步之间的休眠秒数')
+    parser.add_argument('--max-seconds', type=float, default=app.config['BACKUP_MAX_SECONDS'],
+                        help='非 WAL 模式下分步复制的最长时间（秒），超时报错')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('backup', help='立即备份一次')
+    checkpoint_parser = commands.add_parser('checkpoint', help='执行一次 WAL 检查点')
+    checkpoint_parser.add_argument('--mode', default='PASSIVE', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'])
+    daemon_parser = commands.add_parser('daemon', help='定期执行检查点和备份')
+    daemon_parser.add_argument('--interval', type=int, default=app.config['BACKUP_INTERVAL'], help='备份间隔（秒）')
+    daemon_parser.add_argument('--checkpoint-interval', type=int, default=app.config['WAL_CHECKPOINT_INTERVAL'], help='检查点间隔（秒）')
+    commands.add_parser('list', help='列出现有备份')
+    commands.add_parser('rotate', help='删除超出保留数量的旧备份')
+    verify_parser = commands.add_parser('verify', help='校验备份文件')
+    verify_parser.add_argument('file')
+    restore_parser = commands.add_parser('restore', help='从备份恢复（需先停止 Web 服务）')
+    restore_parser.add_argument('file')
+    restore_parser.add_argument('--yes', action='store_true', help='不再确认')
+    args = parser.parse_args()
+
+    try:
+        path = sqlite_path(app)
+        if args.command == 'backup':
+            run_backup(path, args)
+        elif args.command == 'checkpoint':
+            run_checkpoint(path, args.mode)
+        elif args.command == 'daemon':
+            run_daemon(path, args)
+        elif args.command == 'list':
+            backups = list_backups(path, args.backup_dir)
+            if not backups:
+                print(f"{args.backup_dir} 中没有备份")
+            for backup_path in backups:
+                print(f"{backup_path}  {os.path.getsize(backup_path) / 1024 / 1024:.1f} MB")
+        elif args.command == 'rotate':
+            removed = rotate_backups(path, args.backup_dir, args.keep)
+            for old in removed:
+                print(f"🗑️  已删除旧备份: {old}")
+            print(f"✅ 已删除 {len(removed)} 个旧备份")
+        elif args.command == 'verify':
+            problems = verify_backup(args.file)
+            if problems != ['ok']:
+                print(f"❌ 完整性校验失败: {args.file}")
+                for problem in problems[:20]:
+                    print(f"   {problem}")
+                sys.exit(1)
+            print(f"✅ 完整性校验通过: {args.file}")
+        elif args.command == 'restore':
+            if not args.yes:
+                answer = input(f"将用 {args.file} 覆盖 {path}，请确认 Web 服务已停止 [y/N]: ")
+                if answer.strip().lower() != 'y':
+                    print("已取消")
+                    return
+            saved = restore_backup(args.file, path)
+            if saved:
+                print(f"原数据库已保存为: {saved}")
+            print(f"✅ 已从 {args.file} 恢复数据库")
+    except BackupError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -24,12 +24,10 @@ rm -f cookies.txt
 rm -f images.jpeg
 echo "✅ 已删除临时文件"
 
-# 3. 删除数据库备份文件（保留最新的一个）
-echo "🗑️  删除旧的数据库备份文件..."
-rm -f shopping_website.db.backup_20251119_103826
-rm -f shopping_website.db.backup_20251119_111413
-# 保留最新的备份: shopping_website.db.backup_20251119_122924
-echo "✅ 已删除旧数据库备份（保留最新备份）"
+# 3. 轮换数据库备份文件（backups/ 中只保留最新的 BACKUP_KEEP 个）
+echo "🗑️  轮换旧的数据库备份文件..."
+venv/bin/python backup_db.py rotate
+echo "✅ 已删除旧数据库备份（保留最新的备份）"
 
 # 4. 删除开发过程中的说明文档（保留重要文档）
 echo "🗑️  删除开发说明文档..."
@@ -78,6 +76,6 @@ echo "📋 保留的重要文件："
 echo "  - README.md (项目说明)"
 echo "  - DEPLOYMENT.md (部署文档)"
 echo "  - 项目说明.md (项目说明)"
-echo "  - shopping_website.db.backup_20251119_122924 (最新数据库备份)"
+echo "  - backups/ (最新的数据库备份)"
 echo "=========================================="
 
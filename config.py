@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 from datetime import timedelta
 
@@ -8,8 +9,117 @@ class Config:
     
     # 文件上传配置
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+    # 订单记录图片（付款凭证等）保存在 static/ 之外，只能通过 /records/<id>/image 授权访问
+    RECORD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'private_uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     
+    # 订单记录图片通过 Nginx 内部位置（指向 RECORD_FOLDER）发送（X-Accel-Redirect），例如 /protected_records/
+    # 未设置时（开发环境）由 Flask 直接发送文件
+    RECORD_ACCEL_REDIRECT_PREFIX = os.environ.get('RECORD_ACCEL_REDIRECT_PREFIX')
+    
+    # 上传文件存储：local 保存在 UPLOAD_FOLDER；s3 保存在 S3 兼容对象存储中，多台应用服务器可以共享
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_PREFIX = os.environ.get('S3_PREFIX', 'uploads/')
+    S3_PRIVATE_PREFIX = os.environ.get('S3_PRIVATE_PREFIX', 'private/')  # 订单记录图片的前缀，不能在 S3_PREFIX 之下，永远不要公开
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # MinIO 等兼容服务，例如 http://127.0.0.1:9000；AWS S3 不需要设置
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL')  # 商品图片的公开地址（CDN 或只对 S3_PREFIX 公开读）；未设置时使用预签名 URL
+    STORAGE_URL_EXPIRES = 3600  # 预签名 URL 的有效期（秒），同一个 URL 在前一半有效期内重复使用
+    RECORD_URL_EXPIRES = 300  # 订单记录图片跳转到的预签名 URL 有效期（秒）
+    
+    # 订单号生成配置
+    # 每台主机必须使用不同的节点ID (0-15)，同一主机上的工作进程通过锁文件自动分配槽位
+    ORDER_NODE_ID = int(os.environ.get('ORDER_NODE_ID', 0))
+    ORDER_WORKER_LOCK_DIR = os.environ.get('ORDER_WORKER_LOCK_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+    
+    # 密码哈希配置
+    # 方案和强度，格式与 Werkzeug 哈希前缀一致，例如 pbkdf2:sha256:600000 或 scrypt:32768:8:1
+    # 修改后，旧哈希会在用户下次成功登录时自动升级
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    # 整台主机同时计算的哈希数上限（所有工作进程共享，通过 ORDER_WORKER_LOCK_DIR 中的锁文件分配），登录高峰时不占满 CPU
+    PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', max(1, multiprocessing.cpu_count() // 2)))
+    PASSWORD_HASH_WAIT = 3  # 等待空闲哈希槽位的最长时间（秒），超时返回 503
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))  # 每个 Web 工作进程的哈希进程数，0 表示在请求线程中计算
+    PASSWORD_HASH_TIMEOUT = 10  # 使用哈希进程时单次哈希等待的最长时间（秒）
+    
+    # 库存预留配置：加入购物车时为用户保留库存的时长
+    RESERVATION_TTL = timedelta(minutes=15)
+    
+    # 闪购模式：热门商品的库存拆分为多个计数器分片
+    FLASH_SALE_SHARDS = 8  # 默认分片数
+    FLASH_SALE_CACHE_SECONDS = 2  # 各进程缓存闪购商品列表的时长（秒）
+    
+    # 销售分析配置
+    SELL_THROUGH_DAYS = 14  # 按最近多少天的日均销量预测库存可售天数
+    LOW_STOCK_DAYS = 7  # 预计可售天数低于该值时列为低库存
+    
+    # 用户管理页每页显示的用户数
+    ADMIN_USERS_PAGE_SIZE = 50
+    
+    # 公开商品目录 API (/api/v1/products)
+    API_PAGE_SIZE = 50  # 默认每页商品数
+    API_MAX_PAGE_SIZE = 200  # limit 和 ids= 批量查询的上限
+    API_CACHE_SECONDS = 30  # Cache-Control max-age，客户端之后可用 ETag 条件请求
+    
+    # 订单事件投影（读模型）
+    PROJECTION_BATCH_SIZE = 500  # 每个事务应用的事件数
+    
+    # 幂等键配置（Idempotency-Key 请求头）
+    IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+    # 处理中的幂等键超过该时间仍没有响应时视为原请求已中断（工作进程被杀死），下一次重试接管；需长于 Gunicorn 的 timeout
+    IDEMPOTENCY_IN_FLIGHT_TIMEOUT = timedelta(seconds=60)
+    
+    # ASGI 入口（asgi.py）中执行 Flask 处理函数的线程池大小
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+    
+    # 管理员实时订单推送（SSE）配置
+    # 事件流在持续期间占用一个处理线程，只在 ASGI 入口（asgi.py 会设为 True）下开启；
+    # 同步工作进程下管理后台改为定期轮询 /admin/order_changes，不占用工作进程
+    SSE_ENABLED = False
+    SSE_STREAM_SECONDS = 25  # 单个事件流的最长持续时间，需小于 Gunicorn 的 timeout
+    SSE_RETRY_SECONDS = 2  # 事件流结束后浏览器重新连接的间隔（秒）
+    SSE_MAX_STREAMS = max(1, ASGI_THREADS // 4)  # 每个进程同时打开的事件流上限，超出的页面改为轮询
+    ADMIN_POLL_INTERVAL = 10  # 轮询模式下管理后台检查订单变化的间隔（秒）
+    
+    # 准入控制：按优先级 checkout > cart > browse > admin > upload 限制并发，超出预算时立即返回 503
+    # 预算是工作进程数的比例，且向下包含：例如 browse 的预算同时计入 admin 和 upload 请求，
+    # 所以任何时候至少有 20% 的工作进程只能被下单请求使用
+    ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', '1') != '0'
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))  # 与 gunicorn_config.py 的 workers 一致
+    ADMISSION_BUDGETS = {'cart': 0.8, 'browse': 0.6, 'admin': 0.4, 'upload': 0.2}
+    ADMISSION_RETRY_AFTER = 2  # 503 响应的 Retry-After（秒）
+    ADMISSION_BLUEPRINTS = {'orders': 'browse', 'cart': 'cart', 'admin': 'admin', 'records': 'browse'}  # 蓝图的默认优先级
+    ADMISSION_ROUTES = {
+        'orders.submit_order': 'checkout',
+        'storefront.login': 'cart',
+        'admin.add_product': 'upload',
+        'admin.import_products': 'upload',
+        'records.upload_order_record': 'upload',
+        'admin.admission': None,  # None: 不受预算限制，繁忙时也能查看准入状态
+        'admin.admin_events': None,  # 长连接事件流由 SSE_MAX_STREAMS 单独限制，不占用 admin 预算
+    }
+    
+    # 内存分析（仅用于排查内存增长，开启后有额外开销）
+    # 开启后管理员可访问 /admin/memory，工作进程收到 SIGUSR2 时将报告写入 MEMORY_DUMP_DIR
+    MEMORY_PROFILING = os.environ.get('MEMORY_PROFILING') == '1'
+    MEMORY_PROFILING_FRAMES = 1  # 每个内存分配记录的调用栈深度
+    MEMORY_DUMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+    
+    # SQLite 配置
+    # WAL 模式下读取和在线备份不会阻塞写入；设置 SQLITE_WAL=0 可关闭
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') != '0'
+    
+    # 数据库备份配置（backup_db.py）
+    BACKUP_DIR = os.environ.get('BACKUP_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
+    BACKUP_KEEP = 14  # 保留最近的备份数量
+    BACKUP_INTERVAL = 6 * 3600  # 守护模式下的备份间隔（秒）
+    # WAL 模式下在线备份一次读取一个快照完成复制，不阻塞写入；以下三项只用于非 WAL 模式的分步复制
+    BACKUP_PAGES_PER_STEP = 256  # 在线备份每一步复制的页数，越小写入等待越短
+    BACKUP_STEP_SLEEP = 0.05  # 每一步之间的休眠时间（秒）
+    BACKUP_MAX_SECONDS = 600  # 分步复制会因并发写入重新开始，超过该时间仍未完成则放弃并报错
+    WAL_CHECKPOINT_INTERVAL = 300  # 守护模式下 WAL 检查点的间隔（秒）
+    
     # 会话配置
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
@@ -34,12 +34,19 @@ pip install gunicorn
 echo "📁 创建必要的目录..."
 mkdir -p "$PROJECT_DIR/logs"
 mkdir -p "$PROJECT_DIR/static/uploads"
+mkdir -p "$PROJECT_DIR/private_uploads"
+# 订单记录图片不再放在 static/ 下：移动旧版本保存在上传目录中的文件
+find "$PROJECT_DIR/static/uploads" -maxdepth 1 -name 'order_record_*' -exec mv -n {} "$PROJECT_DIR/private_uploads/" \;
 mkdir -p "$PROJECT_DIR/static/images"
 
 # 5. 初始化数据库（如果需要）
 echo "🗄️  初始化数据库..."
 cd "$PROJECT_DIR"
 python3 -c "from app import app, db; app.app_context().push(); db.create_all()" || echo "⚠️  数据库初始化跳过（可能已存在）"
+# create_all 只会在新建表时创建索引，已存在的表需要单独补建新增的索引；
+# 旧数据库中的订单表需要改为 AUTOINCREMENT，订单 ID 才不会在删除或归档后被重复使用
+echo "🗂️  升级数据库表结构并补建缺失的索引..."
+python3 -c "from app import app; from shop.models import ensure_indexes, ensure_monotonic_ids; app.app_context().push(); ensure_monotonic_ids(); ensure_indexes()"
 
 # 6. 设置文件权限
 echo "🔐 设置文件权限..."
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gunicorn ASGI 配置文件（uvicorn 工作进程）
+
+使用方法: gunicorn --config gunicorn_asgi_config.py asgi:application
+
+每个工作进程用事件循环处理大量并发连接，请求处理在有界线程池中执行
+（线程数由 ASGI_THREADS 环境变量控制），因此不需要按连接数增加进程。
+"""
+
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 其余配置（监听地址、日志、超时等）与 WSGI 配置保持一致
+from gunicorn_config import *  # noqa: E402,F401,F403
+
+# 工作进程
+workers = multiprocessing.cpu_count() + 1  # 每个进程可服务大量连接，进程数只需覆盖 CPU 核心
+worker_class = "uvicorn.workers.UvicornWorker"  # 异步工作模式（不读取 worker_connections，并发处理数由 ASGI_THREADS 限制）
+
+# 准入控制按 WEB_CONCURRENCY 计算预算；ASGI 模式下每个进程同时处理 ASGI_THREADS 个请求，
+# 所以这里设为 工作进程数 × ASGI_THREADS（预加载应用和工作进程都在此之后读取环境变量）
+os.environ['WEB_CONCURRENCY'] = str(workers * int(os.environ.get('ASGI_THREADS', 8)))
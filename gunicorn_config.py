@@ -4,6 +4,7 @@
 Gunicorn 配置文件
 """
 
+import gc
 import multiprocessing
 import os
 
@@ -12,7 +13,7 @@ bind = "127.0.0.1:8000"  # Gunicorn 监听本地8000端口，由 Nginx 反向代
 backlog = 2048
 
 # 工作进程
-workers = multiprocessing.cpu_count() * 2 + 1  # 推荐配置：CPU核心数 * 2 + 1
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))  # 推荐配置：CPU核心数 * 2 + 1，准入控制按此计算预算
 worker_class = "sync"  # 同步工作模式，适合 I/O 密集型应用
 worker_connections = 1000
 timeout = 30
@@ -47,3 +48,53 @@ preload_app = True  # 预加载应用，提高性能
 # 优雅重启
 graceful_timeout = 30
 
+
+# 服务器钩子：预热应用，减少部署和 max_requests 重启后的首个请求延迟
+def when_ready(server):
+    """预加载模式下在主进程中预热一次，工作进程 fork 后共享已编译的模板和映射"""
+    if not server.cfg.preload_app:
+        return
+    import app as app_module
+    from shop import warm_up
+    
+    seconds = warm_up(app_module.app)
+    gc.collect()
+    server.log.info("Application loaded in %.0f ms, warmed in %.0f ms",
+                    app_module.startup_seconds * 1000, seconds * 1000)
+
+
+def pre_fork(server, worker):
+    # 冻结主进程中的现有对象：子进程的垃圾回收不再写这些对象，预加载的内存页保持共享
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app as app_module
+    from shop import warm_up
+    from shop.extensions import db
+    from shop.memory import process_memory
+    
+    # 不复用主进程中可能已打开的数据库连接
+    with app_module.app.app_context():
+        db.engine.dispose(close=False)
+    seconds = warm_up(app_module.app, connect=True)
+    memory = process_memory()
+    server.log.info("Worker %s warmed in %.0f ms (rss %s KB, private %s KB)",
+                    worker.pid, seconds * 1000, memory['rss'], memory['private'])
+
+
+def post_worker_init(worker):
+    # MEMORY_PROFILING=1 时，向工作进程发送 SIGUSR2 写出内存报告（不要发给主进程，主进程的 USR2 是热升级）：
+    #     pkill -USR2 -P $(cat logs/gunicorn.pid)
+    import app as app_module
+    
+    profiler = app_module.app.extensions.get('memory_profiler')
+    if profiler is not None:
+        profiler.install_signal_handler()
+
+
+def worker_exit(server, worker):
+    from shop.memory import process_memory
+    
+    memory = process_memory()
+    server.log.info("Worker %s exiting (rss %s KB, private %s KB)", worker.pid, memory['rss'], memory['private'])
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：内存增长回归检查
+- 使用临时 SQLite 数据库和测试客户端，对每个路由先预热，再连续发送 N 个请求
+- 用 tracemalloc 统计每个路由在这 N 个请求期间的内存增长，超过阈值时列出主要分配位置并以非零状态退出
+- 用于判断能否调大或取消 gunicorn_config.py 中的 max_requests:
+    python memory_check.py --requests 500 --max-growth-kb 256
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+# 必须在导入应用之前指定临时数据库
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+_db_file.close()
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_file.name
+
+from app import app
+from shop.extensions import db
+from shop.models import User, Product, Order
+
+def seed():
+    """创建测试用户、商品和订单"""
+    with app.app_context():
+        db.create_all()
+        user = User(username='memcheck', email='memcheck@example.com', phone='1')
+        user.set_password('memcheck')
+        admin = User(username='memcheck_admin', email='memcheck_admin@example.com', phone='1', is_admin=True)
+        admin.set_password('memcheck')
+        db.session.add_all([user, admin])
+        for i in range(20):
+            db.session.add(Product(name=f'Product {i}', price=10 + i, stock=1000000, description='memory check',
+                                   variants='[{"name": "XL", "stock": 1000000}]'))
+        db.session.flush()
+        for i in range(50):
+            db.session.add(Order(order_number=f'MEMCHECK{i:06d}', user_id=user.id, product_id=1 + i % 20,
+                                 quantity=1, total_price=10, status='pending'))
+        db.session.commit()
+
+def logged_in_client(username):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': 'memcheck'})
+    return client
+
+def routes(user, admin):
+    """(名称, 发送一个请求的函数)"""
+    anonymous = app.test_client()
+    return [
+        ('GET /', lambda: anonymous.get('/')),
+        ('GET /product/<id>', lambda: anonymous.get('/product/1')),
+        ('POST /login (wrong password)', lambda: anonymous.post('/login', data={'username': 'memcheck', 'password': 'wrong'})),
+        ('POST /cart/ops', lambda: user.post('/cart/ops', json={'ops': [
+            {'op': 'add', 'product_id': 2, 'quantity': 1, 'variant': 'XL'},
+            {'op': 'remove', 'product_id': 2, 'variant': 'XL'}]})),
+        ('GET /get_cart', lambda: user.get('/get_cart')),
+        ('GET /my_orders', lambda: user.get('/my_orders')),
+        ('GET /admin', lambda: admin.get('/admin')),
+        ('GET /admin/products', lambda: admin.get('/admin/products')),
+        ('GET /admin/analytics/data', lambda: admin.get('/admin/analytics/data')),
+    ]
+
+def measure(send, requests, warmup):
+    """返回 N 个请求后的 tracemalloc 内存增长（字节）和增长最多的分配位置"""
+    for _ in range(warmup):
+        send()
+    gc.collect()
+    before_traced = tracemalloc.get_traced_memory()[0]
+    before = tracemalloc.take_snapshot()
+    for _ in range(requests):
+        response = send()
+        if response.status_code >= 500:
+            raise RuntimeError(f'HTTP {response.status_code}')
+        response.close()
+    # 最后一个响应体仍被引用，不计入增长
+    del response
+    gc.collect()
+    growth = tracemalloc.get_traced_memory()[0] - before_traced
+    top = tracemalloc.take_snapshot().compare_to(before, 'lineno')[:5]
+    return growth, top
+
+def main():
+    parser = argparse.ArgumentParser(description='内存增长回归检查')
+    parser.add_argument('--requests', type=int, default=200, help='每个路由发送的请求数（默认 200）')
+    parser.add_argument('--warmup', type=int, default=20, help='每个路由预热的请求数（默认 20）')
+    parser.add_argument('--max-growth-kb', type=int, default=256, help='每个路由允许的最大内存增长 KB（默认 256）')
+    args = parser.parse_args()
+    
+    try:
+        seed()
+        user = logged_in_client('memcheck')
+        admin = logged_in_client('memcheck_admin')
+        # 只保留一层调用栈：按行统计已足够，且多层栈会让每个请求慢上数十倍
+        tracemalloc.start(1)
+        
+        failed = []
+        for name, send in routes(user, admin):
+            growth, top = measure(send, args.requests, args.warmup)
+            ok = growth <= args.max_growth_kb * 1024
+            print(f"{'✅' if ok else '❌'} {name:<32} {growth / 1024:>8.1f} KB / {args.requests} 个请求")
+            if not ok:
+                failed.append(name)
+                for stat in top:
+                    print(f"      {stat}")
+        
+        if failed:
+            print(f"\n❌ {len(failed)} 个路由的内存增长超过 {args.max_growth_kb} KB: {', '.join(failed)}")
+            sys.exit(1)
+        print(f"\n✅ 所有路由的内存增长都在 {args.max_growth_kb} KB 以内")
+    finally:
+        os.remove(_db_file.name)
+
+if __name__ == '__main__':
+    main()
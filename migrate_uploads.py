@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：把本地上传目录中的文件复制到当前配置的存储后端（例如 S3 兼容对象存储）
+- 订单记录图片从 RECORD_FOLDER（以及旧版本留在上传目录中的文件）复制到私有前缀
+- 多线程并行复制，目标中已存在且大小相同的文件默认跳过，可以中断后重新运行
+- 不修改数据库：数据库中只保存文件名，切换 STORAGE_BACKEND 后按同样的文件名访问
+- 不删除源文件；确认新后端工作正常后再自行清理
+使用方法:
+    STORAGE_BACKEND=s3 S3_BUCKET=shop-uploads python migrate_uploads.py
+    STORAGE_BACKEND=s3 S3_BUCKET=shop-uploads python migrate_uploads.py --workers 16 --dry-run
+全部复制完成后再在所有应用服务器上设置 STORAGE_BACKEND=s3 并重启，
+切换前的这段时间新上传的文件可以再运行一次本脚本补齐。
+"""
+
+import argparse
+import mimetypes
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app import app
+from shop.storage import LocalStorage, StorageError
+
+def copy_file(source, target, name, overwrite):
+    """Copy one file; returns (name, 'copied' | 'skipped', bytes)"""
+    size = source.size(name)
+    if not overwrite and target.size(name) == size:
+        return name, 'skipped', 0
+    with source.open(name) as f:
+        target.save(name, f, mimetypes.guess_type(name)[0])
+    if target.size(name) != size:
+        raise StorageError(f'{name}: size mismatch after copy')
+    return name, 'copied', size
+
+def main():
+    parser = argparse.ArgumentParser(description='把本地上传文件复制到当前配置的存储后端')
+    parser.add_argument('--source-dir', default=app.config['UPLOAD_FOLDER'], help='源目录（默认 UPLOAD_FOLDER）')
+    parser.add_argument('--workers', type=int, default=8, help='并行复制的线程数（默认 8）')
+    parser.add_argument('--overwrite', action='store_true', help='目标中已存在的文件也重新复制')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要复制的文件')
+    args = parser.parse_args()
+
+    target = app.extensions['storage']
+    if isinstance(target, LocalStorage) and target.root == args.source_dir:
+        print("❌ 当前存储后端就是源目录，请设置 STORAGE_BACKEND（例如 s3）后再运行")
+        sys.exit(1)
+    if hasattr(target, 'max_connections'):
+        # 每个线程都需要一个连接
+        target.max_connections = max(target.max_connections, args.workers)
+    source = LocalStorage(args.source_dir, private_root=app.config['RECORD_FOLDER'])
+
+    names = sorted(source.names())
+    print(f"源目录 {args.source_dir} 中共有 {len(names)} 个文件")
+    if args.dry_run:
+        pending = [name for name in names if args.overwrite or target.size(name) != source.size(name)]
+        for name in pending:
+            print(f"  {name}")
+        print(f"需要复制 {len(pending)} 个文件")
+        return
+
+    started = time.monotonic()
+    copied = skipped = copied_bytes = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(copy_file, source, target, name, args.overwrite): name for name in names}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                _, outcome, size = future.result()
+            except Exception as e:
+                failed.append(futures[future])
+                print(f"❌ {futures[future]}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            if outcome == 'copied':
+                copied += 1
+                copied_bytes += size
+            else:
+                skipped += 1
+            if done % 100 == 0:
+                print(f"  已处理 {done}/{len(names)}")
+
+    elapsed = time.monotonic() - started
+    print(f"✅ 复制 {copied} 个文件（{copied_bytes / 1024 / 1024:.1f} MB），跳过 {skipped} 个已存在的文件，"
+          f"用时 {elapsed:.1f} 秒")
+    if failed:
+        print(f"❌ {len(failed)} 个文件复制失败，可以重新运行本脚本重试")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
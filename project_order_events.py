@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：把订单事件增量应用到读模型（投影）
+- 从每个投影上次处理到的事件ID继续，按批应用新的订单事件（各状态订单数和金额、待上传付款凭证的订单）
+- 投影第一次运行（或使用 --rebuild）时从订单表重建，并从当前最新的事件开始
+- 管理员访问 /admin/order_stats 时也会先追上新事件，定期运行可以让每次请求要做的工作更少
+使用方法:
+    python project_order_events.py
+    python project_order_events.py --follow --interval 5
+    python project_order_events.py --rebuild
+也可以通过 cron 定期执行，例如每分钟:
+    * * * * * cd /home/adminses/My_Projects/shopping_website && venv/bin/python project_order_events.py
+"""
+
+import argparse
+import json
+import signal
+import time
+
+from app import app
+from shop.extensions import db
+from shop.projections import PROJECTIONS, order_summary, rebuild_projection, run_projections
+
+def main():
+    parser = argparse.ArgumentParser(description='把订单事件增量应用到读模型')
+    parser.add_argument('--batch-size', type=int, default=app.config['PROJECTION_BATCH_SIZE'], help='每个事务应用的事件数')
+    parser.add_argument('--rebuild', action='store_true', help='从订单表重建所有投影')
+    parser.add_argument('--follow', action='store_true', help='常驻运行，持续应用新事件')
+    parser.add_argument('--interval', type=float, default=5, help='常驻运行时的轮询间隔（秒，默认 5）')
+    parser.add_argument('--summary', action='store_true', help='完成后输出订单汇总')
+    args = parser.parse_args()
+
+    with app.app_context():
+        # 确保投影表存在
+        db.create_all()
+        if args.rebuild:
+            for projection in PROJECTIONS:
+                last_event_id = rebuild_projection(projection)
+                print(f"✅ 已重建投影 {projection.name}（从事件 {last_event_id} 之后继续）")
+
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        try:
+            while True:
+                applied = run_projections(args.batch_size)
+                if not args.follow or any(applied.values()):
+                    for name, count in applied.items():
+                        print(f"✅ {name}: 已应用 {count} 个事件")
+                if not args.follow or stopping:
+                    break
+                # 空闲时释放数据库连接
+                db.session.remove()
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            pass
+
+        if args.summary:
+            print(json.dumps(order_summary(), ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
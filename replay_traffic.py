@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：按生产访问日志回放流量
+- 解析 logs/gunicorn_access.log（gunicorn_config.py 中的 access_log_format，最后一列 %(D)s 为微秒延迟）
+- 按原始时间间隔以 1 倍、N 倍或最快速度向本地实例回放，保持原来的并发形态（过长的空闲间隔可用 --max-gap 压缩）
+- 日志中没有 Cookie：每个客户端（IP + User-Agent 的哈希，不输出原始 IP）使用独立合成的会话，
+  也可以用 --login 指定测试账号，客户端轮流使用这些账号登录后的会话
+- 按路由对比回放延迟与日志记录的延迟分布 (p50/p95/p99)
+日志中没有请求体，默认只回放 GET/HEAD；--include-writes 会以空请求体发送写请求，只能对测试数据库使用。
+使用方法:
+    python replay_traffic.py --target http://127.0.0.1:8000 --speed 1
+    python replay_traffic.py --speed 10 --login test:test123 --login admin:admin123
+    python replay_traffic.py --speed 0 --limit 2000 --output logs/replay_report.json
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+from werkzeug.exceptions import HTTPException, MethodNotAllowed
+
+from app import app
+
+# '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
+LOG_LINE = re.compile(
+    r'^(?P<host>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" '
+    r'(?P<status>\d{3}) \S+ "[^"]*" "(?P<agent>[^"]*)" (?P<micros>\d+)$'
+)
+SAFE_METHODS = {'GET', 'HEAD'}
+
+def parse_log(path, include_writes, exclude, limit):
+    """Return (requests sorted by start time, number of skipped lines)
+
+    gunicorn logs %(t)s when the response is finished, so the start time is t - D.
+    """
+    entries = []
+    skipped = 0
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = LOG_LINE.match(line.rstrip('\n'))
+            if not match:
+                skipped += 1
+                continue
+            method = match['method']
+            target = match['path']
+            if (method not in SAFE_METHODS and not include_writes) or (exclude and exclude.search(target)):
+                skipped += 1
+                continue
+            finished = datetime.strptime(match['time'], '%d/%b/%Y:%H:%M:%S %z').timestamp()
+            micros = int(match['micros'])
+            entries.append({
+                'start': finished - micros / 1e6,
+                'method': method,
+                'path': target,
+                'status': int(match['status']),
+                'latency_ms': micros / 1000,
+                'client': hashlib.sha256(f"{match['host']}|{match['agent']}".encode()).hexdigest()[:12],
+                'endpoint': endpoint_name(method, target),
+            })
+            if limit and len(entries) >= limit:
+                break
+    entries.sort(key=lambda e: e['start'])
+    return entries, skipped
+
+_url_adapter = app.url_map.bind('localhost')
+
+def endpoint_name(method, target):
+    """Group requests by Flask endpoint; requests that match no route are grouped together"""
+    path = urlsplit(target).path
+    try:
+        endpoint, _ = _url_adapter.match(path, method=method)
+        return endpoint
+    except MethodNotAllowed:
+        return f'{method} {path}'
+    except HTTPException:
+        return '(no route)'
+
+def peak_concurrency(entries, key_start, key_end):
+    events = []
+    for e in entries:
+        events.append((key_start(e), 1))
+        events.append((key_end(e), -1))
+    events.sort()
+    current = peak = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class Session:
+    """Cookies of one synthetic client; requests of the same client may overlap"""
+
+    def __init__(self):
+        self.cookies = {}
+        self.lock = threading.Lock()
+
+    def header(self):
+        with self.lock:
+            return '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+    def update(self, response):
+        for name, value in response.getheaders():
+            if name.lower() == 'set-cookie':
+                cookie = value.split(';', 1)[0]
+                if '=' in cookie:
+                    key, val = cookie.split('=', 1)
+                    with self.lock:
+                        if val:
+                            self.cookies[key] = val
+                        else:
+                            self.cookies.pop(key, None)
+
+class Replayer:
+    def __init__(self, target, timeout):
+        parts = urlsplit(target)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def send(self, method, path, session, body=None, content_type=None):
+        """Send one request on this thread's keep-alive connection; returns (status, ms)"""
+        headers = {'User-Agent': 'replay_traffic'}
+        cookie = session.header()
+        if cookie:
+            headers['Cookie'] = cookie
+        if body is not None:
+            headers['Content-Type'] = content_type
+        elif method not in SAFE_METHODS:
+            body = b''
+        for attempt in range(2):
+            conn = self._connection()
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    return None, (time.perf_counter() - started) * 1000
+                continue
+            session.update(response)
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                self._local.conn = None
+            return response.status, (time.perf_counter() - started) * 1000
+
+    def login(self, username, password):
+        session = Session()
+        status, _ = self.send('POST', '/login', session,
+                              body=urlencode({'username': username, 'password': password}),
+                              content_type='application/x-www-form-urlencoded')
+        if status != 302:
+            raise RuntimeError(f'登录失败: {username} (HTTP {status})')
+        return session
+
+def assign_offsets(entries, max_gap):
+    """Replay offset of each entry from the first, with idle gaps longer than max_gap shortened to it"""
+    offset = 0.0
+    previous = entries[0]['start']
+    for entry in entries:
+        gap = entry['start'] - previous
+        offset += min(gap, max_gap) if max_gap else gap
+        entry['offset'] = offset
+        previous = entry['start']
+    return offset
+
+def replay(entries, replayer, sessions_for, speed, max_concurrency):
+    """Send every entry, at its recorded offset divided by speed (speed 0: as fast as possible)"""
+    results = []
+    results_lock = threading.Lock()
+
+    def run(entry):
+        started = time.monotonic()
+        status, ms = replayer.send(entry['method'], entry['path'], sessions_for(entry['client']))
+        with results_lock:
+            results.append({**entry, 'replay_status': status, 'replay_ms': ms,
+                            'replay_start': started, 'replay_end': time.monotonic()})
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        began = time.monotonic()
+        for entry in entries:
+            if speed > 0:
+                delay = entry['offset'] / speed - (time.monotonic() - began)
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(run, entry)
+    return results, time.monotonic() - began
+
+def compare(results):
+    """Per-endpoint recorded vs replayed latency percentiles"""
+    groups = defaultdict(list)
+    for r in results:
+        groups[r['endpoint']].append(r)
+    rows = []
+    for endpoint, items in groups.items():
+        recorded = [r['latency_ms'] for r in items]
+        replayed = [r['replay_ms'] for r in items if r['replay_status'] is not None]
+        row = {'endpoint': endpoint, 'count': len(items),
+               'errors': sum(1 for r in items if r['replay_status'] is None),
+               'shed': sum(1 for r in items if r['replay_status'] == 503 and r['status'] != 503),
+               'status_changed': sum(1 for r in items if r['replay_status'] not in (None, 503, r['status']))}
+        for pct in (50, 95, 99):
+            row[f'recorded_p{pct}'] = percentile(recorded, pct)
+            row[f'replay_p{pct}'] = percentile(replayed, pct)
+        rows.append(row)
+    rows.sort(key=lambda row: -row['count'])
+    return rows
+
+def fmt(ms):
+    return '-' if ms is None else f'{ms:.1f}'
+
+def main():
+    parser = argparse.ArgumentParser(description='按生产访问日志回放流量并对比延迟')
+    parser.add_argument('--log', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'gunicorn_access.log'), help='访问日志路径')
+    parser.add_argument('--target', default='http://127.0.0.1:8000', help='回放目标（默认 http://127.0.0.1:8000）')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速：1 为原速，10 为 10 倍速，0 为最快速度（默认 1）')
+    parser.add_argument('--limit', type=int, help='最多回放的请求数')
+    parser.add_argument('--max-gap', type=float, default=5, help='超过该秒数的空闲间隔压缩为该值，0 为不压缩（默认 5）')
+    parser.add_argument('--max-concurrency', type=int, default=64, help='定速回放时的最大并发（默认 64）')
+    parser.add_argument('--login', action='append', default=[], metavar='USER:PASSWORD', help='客户端轮流使用的测试账号，可重复')
+    parser.add_argument('--include-writes', action='store_true', help='以空请求体回放 POST 等写请求（仅用于测试数据库）')
+    parser.add_argument('--exclude', default=r'^/(logout|admin/events)\b', help='不回放的路径（正则，默认跳过登出和事件流）')
+    parser.add_argument('--timeout', type=float, default=30, help='单个请求的超时秒数（默认 30）')
+    parser.add_argument('--output', help='将逐路由对比结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    exclude = re.compile(args.exclude) if args.exclude else None
+    entries, skipped = parse_log(args.log, args.include_writes, exclude, args.limit)
+    if not entries:
+        print(f"❌ {args.log} 中没有可回放的请求（跳过 {skipped} 行）")
+        sys.exit(1)
+    span = assign_offsets(entries, args.max_gap)
+    recorded_peak = peak_concurrency(entries, lambda e: e['start'], lambda e: e['start'] + e['latency_ms'] / 1000)
+    clients = sorted({e['client'] for e in entries})
+    print(f"已解析 {len(entries)} 个请求（跳过 {skipped} 行），{len(clients)} 个客户端，"
+          f"回放时长 {span:.0f} 秒（原始 {entries[-1]['start'] - entries[0]['start']:.0f} 秒），峰值并发 {recorded_peak}")
+
+    replayer = Replayer(args.target, args.timeout)
+    accounts = []
+    for account in args.login:
+        username, _, password = account.partition(':')
+        accounts.append(replayer.login(username, password))
+    sessions = {}
+    for index, client in enumerate(clients):
+        sessions[client] = accounts[index % len(accounts)] if accounts else Session()
+
+    if args.speed > 0:
+        max_concurrency = args.max_concurrency
+        print(f"以 {args.speed:g} 倍速回放到 {args.target}，预计 {span / args.speed:.0f} 秒...")
+    else:
+        # 最快速度：并发数取日志中的峰值并发，保持原来的并发形态
+        max_concurrency = max(1, recorded_peak)
+        print(f"以最快速度回放到 {args.target}（并发 {max_concurrency}）...")
+    results, elapsed = replay(entries, replayer, sessions.get, args.speed, max_concurrency)
+
+    replay_peak = peak_concurrency(results, lambda r: r['replay_start'], lambda r: r['replay_end'])
+    rows = compare(results)
+    print(f"\n回放完成：{len(results)} 个请求，用时 {elapsed:.1f} 秒（{len(results) / elapsed:.1f} 请求/秒），峰值并发 {replay_peak}")
+    print(f"\n{'路由':<40} {'数量':>6} {'记录 p50/p95/p99 (ms)':>26} {'回放 p50/p95/p99 (ms)':>26} {'503':>6} {'状态变化':>8}")
+    for row in rows:
+        recorded = '/'.join(fmt(row[f'recorded_p{p}']) for p in (50, 95, 99))
+        replayed = '/'.join(fmt(row[f'replay_p{p}']) for p in (50, 95, 99))
+        changed = row['status_changed'] + row['errors']
+        print(f"{row['endpoint'][:40]:<40} {row['count']:>6} {recorded:>26} {replayed:>26} {row['shed']:>6} {changed:>8}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'target': args.target, 'speed': args.speed, 'requests': len(results),
+                       'elapsed_seconds': elapsed, 'recorded_peak_concurrency': recorded_peak,
+                       'replay_peak_concurrency': replay_peak, 'endpoints': rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 对比结果已写入 {args.output}")
+
+if __name__ == '__main__':
+    main()
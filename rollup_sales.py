@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：增量汇总每日销售数据
+- 将上次汇总之后的新订单按天、商品、规格汇总到 sales_daily / sales_daily_product / sales_daily_variant
+- 管理后台的销售分析页面只读取汇总表
+- 适合通过 cron 定期执行，例如每 10 分钟:
+    */10 * * * * cd /home/adminses/My_Projects/shopping_website && venv/bin/python rollup_sales.py
+"""
+
+import argparse
+
+from app import app
+from shop.extensions import db
+from shop.analytics import rollup_sales_daily
+
+def main():
+    parser = argparse.ArgumentParser(description='增量汇总每日销售数据')
+    parser.add_argument('--batch-size', type=int, default=5000, help='每批汇总的订单行数（默认 5000）')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        # 确保汇总表存在
+        db.create_all()
+        print("正在汇总新订单...")
+        aggregated = rollup_sales_daily(batch_size=args.batch_size)
+        print(f"✅ 已汇总 {aggregated} 条订单记录")
+
+if __name__ == '__main__':
+    main()
@@ -6,18 +6,21 @@
 
 import os
 import sys
-from app import app, db
+from app import app
+from shop.extensions import db
+from shop.models import User, Product, ensure_indexes, ensure_monotonic_ids
 
 def init_database():
     """初始化数据库"""
     with app.app_context():
         db.create_all()
+        # 旧数据库中的订单表改为 AUTOINCREMENT（只执行一次），并为已存在的表补建新增的索引
+        ensure_monotonic_ids()
+        ensure_indexes()
         print("✅ 数据库初始化完成")
 
 def create_admin_user():
     """创建管理员用户"""
-    from app import User
-    
     with app.app_context():
         admin = User.query.filter_by(username='admin').first()
         if not admin:
@@ -36,8 +39,6 @@ def create_admin_user():
 
 def add_sample_products():
     """添加示例商品"""
-    from app import Product
-    
     with app.app_context():
         # 检查是否已有商品
         if Product.query.count() > 0:
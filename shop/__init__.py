@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+购物网站应用包
+
+create_app() 创建并配置 Flask 应用，路由按功能拆分为蓝图：
+storefront（前台和账户）、cart（购物车）、orders（下单和我的订单）、admin（管理后台）、records（订单记录）、
+api（公开的只读商品目录 JSON API）
+"""
+
+import os
+import time
+
+from flask import Flask
+
+from config import Config
+from .extensions import db, login_manager
+from .order_numbers import OrderNumberGenerator
+from .events import OrderEventNotifier
+from .storage import create_storage
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app(config_class=Config):
+    app = Flask(__name__, root_path=PROJECT_ROOT)
+    app.config.from_object(config_class)
+    
+    db.init_app(app)
+    login_manager.init_app(app)
+    
+    if app.config['SQLITE_WAL'] and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        from sqlalchemy import event
+        from .backup import configure_sqlite_connection
+        with app.app_context():
+            event.listen(db.engine, 'connect', configure_sqlite_connection)
+    
+    # 上传文件存储（本地目录或 S3 兼容对象存储）
+    app.extensions['storage'] = create_storage(app.config)
+    
+    # 订单号生成器，每个工作进程在首次使用时领取自己的槽位
+    app.extensions['order_numbers'] = OrderNumberGenerator(
+        node_id=app.config['ORDER_NODE_ID'],
+        lock_dir=app.config['ORDER_WORKER_LOCK_DIR']
+    )
+    
+    # 最先注册，超出预算的请求在做任何其他工作之前就被拒绝
+    if app.config['ADMISSION_CONTROL']:
+        from .admission import AdmissionControl
+        AdmissionControl(app)
+    
+    if app.config['MEMORY_PROFILING']:
+        from .memory import MemoryProfiler
+        MemoryProfiler(app)
+    
+    # 订单事件提交后通知事件流
+    OrderEventNotifier(app)
+    
+    from .blueprints import storefront, cart, orders, admin, records, api
+    for blueprint_module in (storefront, cart, orders, admin, records, api):
+        app.register_blueprint(blueprint_module.bp)
+    
+    return app
+
+
+def warm_up(app, connect=False):
+    """Do the work a process would otherwise pay for on its first requests; returns the seconds taken
+
+    Compiles every template and configures the SQLAlchemy mappers. With connect=True (in a
+    forked worker, never in the gunicorn master) it also opens a pooled database connection
+    and loads the per-process caches.
+    """
+    from sqlalchemy.orm import configure_mappers
+    from .inventory import _hot_product_ids
+    
+    started = time.perf_counter()
+    configure_mappers()
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+    if connect:
+        with app.app_context():
+            _hot_product_ids()
+            db.session.remove()
+    return time.perf_counter() - started
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""按路由优先级的准入控制：低优先级请求超出并发预算时快速返回 503，为下单保留工作进程"""
+
+import os
+import struct
+import threading
+
+from flask import g, jsonify, request
+
+# 优先级从高到低；checkout 不设预算，永远不会被拒绝
+PRIORITY_CLASSES = ['checkout', 'cart', 'browse', 'admin', 'upload']
+
+
+class AdmissionControl:
+    """Per-class concurrency budgets shared by every worker process on the host
+
+    Budgets are nested: the pool of a class counts in-flight requests of that class and of
+    every lower-priority class, so an upload holds a slot in the upload, admin, browse and
+    cart pools while a cart request only needs a cart slot. However the lower classes are
+    mixed, they can never occupy more than their pool's share of the workers, which keeps
+    the rest free for the classes above them.
+
+    Each slot is a lock file taken with a non-blocking flock, like the order number worker
+    slots, so a crashed worker never leaks a slot. Holders also mark their slot in a small
+    per-pool occupancy file, which is what in_flight() reads, so reporting never touches
+    the locks. Shed counts are kept in a shared counter file in the same directory.
+    """
+
+    def __init__(self, app=None):
+        self.limits = {}
+        self.lock_dir = None
+        self.retry_after = 1
+        self._routes = {}
+        self._blueprints = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._files = {}
+        self._held = {}
+        self._marks = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = app.config['WEB_CONCURRENCY']
+        self.limits = {name: max(1, int(workers * share))
+                       for name, share in app.config['ADMISSION_BUDGETS'].items()}
+        self.lock_dir = app.config['ORDER_WORKER_LOCK_DIR']
+        self.retry_after = app.config['ADMISSION_RETRY_AFTER']
+        self._routes = app.config['ADMISSION_ROUTES']
+        self._blueprints = app.config['ADMISSION_BLUEPRINTS']
+        app.extensions['admission'] = self
+
+        @app.before_request
+        def _admit():
+            priority_class = self.classify(request.endpoint)
+            if priority_class is None:
+                return None
+            slots = self.acquire(priority_class)
+            if slots is None:
+                self._count_shed(priority_class)
+                response = jsonify({'success': False, 'message': '服务器繁忙，请稍后再试'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(self.retry_after)
+                return response
+            g._admission_slots = slots
+            return None
+
+        @app.teardown_request
+        def _release(exc=None):
+            slots = g.pop('_admission_slots', None)
+            if slots:
+                self.release(slots)
+
+    def classify(self, endpoint):
+        """Priority class of an endpoint, or None for requests that are never budgeted"""
+        if endpoint is None or endpoint == 'static':
+            return None
+        if endpoint in self._routes:
+            return self._routes[endpoint]
+        return self._blueprints.get(endpoint.split('.', 1)[0], 'browse')
+
+    def _pools_for(self, priority_class):
+        """Budgeted pools a request of this class must hold a slot in, smallest first"""
+        rank = PRIORITY_CLASSES.index(priority_class)
+        return [name for name in reversed(PRIORITY_CLASSES[:rank + 1]) if name in self.limits]
+
+    def _slot_files(self, pool):
+        """This process's open lock files for a pool (reopened after fork so locks are not shared)"""
+        if self._pid != os.getpid():
+            for files in self._files.values():
+                for f in files:
+                    f.close()
+            self._files = {}
+            self._held = {}
+            for fd in self._marks.values():
+                os.close(fd)
+            self._marks = {}
+            self._pid = os.getpid()
+        if pool not in self._files:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            self._files[pool] = [open(os.path.join(self.lock_dir, f'admission_{pool}_{slot}.lock'), 'w')
+                                 for slot in range(self.limits[pool])]
+            self._held[pool] = set()
+            self._marks[pool] = os.open(self._inflight_path(pool), os.O_WRONLY | os.O_CREAT, 0o644)
+        return self._files[pool]
+
+    def acquire(self, priority_class):
+        """Take one slot in every pool of the class; returns the held slots, or None if over budget"""
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows development): admit everything
+            return []
+
+        taken = []
+        with self._lock:
+            for pool in self._pools_for(priority_class):
+                files = self._slot_files(pool)
+                held = self._held[pool]
+                for slot, f in enumerate(files):
+                    # flock does not exclude other threads of this process, so skip slots we hold
+                    if slot in held:
+                        continue
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue
+                    held.add(slot)
+                    taken.append((pool, slot))
+                    self._mark(pool, slot, 1)
+                    break
+                else:
+                    self._release_locked(taken)
+                    return None
+        return taken
+
+    def release(self, slots):
+        with self._lock:
+            self._release_locked(slots)
+
+    def _release_locked(self, slots):
+        import fcntl
+        for pool, slot in slots:
+            if slot in self._held.get(pool, ()):
+                self._mark(pool, slot, 0)
+                fcntl.flock(self._files[pool][slot], fcntl.LOCK_UN)
+                self._held[pool].discard(slot)
+
+    def _stats_path(self):
+        return os.path.join(self.lock_dir, 'admission_shed.stats')
+
+    def _count_shed(self, priority_class):
+        """Add one to the host-wide shed counter of a class"""
+        try:
+            import fcntl
+        except ImportError:
+            return
+        index = PRIORITY_CLASSES.index(priority_class)
+        size = 8 * len(PRIORITY_CLASSES)
+        os.makedirs(self.lock_dir, exist_ok=True)
+        fd = os.open(self._stats_path(), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            data = os.pread(fd, size, 0).ljust(size, b'\0')
+            count = struct.unpack_from('<Q', data, index * 8)[0] + 1
+            os.pwrite(fd, struct.pack('<Q', count), index * 8)
+        finally:
+            os.close(fd)
+
+    def shed_counts(self):
+        """Requests rejected per class since the counters were last reset, across all workers"""
+        size = 8 * len(PRIORITY_CLASSES)
+        try:
+            with open(self._stats_path(), 'rb') as f:
+                data = f.read(size).ljust(size, b'\0')
+        except OSError:
+            data = b'\0' * size
+        return dict(zip(PRIORITY_CLASSES, struct.unpack(f'<{len(PRIORITY_CLASSES)}Q', data)))
+
+    def reset_shed_counts(self):
+        try:
+            os.remove(self._stats_path())
+        except OSError:
+            pass
+
+    def _inflight_path(self, pool):
+        return os.path.join(self.lock_dir, f'admission_{pool}.inflight')
+
+    def _mark(self, pool, slot, busy):
+        """Record in the pool's occupancy file whether this process holds a slot (one byte per slot)"""
+        os.pwrite(self._marks[pool], bytes([busy]), slot)
+
+    def in_flight(self):
+        """Busy slots per budgeted pool across all workers, read from the occupancy files
+
+        Never takes the slot locks, so looking at the numbers cannot make a request fail. A
+        worker killed while holding a slot leaves its mark until the slot is next used.
+        """
+        busy = {}
+        for pool, limit in self.limits.items():
+            try:
+                with open(self._inflight_path(pool), 'rb') as f:
+                    busy[pool] = sum(f.read(limit))
+            except OSError:
+                busy[pool] = 0
+        return busy
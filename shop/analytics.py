@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""销售数据汇总与分析"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .extensions import db
+from .models import Order, Product, DailySales, DailyProductSales, DailyVariantSales, RollupWatermark
+
+def _merge_sales_rows(model, key_columns, rows):
+    """Add aggregated (key..., units, revenue, order_count) rows onto the existing rollup rows"""
+    if not rows:
+        return
+    query = model.query.filter(model.day.in_({row[0] for row in rows}))
+    if 'product_id' in key_columns:
+        query = query.filter(model.product_id.in_({row[1] for row in rows}))
+    existing = {tuple(getattr(r, c) for c in key_columns): r for r in query.all()}
+    
+    updates = []
+    inserts = []
+    for row in rows:
+        key = tuple(row[:len(key_columns)])
+        units, revenue, order_count = row[len(key_columns):]
+        current = existing.get(key)
+        if current:
+            updates.append({'id': current.id, 'units': current.units + units,
+                            'revenue': current.revenue + revenue, 'order_count': current.order_count + order_count})
+        else:
+            inserts.append({**dict(zip(key_columns, key)), 'units': units, 'revenue': revenue, 'order_count': order_count})
+    
+    if updates:
+        db.session.bulk_update_mappings(model, updates)
+    if inserts:
+        db.session.execute(model.__table__.insert(), inserts)
+
+def rollup_sales_daily(batch_size=5000):
+    """Aggregate orders created since the last watermark into the daily sales rollup tables (total,
+    per product and per variant)
+
+    Each batch is a range of order row ids, extended to whole order numbers, aggregated with
+    GROUP BY in the database and merged into the rollups together with the new watermark in
+    one transaction. Orders are counted when placed; later status changes or deletions do not
+    alter the rollups. Returns the number of order rows aggregated.
+    
+    Relies on order ids only ever growing: the orders table uses AUTOINCREMENT (run
+    ensure_monotonic_ids() on databases created before it), otherwise an order given a
+    reused id at or below the watermark would never be counted.
+    """
+    watermark = db.session.get(RollupWatermark, 'sales_daily')
+    if not watermark:
+        watermark = RollupWatermark(name='sales_daily', last_order_id=0)
+        db.session.add(watermark)
+        db.session.commit()
+    
+    def as_date(value):
+        return datetime.strptime(value, '%Y-%m-%d').date() if isinstance(value, str) else value
+    
+    aggregated = 0
+    while True:
+        start_id = watermark.last_order_id
+        end_id = db.session.query(db.func.max(Order.id)).filter(
+            Order.id.in_(db.select(Order.id).where(Order.id > start_id).order_by(Order.id).limit(batch_size))
+        ).scalar()
+        if end_id is None:
+            break
+        # Do not split an order number across batches, its order count would be taken twice
+        last_order_number = db.session.query(Order.order_number).filter(Order.id == end_id).scalar()
+        end_id = db.session.query(db.func.max(Order.id)).filter(Order.order_number == last_order_number).scalar()
+        
+        try:
+            in_batch = db.and_(Order.id > start_id, Order.id <= end_id)
+            day = db.func.date(Order.created_at)
+            variant = db.func.coalesce(Order.variant, '')
+            daily_rows = db.session.query(
+                day, db.func.sum(Order.quantity), db.func.sum(Order.total_price),
+                db.func.count(db.distinct(Order.order_number))
+            ).filter(in_batch).group_by(day).all()
+            product_rows = db.session.query(
+                day, Order.product_id, db.func.sum(Order.quantity), db.func.sum(Order.total_price),
+                db.func.count(db.distinct(Order.order_number))
+            ).filter(in_batch).group_by(day, Order.product_id).all()
+            variant_rows = db.session.query(
+                day, Order.product_id, variant, db.func.sum(Order.quantity), db.func.sum(Order.total_price),
+                db.func.count(db.distinct(Order.order_number))
+            ).filter(in_batch).group_by(day, Order.product_id, variant).all()
+            
+            _merge_sales_rows(DailySales, ['day'], [(as_date(r[0]), *r[1:]) for r in daily_rows])
+            _merge_sales_rows(DailyProductSales, ['day', 'product_id'],
+                              [(as_date(r[0]), *r[1:]) for r in product_rows])
+            _merge_sales_rows(DailyVariantSales, ['day', 'product_id', 'variant'],
+                              [(as_date(r[0]), *r[1:]) for r in variant_rows])
+            batch_rows = db.session.query(db.func.count(Order.id)).filter(in_batch).scalar()
+            watermark.last_order_id = end_id
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        aggregated += batch_rows
+        current_app.logger.info(f'Sales rollup: aggregated {batch_rows} order rows up to order id {end_id}')
+    
+    return aggregated
+
+def sales_analytics(days=30):
+    """Revenue per day, best sellers and low-stock projections for the last `days` days, from the rollups only"""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).date()
+    
+    daily = db.session.query(
+        DailySales.day, DailySales.units, DailySales.revenue, DailySales.order_count
+    ).filter(DailySales.day >= since).order_by(DailySales.day).all()
+    
+    best_sellers = db.session.query(
+        DailyProductSales.product_id, db.func.sum(DailyProductSales.units).label('units'),
+        db.func.sum(DailyProductSales.revenue)
+    ).filter(DailyProductSales.day >= since).group_by(DailyProductSales.product_id).order_by(
+        db.desc('units')
+    ).limit(10).all()
+    
+    variants = db.session.query(
+        DailyVariantSales.product_id, DailyVariantSales.variant,
+        db.func.sum(DailyVariantSales.units), db.func.sum(DailyVariantSales.revenue)
+    ).filter(DailyVariantSales.day >= since, DailyVariantSales.variant != '').group_by(
+        DailyVariantSales.product_id, DailyVariantSales.variant
+    ).all()
+    
+    # Sell-through over the last SELL_THROUGH_DAYS days projects when stock runs out
+    window = current_app.config['SELL_THROUGH_DAYS']
+    recent_units = dict(db.session.query(DailyProductSales.product_id, db.func.sum(DailyProductSales.units)).filter(
+        DailyProductSales.day >= (datetime.utcnow() - timedelta(days=window - 1)).date()
+    ).group_by(DailyProductSales.product_id).all())
+    
+    names = {}
+    low_stock = []
+    for product in Product.query.all():
+        names[product.id] = product.name
+        per_day = (recent_units.get(product.id) or 0) / window
+        days_left = product.stock / per_day if per_day else None
+        if product.stock <= 5 or (days_left is not None and days_left <= current_app.config['LOW_STOCK_DAYS']):
+            low_stock.append({'product_id': product.id, 'name': product.name, 'stock': product.stock,
+                              'units_per_day': round(per_day, 2),
+                              'days_left': round(days_left, 1) if days_left is not None else None})
+    low_stock.sort(key=lambda item: (item['days_left'] is None, item['days_left'] or 0, item['stock']))
+    
+    watermark = db.session.get(RollupWatermark, 'sales_daily')
+    return {
+        'days': days,
+        'updated_at': watermark.updated_at.strftime('%Y-%m-%d %H:%M:%S') if watermark and watermark.updated_at else None,
+        'totals': {
+            'units': sum(row[1] or 0 for row in daily),
+            'revenue': sum(row[2] or 0 for row in daily),
+            'orders': sum(row[3] or 0 for row in daily)
+        },
+        'daily': [{'day': row[0].isoformat(), 'units': row[1], 'revenue': row[2], 'orders': row[3]} for row in daily],
+        'best_sellers': [{'product_id': pid, 'name': names.get(pid, f'#{pid} (deleted)'), 'units': units, 'revenue': revenue}
+                         for pid, units, revenue in best_sellers],
+        'variants': [{'product_id': pid, 'name': names.get(pid, f'#{pid} (deleted)'), 'variant': variant,
+                      'units': units, 'revenue': revenue}
+                     for pid, variant, units, revenue in sorted(variants, key=lambda r: -(r[2] or 0))],
+        'low_stock': low_stock
+    }
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""已完成订单的归档"""
+
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .extensions import db
+from .models import (Order, OrderItem, OrderRecord, Product, ArchivedOrder, ArchivedOrderRecord,
+                     record_order_event)
+
+# 订单归档
+def archive_completed_orders(days, batch_size=500, pause=0.05):
+    """Move completed orders older than `days` days, with their records, into the archive tables
+
+    Walks the order numbers in ascending order with a keyset cursor, `batch_size` at a time,
+    so each candidate check only reads one index range and the whole run is a single pass
+    over the table. The candidates of each page are moved using INSERT ... SELECT and
+    DELETE, committing after each batch (with an order_archived event per order) and
+    pausing briefly so checkout writers can take the lock in between.
+    Returns the number of order numbers archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = 0
+    order_columns = ['id', 'order_number', 'user_id', 'product_id', 'quantity', 'variant',
+                     'total_price', 'contact_info', 'status', 'created_at']
+    record_columns = ['id', 'order_number', 'record_type', 'image_path', 'uploaded_by',
+                      'description', 'created_at']
+    
+    cursor = ''
+    while True:
+        # Next page of order numbers after the cursor (a range scan of the order_number index)
+        page = [row[0] for row in db.session.query(Order.order_number).distinct()
+                .filter(Order.order_number > cursor)
+                .order_by(Order.order_number).limit(batch_size).all()]
+        if not page:
+            break
+        cursor = page[-1]
+        
+        # Those whose items are all completed and older than the cutoff
+        order_numbers = [row[0] for row in db.session.query(Order.order_number)
+                         .filter(Order.order_number.in_(page))
+                         .group_by(Order.order_number)
+                         .having(db.func.max(Order.created_at) < cutoff)
+                         .having(db.func.sum(db.case((Order.status != 'completed', 1), else_=0)) == 0)
+                         .all()]
+        if not order_numbers:
+            # Nothing to move: end the read transaction before the next page
+            db.session.commit()
+            if len(page) < batch_size:
+                break
+            continue
+        
+        try:
+            now = datetime.utcnow()
+            order_select = db.select(
+                *[getattr(Order, c) for c in order_columns],
+                db.select(Product.name).where(Product.id == Order.product_id).scalar_subquery(),
+                db.select(Product.price).where(Product.id == Order.product_id).scalar_subquery(),
+                db.literal(now)
+            ).where(Order.order_number.in_(order_numbers))
+            db.session.execute(ArchivedOrder.__table__.insert().from_select(
+                order_columns + ['product_name', 'unit_price', 'archived_at'], order_select))
+            
+            record_select = db.select(
+                *[getattr(OrderRecord, c) for c in record_columns], db.literal(now)
+            ).where(OrderRecord.order_number.in_(order_numbers))
+            db.session.execute(ArchivedOrderRecord.__table__.insert().from_select(
+                record_columns + ['archived_at'], record_select))
+            
+            for order_number, items, total in db.session.query(
+                Order.order_number, db.func.count(Order.id), db.func.sum(Order.total_price)
+            ).filter(Order.order_number.in_(order_numbers)).group_by(Order.order_number).all():
+                record_order_event('order_archived', order_number, items=items, total=total)
+            
+            order_ids = db.select(Order.id).where(Order.order_number.in_(order_numbers))
+            OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+            OrderRecord.query.filter(OrderRecord.order_number.in_(order_numbers)).delete(synchronize_session=False)
+            Order.query.filter(Order.order_number.in_(order_numbers)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        archived += len(order_numbers)
+        current_app.logger.info(f'Archived {len(order_numbers)} orders (total {archived})')
+        if len(page) < batch_size:
+            break
+        time.sleep(pause)
+    
+    return archived
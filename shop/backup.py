@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""SQLite 在线备份、WAL 检查点、完整性校验、备份轮换和恢复"""
+
+import glob
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+from sqlalchemy.engine import make_url
+
+BACKUP_SUFFIX = '.backup_'
+
+
+class BackupError(Exception):
+    """Raised when a backup or restore cannot be completed safely"""
+
+
+def sqlite_path(app):
+    """Return the database file path for a sqlite:/// URI, or raise BackupError"""
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise BackupError('Only file-based SQLite databases can be backed up with this tool')
+    return os.path.abspath(url.database)
+
+
+def _connect(path, timeout):
+    connection = sqlite3.connect(path, timeout=timeout)
+    connection.execute(f'PRAGMA busy_timeout = {int(timeout * 1000)}')
+    return connection
+
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Engine connect listener: WAL lets readers and the backup run alongside a writer"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+    finally:
+        cursor.close()
+
+
+def checkpoint(path, mode='PASSIVE', timeout=5):
+    """Run a WAL checkpoint; returns (busy, wal_pages, checkpointed_pages)
+
+    PASSIVE never waits for readers or writers, so it is safe to run on a schedule.
+    TRUNCATE also resets the WAL file to zero bytes but waits for busy_timeout if needed.
+    """
+    mode = mode.upper()
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise BackupError(f'Unknown checkpoint mode: {mode}')
+    connection = _connect(path, timeout)
+    try:
+        return tuple(connection.execute(f'PRAGMA wal_checkpoint({mode})').fetchone())
+    finally:
+        connection.close()
+
+
+def verify_backup(path):
+    """Return the result rows of PRAGMA integrity_check; ['ok'] means the file is consistent"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return [row[0] for row in connection.execute('PRAGMA integrity_check')]
+    finally:
+        connection.close()
+
+
+def backup_database(path, backup_dir, pages_per_step=256, step_sleep=0.05, timeout=5, progress=None,
+                    max_seconds=600):
+    """Copy a live database with SQLite's online backup API and verify the copy
+
+    In WAL mode (what the app uses) the copy is a single step: it reads one snapshot while
+    writers carry on, so it never restarts. In other journal modes it proceeds
+    pages_per_step pages at a time, sleeping step_sleep seconds between steps, so writers
+    only ever wait for one small step; SQLite restarts that copy whenever another
+    connection writes, so under steady writes it may never finish, and BackupError is
+    raised once it has run for max_seconds. The copy is written to a .partial file and
+    renamed only after integrity_check passes.
+    Returns (backup_path, seconds).
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.basename(path) + BACKUP_SUFFIX + datetime.now().strftime('%Y%m%d_%H%M%S')
+    target = os.path.join(backup_dir, name)
+    partial = target + '.partial'
+
+    started = time.perf_counter()
+    source = _connect(path, timeout)
+    destination = sqlite3.connect(partial)
+    try:
+        if source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal':
+            source.backup(destination, pages=-1, progress=progress)
+        else:
+            def step(status, remaining, total):
+                if time.perf_counter() - started > max_seconds:
+                    raise BackupError(f'Backup did not finish within {max_seconds} seconds '
+                                      f'(restarted by concurrent writes); enable WAL or retry when quieter')
+                if progress:
+                    progress(status, remaining, total)
+            source.backup(destination, pages=pages_per_step, progress=step, sleep=step_sleep)
+        # 备份文件使用回滚日志模式，单个文件即可独立复制和恢复
+        destination.execute('PRAGMA journal_mode=DELETE')
+    except Exception:
+        destination.close()
+        os.remove(partial)
+        raise
+    finally:
+        source.close()
+    destination.close()
+
+    problems = verify_backup(partial)
+    if problems != ['ok']:
+        os.replace(partial, target + '.corrupt')
+        raise BackupError(f'Integrity check failed on backup copy: {problems[:5]}')
+    os.replace(partial, target)
+    return target, time.perf_counter() - started
+
+
+def list_backups(path, backup_dir):
+    """Backups of this database in backup_dir, newest first"""
+    pattern = os.path.join(backup_dir, os.path.basename(path) + BACKUP_SUFFIX + '*')
+    files = [f for f in glob.glob(pattern) if not f.endswith(('.partial', '.corrupt'))]
+    return sorted(files, reverse=True)
+
+
+def rotate_backups(path, backup_dir, keep):
+    """Delete all but the newest `keep` backups; returns the deleted paths"""
+    removed = list_backups(path, backup_dir)[max(keep, 1):]
+    for old in removed:
+        os.remove(old)
+    return removed
+
+
+def restore_backup(backup_path, path, pages_per_step=1024, timeout=30):
+    """Replace the database at path with a verified backup; the web service must be stopped
+
+    The current database is first saved next to it as <name>.before_restore_<timestamp>,
+    then the backup is copied in with the backup API (which takes the database lock, so a
+    still-running writer makes this fail instead of corrupting it). Returns the saved path.
+    """
+    problems = verify_backup(backup_path)
+    if problems != ['ok']:
+        raise BackupError(f'Refusing to restore a backup that fails integrity_check: {problems[:5]}')
+
+    saved = None
+    if os.path.exists(path):
+        # 先把 WAL 合并进主文件，保存的副本才是完整的
+        checkpoint(path, 'TRUNCATE', timeout=timeout)
+        saved = f"{path}.before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        shutil.copy2(path, saved)
+
+    source = sqlite3.connect(f'file:{backup_path}?mode=ro', uri=True)
+    destination = _connect(path, timeout)
+    try:
+        source.backup(destination, pages=pages_per_step)
+    finally:
+        source.close()
+        destination.close()
+    return saved
@@ -0,0 +1,1222 @@
+# -*- coding: utf-8 -*-
+"""管理后台"""
+
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, render_template, request, jsonify, redirect, url_for, flash, Response, stream_with_context
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+
+from ..extensions import db
+from ..models import (ORDER_STATUS_FLOW, User, Product, Order, OrderItem, OrderRecord, OrderEvent, StockReservation,
+                      StockShard, current_order_status, record_order_event)
+from ..inventory import (_invalidate_hot_products, _stock_totals, _shard_totals, _write_shards, _shard_count,
+                         _effective_stock, _variant_shard_totals, _apply_variant_totals)
+from ..analytics import rollup_sales_daily, sales_analytics
+from ..projections import order_summary, run_projections
+from ..storage import get_storage
+from .storefront import change_password, from_json
+
+bp = Blueprint('admin', __name__)
+
+# 管理员路由
+@bp.route('/admin')
+@login_required
+def admin():
+    if not current_user.is_admin:
+        flash('Insufficient permissions')
+        return redirect(url_for('storefront.index'))
+    
+    # Get all orders grouped by order_number
+    all_orders = Order.query.order_by(Order.created_at.desc()).all()
+    
+    # Group orders by order_number
+    from collections import defaultdict
+    orders_by_number = defaultdict(list)
+    for order in all_orders:
+        orders_by_number[order.order_number].append(order)
+    
+    # Convert to list of order groups, each group represents one order with potentially multiple items
+    order_groups = []
+    for order_number, orders in orders_by_number.items():
+        # Sort orders in group by created_at to get the first one as primary
+        orders_sorted = sorted(orders, key=lambda x: x.created_at)
+        order_groups.append({
+            'order_number': order_number,
+            'primary_order': orders_sorted[0],  # First order as primary for display
+            'all_orders': orders_sorted,  # All orders with this order number
+            'total_amount': sum(o.total_price for o in orders_sorted),
+            'total_items': len(orders_sorted),
+            'created_at': orders_sorted[0].created_at,
+            'user': orders_sorted[0].user,
+            'contact_info': orders_sorted[0].contact_info,  # Contact information from first order
+            'status': orders_sorted[0].status  # Use first order's status
+        })
+    
+    # Sort order groups by creation time (most recent first)
+    order_groups.sort(key=lambda x: x['created_at'], reverse=True)
+    
+    # Get order records for each order group
+    for group in order_groups:
+        records = OrderRecord.query.filter_by(order_number=group['order_number']).order_by(OrderRecord.created_at.desc()).all()
+        group['records'] = records
+    
+    # Live updates resume from the newest event at render time
+    last_event_id = db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+    
+    current_app.logger.info(f'Admin page: Found {len(all_orders)} order records, {len(order_groups)} unique orders for user {current_user.username}')
+    return render_template('admin.html', order_groups=order_groups, total_orders=len(all_orders), last_event_id=last_event_id,
+                           live_stream=current_app.config['SSE_ENABLED'],
+                           poll_interval=current_app.config['ADMIN_POLL_INTERVAL'])
+
+@bp.route('/admin/order_card/<order_number>')
+@login_required
+def admin_order_card(order_number):
+    """Render a single order card so admin.html can patch one order in place"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    
+    orders = Order.query.filter_by(order_number=order_number).order_by(Order.created_at).all()
+    if not orders:
+        return '', 404
+    
+    group = {
+        'order_number': order_number,
+        'primary_order': orders[0],
+        'all_orders': orders,
+        'total_amount': sum(o.total_price for o in orders),
+        'total_items': len(orders),
+        'created_at': orders[0].created_at,
+        'user': orders[0].user,
+        'contact_info': orders[0].contact_info,
+        'status': orders[0].status,
+        'records': OrderRecord.query.filter_by(order_number=order_number).order_by(OrderRecord.created_at.desc()).all()
+    }
+    return render_template('admin_order_card.html', group=group)
+
+@bp.route('/admin/events')
+@login_required
+def admin_events():
+    """Server-Sent Events stream of order events for the admin dashboard (ASGI workers only)
+
+    Resumes after the Last-Event-ID header (sent by EventSource on reconnect) or the
+    last_event_id query parameter. Between events the stream waits on the host-wide event
+    counter instead of querying the database, and ends after SSE_STREAM_SECONDS so the
+    browser reconnects and resumes. Without SSE_ENABLED, or when this process already has
+    SSE_MAX_STREAMS open, it answers 204, which stops EventSource and makes the page poll
+    /admin/order_changes instead.
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    
+    notifier = current_app.extensions['order_event_notifier']
+    if not current_app.config['SSE_ENABLED']:
+        return '', 204
+    
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id)
+    except (ValueError, TypeError):
+        last_id = db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+    
+    stream_seconds = current_app.config['SSE_STREAM_SECONDS']
+    retry_seconds = current_app.config['SSE_RETRY_SECONDS']
+    
+    def stream(last_id):
+        deadline = time.monotonic() + stream_seconds
+        yield f"retry: {int(retry_seconds * 1000)}\n\n"
+        # The counter is read before each query, so a commit in between is not missed
+        seen = notifier.current()
+        while True:
+            events = OrderEvent.query.filter(OrderEvent.id > last_id).order_by(OrderEvent.id).limit(100).all()
+            for event in events:
+                last_id = event.id
+                yield f"id: {event.id}\nevent: {event.event_type}\ndata: {event.payload_json()}\n\n"
+            # Release the connection while idle
+            db.session.close()
+            if len(events) == 100:
+                continue
+            while time.monotonic() < deadline:
+                changed = notifier.wait(seen, min(15, deadline - time.monotonic()))
+                if changed != seen:
+                    seen = changed
+                    break
+                yield ": keepalive\n\n"
+            else:
+                break
+    
+    response = Response(stream_with_context(stream(last_id)), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Disable nginx buffering for this response
+    })
+    # Take the stream slot only once the response exists, so nothing can fail before
+    # call_on_close is registered to release it
+    if not notifier.open_stream():
+        response.close()
+        return '', 204
+    response.call_on_close(notifier.close_stream)
+    return response
+
+@bp.route('/admin/order_changes')
+@login_required
+def admin_order_changes():
+    """Order numbers changed after the `since` event id, for dashboards that poll instead of streaming
+
+    One indexed range read on order_events; the page then re-renders each changed card
+    through admin_order_card and polls again with the returned last_event_id.
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+        return jsonify({'success': True, 'last_event_id': since, 'order_numbers': []})
+    
+    rows = db.session.query(OrderEvent.id, OrderEvent.order_number).filter(
+        OrderEvent.id > since
+    ).order_by(OrderEvent.id).limit(500).all()
+    return jsonify({
+        'success': True,
+        'last_event_id': rows[-1][0] if rows else since,
+        'order_numbers': list(dict.fromkeys(order_number for _, order_number in rows))
+    })
+
+@bp.route('/admin/products')
+@login_required
+def admin_products():
+    if not current_user.is_admin:
+        flash('Insufficient permissions')
+        return redirect(url_for('storefront.index'))
+    
+    products = Product.query.all()
+    shard_counts = dict(db.session.query(StockShard.product_id, db.func.count(StockShard.id)).filter(
+        StockShard.variant == ''
+    ).group_by(StockShard.product_id).all())
+    return render_template('admin_products.html', products=products, shard_counts=shard_counts)
+
+@bp.route('/admin/add_product', methods=['GET', 'POST'])
+@login_required
+def add_product():
+    if not current_user.is_admin:
+        flash('Insufficient permissions')
+        return redirect(url_for('storefront.index'))
+    
+    if request.method == 'POST':
+        name = request.form['name']
+        price = float(request.form['price'])
+        description = request.form['description']
+        stock = int(request.form['stock'])
+        variants_text = request.form.get('variants', '').strip()
+        
+        # Parse variants (JSON array of objects with name and stock)
+        variants = None
+        if variants_text:
+            import json
+            try:
+                # Try to parse as JSON (new format: [{"name": "XL", "stock": 10}, ...])
+                variant_list = json.loads(variants_text)
+                if isinstance(variant_list, list) and len(variant_list) > 0:
+                    # Validate and clean variant data
+                    cleaned_variants = []
+                    for v in variant_list:
+                        if isinstance(v, dict) and 'name' in v:
+                            cleaned_variants.append({
+                                'name': str(v['name']).strip(),
+                                'stock': int(v.get('stock', 0))
+                            })
+                    if cleaned_variants:
+                        variants = json.dumps(cleaned_variants)
+            except (json.JSONDecodeError, ValueError, TypeError):
+                # Fallback to old format (comma-separated string)
+                variant_list = [v.strip() for v in variants_text.split(',') if v.strip()]
+                if variant_list:
+                    # Convert old format to new format
+                    cleaned_variants = [{'name': v, 'stock': 0} for v in variant_list]
+                    variants = json.dumps(cleaned_variants)
+        
+        # Handle images upload (support multiple images, max 6)
+        images = []
+        storage = get_storage()
+        if 'images' in request.files:
+            files = request.files.getlist('images')
+            for file in files:
+                if file and file.filename:
+                    filename = secure_filename(file.filename)
+                    filename = f"{uuid.uuid4().hex}_{filename}"
+                    storage.save(filename, file.stream, file.mimetype)
+                    images.append(filename)
+                    # Limit to 6 images
+                    if len(images) >= 6:
+                        break
+        
+        # Store images as JSON array (compatible with old single image format)
+        import json
+        if images:
+            image = json.dumps(images) if len(images) > 1 else images[0]
+        else:
+            image = None
+        
+        product = Product(
+            name=name,
+            price=price,
+            description=description,
+            stock=stock,
+            image=image,
+            variants=variants
+        )
+        db.session.add(product)
+        db.session.commit()
+        
+        flash('Product added successfully')
+        return redirect(url_for('admin.admin_products'))
+    
+    return render_template('add_product.html')
+
+# 商品批量导入/导出
+PRODUCT_IO_FIELDS = ['name', 'price', 'stock', 'description', 'image', 'variants']
+PRODUCT_IMPORT_CHUNK_SIZE = 500
+PRODUCT_EXPORT_BATCH_SIZE = 500
+MAX_REPORTED_IMPORT_ERRORS = 1000
+PRODUCT_IMPORT_DEFAULTS = {'stock': 0, 'description': '', 'image': None, 'variants': None}
+
+def _iter_import_rows(file, file_format):
+    """Yield (row_number, row dict or error message) from an uploaded CSV or JSONL stream"""
+    import csv
+    import io
+    import json
+    text = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(text), start=2):  # Row 1 is the header
+            yield row_number, row
+    else:
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, f'Invalid JSON: {e.msg}'
+                continue
+            yield row_number, row if isinstance(row, dict) else 'Each line must be a JSON object'
+
+def _validate_import_row(row):
+    """Convert a raw import row into Product column values; raises ValueError with a readable message"""
+    import json
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    if len(name) > 100:
+        raise ValueError('name must be at most 100 characters')
+    try:
+        price = float(row.get('price'))
+    except (ValueError, TypeError):
+        raise ValueError('price must be a number')
+    if price < 0:
+        raise ValueError('price must not be negative')
+    values = {'name': name, 'price': price}
+    
+    # Optional fields: only columns present (and non-empty in CSV) are written, so updates keep the rest
+    def provided(field):
+        return row.get(field) not in (None, '')
+    
+    if provided('stock'):
+        try:
+            values['stock'] = int(row['stock'])
+        except (ValueError, TypeError):
+            raise ValueError('stock must be an integer')
+    
+    if provided('description'):
+        values['description'] = str(row['description'])
+    
+    if provided('image'):
+        image = row['image']
+        if isinstance(image, list):
+            image = json.dumps(image) if len(image) > 1 else (image[0] if image else None)
+        values['image'] = image
+    
+    # Variants: JSON list of {"name", "stock"} (a JSON string in CSV) or comma-separated names
+    if provided('variants'):
+        variants = row['variants']
+        if isinstance(variants, str):
+            try:
+                variants = json.loads(variants)
+            except json.JSONDecodeError:
+                variants = [v.strip() for v in variants.split(',') if v.strip()]
+        if not isinstance(variants, list):
+            raise ValueError('variants must be a list')
+        cleaned_variants = []
+        for v in variants:
+            if isinstance(v, dict) and 'name' in v:
+                try:
+                    cleaned_variants.append({'name': str(v['name']).strip(), 'stock': int(v.get('stock', 0))})
+                except (ValueError, TypeError):
+                    raise ValueError(f"variant {v.get('name')} has an invalid stock")
+            elif isinstance(v, str) and v.strip():
+                cleaned_variants.append({'name': v.strip(), 'stock': 0})
+        values['variants'] = json.dumps(cleaned_variants) if cleaned_variants else None
+    
+    return values
+
+def _import_product_chunk(chunk):
+    """Upsert a chunk of validated rows by product name; returns (created, updated)"""
+    # Later rows with the same name win
+    by_name = {}
+    for values in chunk:
+        by_name[values['name']] = values
+    
+    existing = db.session.query(Product.id, Product.name).filter(Product.name.in_(list(by_name))).all()
+    existing_ids = {name: product_id for product_id, name in existing}
+    
+    updates = []
+    inserts = []
+    for name, values in by_name.items():
+        if name in existing_ids:
+            updates.append(dict(values, id=existing_ids[name]))
+        else:
+            inserts.append({**PRODUCT_IMPORT_DEFAULTS, **values, 'created_at': datetime.utcnow()})
+    
+    if updates:
+        db.session.bulk_update_mappings(Product, updates)
+        # Imported stock of flash-sale products is spread over their shards
+        stock_ids = [values['id'] for values in updates if 'stock' in values or 'variants' in values]
+        hot_ids = [row[0] for row in db.session.query(StockShard.product_id).filter(
+            StockShard.product_id.in_(stock_ids)
+        ).distinct()] if stock_ids else []
+        if hot_ids:
+            table = Product.__table__
+            for product_id, stock, variants in db.session.execute(
+                db.select(table.c.id, table.c.stock, table.c.variants).where(table.c.id.in_(hot_ids))
+            ):
+                shard_count = _shard_count(product_id)
+                if shard_count:
+                    _write_shards(product_id, _stock_totals(stock, variants), shard_count)
+    if inserts:
+        db.session.execute(Product.__table__.insert(), inserts)
+    db.session.commit()
+    return len(inserts), len(updates)
+
+@bp.route('/admin/import_products', methods=['POST'])
+@login_required
+def import_products():
+    """Stream a CSV or JSONL product file into the catalog in validated, batched chunks"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'message': 'Please select a CSV or JSONL file'})
+    
+    extension = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+    file_format = request.form.get('format') or ('jsonl' if extension in ('jsonl', 'json', 'ndjson') else 'csv')
+    if file_format not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'Format must be csv or jsonl'})
+    
+    created = updated = 0
+    errors = []
+    error_count = 0
+    chunk = []
+    try:
+        for row_number, row in _iter_import_rows(file, file_format):
+            try:
+                if isinstance(row, str):
+                    raise ValueError(row)
+                chunk.append(_validate_import_row(row))
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_IMPORT_ERRORS:
+                    errors.append({'row': row_number, 'message': str(e)})
+                continue
+            
+            if len(chunk) >= PRODUCT_IMPORT_CHUNK_SIZE:
+                chunk_created, chunk_updated = _import_product_chunk(chunk)
+                created += chunk_created
+                updated += chunk_updated
+                chunk = []
+        
+        if chunk:
+            chunk_created, chunk_updated = _import_product_chunk(chunk)
+            created += chunk_created
+            updated += chunk_updated
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'File must be UTF-8 encoded',
+                        'created': created, 'updated': updated, 'errors': errors})
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error importing products: {str(e)}')
+        return jsonify({'success': False, 'message': f'Import failed: {str(e)}',
+                        'created': created, 'updated': updated, 'errors': errors})
+    
+    return jsonify({
+        'success': True,
+        'message': f'Imported products: {created} created, {updated} updated, {error_count} row(s) rejected',
+        'created': created,
+        'updated': updated,
+        'error_count': error_count,
+        'errors': errors
+    })
+
+@bp.route('/admin/export_products')
+@login_required
+def export_products():
+    """Stream the whole catalog as CSV or JSONL in constant memory"""
+    if not current_user.is_admin:
+        flash('Insufficient permissions')
+        return redirect(url_for('storefront.index'))
+    
+    file_format = request.args.get('format', 'csv')
+    if file_format not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'Format must be csv or jsonl'}), 400
+    
+    # Stock as the storefront sees it: flash-sale products keep theirs in stock shards
+    columns = [_effective_stock() if field == 'stock' else getattr(Product, field) for field in PRODUCT_IO_FIELDS]
+    
+    def generate():
+        import csv
+        import io
+        import json
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if file_format == 'csv':
+            writer.writerow(PRODUCT_IO_FIELDS)
+            yield buffer.getvalue()
+        
+        last_id = 0
+        while True:
+            # Keyset pagination over plain tuples: no ORM objects, fixed-size batches
+            rows = db.session.query(Product.id, *columns).filter(Product.id > last_id) \
+                .order_by(Product.id).limit(PRODUCT_EXPORT_BATCH_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            variant_totals = _variant_shard_totals([row[0] for row in rows])
+            
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                values = dict(zip(PRODUCT_IO_FIELDS, row[1:]))
+                if row[0] in variant_totals and values['variants']:
+                    values['variants'] = _apply_variant_totals(values['variants'], variant_totals[row[0]])
+                if file_format == 'csv':
+                    writer.writerow([values[field] if values[field] is not None else '' for field in PRODUCT_IO_FIELDS])
+                else:
+                    values['variants'] = from_json(values['variants'])
+                    buffer.write(json.dumps(values, ensure_ascii=False) + '\n')
+            yield buffer.getvalue()
+            db.session.close()
+    
+    filename = f"products_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+    mimetype = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.route('/admin/product_flash_sale', methods=['POST'])
+@login_required
+def product_flash_sale():
+    """Switch a product's stock into sharded counters for a sale, rebalance them, or collapse them back"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    data = request.get_json() or {}
+    action = data.get('action')
+    product = db.session.get(Product, data.get('product_id'))
+    if not product:
+        return jsonify({'success': False, 'message': 'Product not found'})
+    if action not in ('enable', 'rebalance', 'collapse'):
+        return jsonify({'success': False, 'message': 'Invalid action'})
+    
+    try:
+        # Write first so the shard totals read below cannot change under concurrent checkouts
+        Product.query.filter_by(id=product.id).update({Product.stock: Product.stock}, synchronize_session=False)
+        stock, variants = db.session.execute(
+            db.select(Product.__table__.c.stock, Product.__table__.c.variants).where(Product.__table__.c.id == product.id)
+        ).one()
+        shard_count = _shard_count(product.id)
+        
+        if action == 'enable':
+            if shard_count:
+                return jsonify({'success': False, 'message': 'Product is already in flash-sale mode'})
+            try:
+                shard_count = int(data.get('shards') or current_app.config['FLASH_SALE_SHARDS'])
+            except (ValueError, TypeError):
+                return jsonify({'success': False, 'message': 'Invalid shard count'})
+            if not 2 <= shard_count <= 64:
+                return jsonify({'success': False, 'message': 'Shard count must be between 2 and 64'})
+            _write_shards(product.id, _stock_totals(stock, variants), shard_count)
+            message = f'Flash-sale mode enabled with {shard_count} stock shards'
+        elif not shard_count:
+            return jsonify({'success': False, 'message': 'Product is not in flash-sale mode'})
+        elif action == 'rebalance':
+            _write_shards(product.id, _shard_totals(product.id), shard_count)
+            message = f'Stock rebalanced across {shard_count} shards'
+        else:
+            # Write the shard sums back to the product row and drop the shards
+            import json
+            totals = _shard_totals(product.id)
+            values = {'stock': totals.get('', 0)}
+            if variants:
+                try:
+                    variants_list = json.loads(variants)
+                    for v in variants_list:
+                        if isinstance(v, dict) and v.get('name') in totals:
+                            v['stock'] = totals[v['name']]
+                    values['variants'] = json.dumps(variants_list)
+                except (json.JSONDecodeError, ValueError, TypeError):
+                    pass
+            db.session.execute(Product.__table__.update().where(Product.__table__.c.id == product.id).values(**values))
+            StockShard.query.filter_by(product_id=product.id).delete(synchronize_session=False)
+            message = f'Flash-sale mode ended, stock {values["stock"]} written back to the product'
+        
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Flash-sale {action} failed for product {product.id}: {str(e)}')
+        return jsonify({'success': False, 'message': f'Failed to update flash-sale mode: {str(e)}'})
+    
+    _invalidate_hot_products()
+    current_app.logger.info(f'Flash-sale {action} for product {product.id} ({product.name}): {message}')
+    return jsonify({'success': True, 'message': message})
+
+@bp.route('/admin/get_orders_by_number')
+@login_required
+def get_orders_by_number():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    order_number = request.args.get('order_number')
+    if not order_number:
+        return jsonify({'success': False, 'message': 'Order number required'})
+    
+    orders = Order.query.filter_by(order_number=order_number).all()
+    order_ids = [order.id for order in orders]
+    
+    return jsonify({'success': True, 'order_ids': order_ids})
+
+@bp.route('/admin/update_order_status', methods=['POST'])
+@login_required
+def update_order_status():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    order_id = request.json.get('order_id')
+    status = request.json.get('status')
+    if status not in ORDER_STATUS_FLOW:
+        return jsonify({'success': False, 'message': f'Invalid status: {status}'})
+    
+    order = Order.query.get_or_404(order_id)
+    previous = order.status
+    # Orders only move one step forward along ORDER_STATUS_FLOW
+    rank = ORDER_STATUS_FLOW.index(status)
+    if rank == 0 or previous != ORDER_STATUS_FLOW[rank - 1]:
+        return jsonify({'success': False, 'message': f'Cannot move order from {previous} to {status}'})
+    
+    # Conditional update, so a concurrent change of the same item is not overwritten
+    if not Order.query.filter_by(id=order.id, status=previous).update({'status': status}, synchronize_session=False):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Order status was changed by someone else, please reload'})
+    record_order_event('status_changed', order.order_number, order_id=order.id, status=status, previous=previous,
+                       order_status=current_order_status(order.order_number))
+    db.session.commit()
+    
+    return jsonify({'success': True})
+
+@bp.route('/admin/bulk_update_order_status', methods=['POST'])
+@login_required
+def bulk_update_order_status():
+    """Move one or more orders (by order number) one step forward to a new status
+
+    Each order gets one guarded UPDATE (status must still be the previous step); orders whose
+    UPDATE matches no rows were changed by someone else meanwhile and are reported as skipped.
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    data = request.get_json(silent=True) or {}
+    order_numbers = data.get('order_numbers') or []
+    status = data.get('status')
+    
+    if isinstance(order_numbers, str):
+        order_numbers = [order_numbers]
+    order_numbers = list(dict.fromkeys(n for n in order_numbers if isinstance(n, str) and n))
+    if not order_numbers:
+        return jsonify({'success': False, 'message': 'Order number required'})
+    if status not in ORDER_STATUS_FLOW:
+        return jsonify({'success': False, 'message': f'Invalid status: {status}'})
+    
+    target_rank = ORDER_STATUS_FLOW.index(status)
+    # The only status an order may move to `status` from (None for the first status)
+    previous_status = ORDER_STATUS_FLOW[target_rank - 1] if target_rank > 0 else None
+    
+    try:
+        # Current statuses of every item in the selected orders (one query)
+        rows = db.session.query(Order.order_number, Order.status).filter(
+            Order.order_number.in_(order_numbers)
+        ).distinct().all()
+        statuses = {}
+        for order_number, current_status in rows:
+            statuses.setdefault(order_number, set()).add(current_status)
+        
+        updated = []
+        rejected = []
+        for order_number in order_numbers:
+            current = statuses.get(order_number)
+            if not current:
+                rejected.append({'order_number': order_number, 'message': 'Order not found'})
+                continue
+            if current == {status}:
+                rejected.append({'order_number': order_number, 'message': f'Order is already {status}'})
+            elif previous_status is None or not current <= {previous_status, status}:
+                # Items already at `status` are left alone; every other item must be one step behind
+                moving = ', '.join(sorted(current - {status}))
+                rejected.append({'order_number': order_number, 'message': f'Cannot move order from {moving} to {status}'})
+            else:
+                updated.append(order_number)
+        
+        skipped = []
+        if updated:
+            checked, updated = updated, []
+            for order_number in checked:
+                matched = Order.query.filter(
+                    Order.order_number == order_number,
+                    Order.status == previous_status
+                ).update({'status': status}, synchronize_session=False)
+                if matched:
+                    updated.append(order_number)
+                    record_order_event('status_changed', order_number, status=status, order_status=status)
+                else:
+                    skipped.append({'order_number': order_number, 'message': 'Order status changed meanwhile, not updated'})
+            db.session.commit()
+        
+        return jsonify({'success': bool(updated), 'updated': updated, 'rejected': rejected, 'skipped': skipped,
+                        'message': f'{len(updated)} order(s) updated to {status}'})
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error bulk updating order status: {str(e)}')
+        return jsonify({'success': False, 'message': f'Failed to update orders: {str(e)}'})
+
+ORDER_EXPORT_FIELDS = ['order_number', 'created_at', 'status', 'user_id', 'username', 'email', 'phone',
+                       'contact_info', 'product_id', 'product_name', 'variant', 'quantity', 'unit_price',
+                       'line_total', 'records']
+ORDER_EXPORT_BATCH_SIZE = 1000
+
+@bp.route('/admin/export_orders')
+@login_required
+def export_orders():
+    """Stream order lines with contact info and record links as CSV or JSONL for accounting
+
+    Query parameters: format (csv|jsonl), start and end (YYYY-MM-DD, inclusive),
+    status, user_id or username. Rows are read in fixed-size keyset batches of plain
+    tuples, so memory is constant and no read transaction stays open between batches.
+    """
+    if not current_user.is_admin:
+        flash('Insufficient permissions')
+        return redirect(url_for('storefront.index'))
+    
+    file_format = request.args.get('format', 'csv')
+    if file_format not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'Format must be csv or jsonl'}), 400
+    
+    filters = []
+    try:
+        if request.args.get('start'):
+            filters.append(Order.created_at >= datetime.strptime(request.args['start'], '%Y-%m-%d'))
+        if request.args.get('end'):
+            filters.append(Order.created_at < datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must use the YYYY-MM-DD format'}), 400
+    if request.args.get('status'):
+        filters.append(Order.status == request.args['status'])
+    if request.args.get('user_id'):
+        try:
+            filters.append(Order.user_id == int(request.args['user_id']))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'user_id must be an integer'}), 400
+    if request.args.get('username'):
+        filters.append(User.username == request.args['username'])
+    
+    # Record links point at the access-controlled image route
+    record_url_prefix = request.url_root + 'records/'
+    
+    def generate():
+        import csv
+        import io
+        import json
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if file_format == 'csv':
+            writer.writerow(ORDER_EXPORT_FIELDS)
+            yield buffer.getvalue()
+        
+        last_id = 0
+        while True:
+            rows = db.session.query(
+                Order.id, Order.order_number, Order.created_at, Order.status, Order.user_id,
+                User.username, User.email, User.phone, Order.contact_info, Order.product_id,
+                Product.name, Order.variant, Order.quantity, Order.total_price
+            ).join(User, User.id == Order.user_id) \
+             .outerjoin(Product, Product.id == Order.product_id) \
+             .filter(Order.id > last_id, *filters) \
+             .order_by(Order.id).limit(ORDER_EXPORT_BATCH_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            
+            # Record links for every order number in this batch (one query)
+            order_numbers = {row[1] for row in rows}
+            records = {}
+            for order_number, record_type, record_id in db.session.query(
+                    OrderRecord.order_number, OrderRecord.record_type, OrderRecord.id
+            ).filter(OrderRecord.order_number.in_(order_numbers)).order_by(OrderRecord.id):
+                records.setdefault(order_number, []).append(f'{record_type}:{record_url_prefix}{record_id}/image')
+            db.session.close()
+            
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                quantity, line_total = row[12], row[13]
+                values = {
+                    'order_number': row[1],
+                    'created_at': row[2].strftime('%Y-%m-%d %H:%M:%S') if row[2] else '',
+                    'status': row[3],
+                    'user_id': row[4],
+                    'username': row[5],
+                    'email': row[6],
+                    'phone': row[7],
+                    'contact_info': row[8] or '',
+                    'product_id': row[9],
+                    'product_name': row[10] or '',
+                    'variant': row[11] or '',
+                    'quantity': quantity,
+                    'unit_price': round(line_total / quantity, 2) if quantity else line_total,
+                    'line_total': line_total,
+                    'records': records.get(row[1], [])
+                }
+                if file_format == 'csv':
+                    values['records'] = ' | '.join(values['records'])
+                    writer.writerow([values[field] for field in ORDER_EXPORT_FIELDS])
+                else:
+                    buffer.write(json.dumps(values, ensure_ascii=False) + '\n')
+            yield buffer.getvalue()
+    
+    filename = f"orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+    mimetype = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.route('/admin/delete_order', methods=['POST'])
+@login_required
+def delete_order():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    order_number = request.json.get('order_number')
+    if not order_number:
+        return jsonify({'success': False, 'message': 'Order number required'})
+    
+    try:
+        # Get all orders with this order number
+        orders = Order.query.filter_by(order_number=order_number).all()
+        
+        if not orders:
+            return jsonify({'success': False, 'message': 'Order not found'})
+        
+        # Check if all orders are completed
+        for order in orders:
+            if order.status != 'completed':
+                return jsonify({'success': False, 'message': 'Only completed orders can be deleted'})
+        
+        # Delete all orders with this order number
+        for order in orders:
+            db.session.delete(order)
+        record_order_event('order_deleted', order_number, items=len(orders),
+                           total=sum(o.total_price for o in orders), deleted_by=current_user.id)
+        
+        db.session.commit()
+        return jsonify({'success': True, 'message': f'Order {order_number} deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error deleting order {order_number}: {str(e)}')
+        return jsonify({'success': False, 'message': f'Failed to delete order: {str(e)}'})
+
+@bp.route('/admin/edit_product/<int:product_id>', methods=['GET', 'POST'])
+@login_required
+def edit_product(product_id):
+    if not current_user.is_admin:
+        flash('Insufficient permissions')
+        return redirect(url_for('storefront.index'))
+    
+    product = Product.query.get_or_404(product_id)
+    
+    if request.method == 'POST':
+        product.name = request.form['name']
+        product.price = float(request.form['price'])
+        product.description = request.form['description']
+        product.stock = int(request.form['stock'])
+        variants_text = request.form.get('variants', '').strip()
+        
+        # Parse variants (JSON array of objects with name and stock)
+        if variants_text:
+            import json
+            try:
+                # Try to parse as JSON (new format: [{"name": "XL", "stock": 10}, ...])
+                variant_list = json.loads(variants_text)
+                if isinstance(variant_list, list) and len(variant_list) > 0:
+                    # Validate and clean variant data
+                    cleaned_variants = []
+                    for v in variant_list:
+                        if isinstance(v, dict) and 'name' in v:
+                            cleaned_variants.append({
+                                'name': str(v['name']).strip(),
+                                'stock': int(v.get('stock', 0))
+                            })
+                    if cleaned_variants:
+                        product.variants = json.dumps(cleaned_variants)
+                    else:
+                        product.variants = None
+                else:
+                    product.variants = None
+            except (json.JSONDecodeError, ValueError, TypeError):
+                # Fallback to old format (comma-separated string)
+                variant_list = [v.strip() for v in variants_text.split(',') if v.strip()]
+                if variant_list:
+                    # Convert old format to new format
+                    cleaned_variants = [{'name': v, 'stock': 0} for v in variant_list]
+                    product.variants = json.dumps(cleaned_variants)
+                else:
+                    product.variants = None
+        else:
+            product.variants = None
+        
+        # Handle images upload (support multiple images, max 6)
+        if 'images' in request.files:
+            files = request.files.getlist('images')
+            if files and any(f.filename for f in files):
+                storage = get_storage()
+                # Delete old images
+                if product.image:
+                    import json
+                    try:
+                        # Try to parse as JSON array (new format)
+                        old_images = json.loads(product.image)
+                        if isinstance(old_images, list):
+                            for old_img in old_images:
+                                storage.delete(old_img)
+                        else:
+                            # Old format: single image string
+                            storage.delete(product.image)
+                    except (json.JSONDecodeError, ValueError, TypeError):
+                        # Old format: single image string
+                        storage.delete(product.image)
+                
+                # Save new images
+                new_images = []
+                for file in files:
+                    if file and file.filename:
+                        filename = secure_filename(file.filename)
+                        filename = f"{uuid.uuid4().hex}_{filename}"
+                        storage.save(filename, file.stream, file.mimetype)
+                        new_images.append(filename)
+                        # Limit to 6 images
+                        if len(new_images) >= 6:
+                            break
+                
+                # Store images as JSON array (compatible with old single image format)
+                if new_images:
+                    product.image = json.dumps(new_images) if len(new_images) > 1 else new_images[0]
+        
+        # Stock of a flash-sale product lives in its shards, spread the edited stock over them
+        shard_count = _shard_count(product.id)
+        if shard_count:
+            _write_shards(product.id, _stock_totals(product.stock, product.variants), shard_count)
+        
+        db.session.commit()
+        flash('Product updated successfully')
+        return redirect(url_for('admin.admin_products'))
+    
+    return render_template('edit_product.html', product=product)
+
+@bp.route('/admin/delete_product', methods=['POST'])
+@login_required
+def delete_product():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    product_id = request.json.get('product_id')
+    product = Product.query.get_or_404(product_id)
+    
+    # Collect image files now, remove them only after the transaction has committed
+    image_paths = []
+    if product.image:
+        import json
+        try:
+            # Try to parse as JSON array (new format)
+            images = json.loads(product.image)
+            image_paths = images if isinstance(images, list) else [product.image]
+        except (json.JSONDecodeError, ValueError, TypeError):
+            # Old format: single image string
+            image_paths = [product.image]
+    
+    try:
+        # Set-based deletes: no ORM objects are loaded for related orders
+        affected = db.session.query(
+            Order.order_number, db.func.count(Order.id), db.func.sum(Order.total_price)
+        ).filter(Order.product_id == product_id).group_by(Order.order_number).all()
+        order_ids = db.select(Order.id).where(Order.product_id == product_id)
+        OrderItem.query.filter(
+            db.or_(OrderItem.product_id == product_id, OrderItem.order_id.in_(order_ids))
+        ).delete(synchronize_session=False)
+        deleted_orders = Order.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+        for order_number, items, total in affected:
+            record_order_event('order_items_deleted', order_number, product_id=product_id, items=items, total=total,
+                               order_status=current_order_status(order_number))
+        StockShard.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+        StockReservation.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+        
+        # Delete product
+        db.session.expunge(product)
+        Product.query.filter_by(id=product_id).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error deleting product {product_id}: {str(e)}')
+        return jsonify({'success': False, 'message': f'Failed to delete product: {str(e)}'})
+    
+    # Delete product images outside the transaction
+    storage = get_storage()
+    for img in image_paths:
+        try:
+            storage.delete(img)
+        except Exception as e:
+            current_app.logger.warning(f'Could not remove image {img} of deleted product {product_id}: {str(e)}')
+    
+    current_app.logger.info(f'Deleted product {product_id} and {deleted_orders} related order item(s)')
+    return jsonify({'success': True, 'message': 'Product deleted successfully'})
+
+@bp.route('/admin/analytics')
+@login_required
+def admin_analytics():
+    if not current_user.is_admin:
+        flash('Insufficient permissions')
+        return redirect(url_for('storefront.index'))
+    
+    days = request.args.get('days', 30, type=int)
+    days = min(max(days, 1), 365)
+    return render_template('admin_analytics.html', analytics=sales_analytics(days))
+
+@bp.route('/admin/analytics/data')
+@login_required
+def admin_analytics_data():
+    """Sales analytics as JSON, read from the daily rollup tables"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    
+    days = request.args.get('days', 30, type=int)
+    days = min(max(days, 1), 365)
+    return jsonify({'success': True, **sales_analytics(days)})
+
+@bp.route('/admin/analytics/refresh', methods=['POST'])
+@login_required
+def admin_analytics_refresh():
+    """Run the incremental sales rollup now instead of waiting for the scheduled job"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    
+    try:
+        aggregated = rollup_sales_daily()
+    except Exception as e:
+        current_app.logger.error(f'Sales rollup failed: {str(e)}')
+        return jsonify({'success': False, 'message': f'Rollup failed: {str(e)}'}), 500
+    return jsonify({'success': True, 'message': f'Aggregated {aggregated} new order items'})
+
+@bp.route('/admin/order_stats')
+@login_required
+def admin_order_stats():
+    """Orders and revenue per status and orders awaiting a payment proof, from the event projections
+
+    Applies the events recorded since the last run first, so the answer is current while the
+    work done is proportional to the changes since then.
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    try:
+        run_projections(current_app.config['PROJECTION_BATCH_SIZE'])
+    except Exception as e:
+        # Serve the last committed state; the scheduled job will catch up
+        current_app.logger.error(f'Order projections failed: {str(e)}')
+    return jsonify({'success': True, **order_summary(limit)})
+
+@bp.route('/admin/memory', methods=['GET', 'POST'])
+@login_required
+def admin_memory():
+    """Memory report of the worker serving this request; POST takes a new baseline (MEMORY_PROFILING only)"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    
+    profiler = current_app.extensions.get('memory_profiler')
+    if profiler is None:
+        return jsonify({'success': False, 'message': 'Memory profiling is disabled (set MEMORY_PROFILING=1)'}), 404
+    
+    if request.method == 'POST':
+        profiler.baseline()
+        return jsonify({'success': True, 'message': f'Baseline taken in worker {os.getpid()}'})
+    
+    report = profiler.report(limit=min(request.args.get('limit', 25, type=int), 200))
+    if request.args.get('dump') == '1':
+        report['dump'] = profiler.dump('admin request')
+    return jsonify({'success': True, **report})
+
+@bp.route('/admin/admission', methods=['GET', 'POST'])
+@login_required
+def admission():
+    """Admission control budgets, busy slots and shed counts across all workers; POST resets the counts"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'}), 403
+    
+    control = current_app.extensions.get('admission')
+    if control is None:
+        return jsonify({'success': False, 'message': 'Admission control is disabled (ADMISSION_CONTROL=0)'}), 404
+    
+    if request.method == 'POST':
+        control.reset_shed_counts()
+        return jsonify({'success': True, 'message': 'Shed counts reset'})
+    
+    return jsonify({
+        'success': True,
+        'limits': control.limits,
+        'in_flight': control.in_flight(),
+        'shed': control.shed_counts()
+    })
+
+def _prefix_match(column, prefix):
+    """Case-sensitive prefix match written as a range, so SQLite can use the column's index (LIKE cannot)"""
+    return db.and_(column >= prefix, column < prefix + '\U0010ffff')
+
+def _parse_user_cursor(cursor):
+    """Decode a users page cursor '<created_at>_<id>'; None when missing or malformed"""
+    try:
+        created_at, user_id = cursor.rsplit('_', 1)
+        return datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S.%f'), int(user_id)
+    except (AttributeError, ValueError):
+        return None
+
+@bp.route('/admin/users')
+@login_required
+def admin_users():
+    """Users newest first, paginated by keyset on (created_at, id) with optional prefix search
+
+    Query parameters: q (prefix of username, email or phone) and cursor (from the previous page).
+    """
+    if not current_user.is_admin:
+        flash('Insufficient permissions')
+        return redirect(url_for('storefront.index'))
+    
+    page_size = current_app.config['ADMIN_USERS_PAGE_SIZE']
+    search = request.args.get('q', '').strip()
+    cursor = _parse_user_cursor(request.args.get('cursor'))
+    
+    query = User.query
+    if search:
+        query = query.filter(db.or_(
+            _prefix_match(User.username, search),
+            _prefix_match(User.email, search),
+            _prefix_match(User.phone, search)
+        ))
+    if cursor:
+        created_at, user_id = cursor
+        query = query.filter(db.or_(
+            User.created_at < created_at,
+            db.and_(User.created_at == created_at, User.id < user_id)
+        ))
+    users = query.order_by(User.created_at.desc(), User.id.desc()).limit(page_size + 1).all()
+    
+    next_cursor = None
+    if len(users) > page_size:
+        users = users[:page_size]
+        last = users[-1]
+        if last.created_at:
+            next_cursor = f"{last.created_at:%Y-%m-%dT%H:%M:%S.%f}_{last.id}"
+    
+    # Order counts for this page only (one grouped query instead of loading every order)
+    order_counts = dict(db.session.query(Order.user_id, db.func.count(db.distinct(Order.order_number))).filter(
+        Order.user_id.in_([u.id for u in users])
+    ).group_by(Order.user_id).all()) if users else {}
+    
+    total_users = db.session.query(db.func.count(User.id)).scalar()
+    admin_count = db.session.query(db.func.count(User.id)).filter(User.is_admin.is_(True)).scalar()
+    
+    return render_template('admin_users.html', users=users, current_user=current_user,
+                           order_counts=order_counts, search=search, next_cursor=next_cursor,
+                           first_page=cursor is None, total_users=total_users, admin_count=admin_count)
+
+@bp.route('/admin/toggle_admin', methods=['POST'])
+@login_required
+def toggle_admin():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    user_id = request.json.get('user_id')
+    is_admin = request.json.get('is_admin')
+    
+    # Cannot modify own admin permissions
+    if user_id == current_user.id:
+        return jsonify({'success': False, 'message': 'Cannot modify own admin permissions'})
+    
+    user = User.query.get_or_404(user_id)
+    user.is_admin = is_admin
+    db.session.commit()
+    
+    action = 'set as admin' if is_admin else 'remove admin privileges'
+    return jsonify({'success': True, 'message': f'Successfully {action}'})
+
+@bp.route('/admin/bulk_toggle_admin', methods=['POST'])
+@login_required
+def bulk_toggle_admin():
+    """Grant or remove admin privileges for several users in a single UPDATE"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Insufficient permissions'})
+    
+    data = request.get_json(silent=True) or {}
+    is_admin = data.get('is_admin')
+    user_ids = list(dict.fromkeys(i for i in data.get('user_ids') or [] if isinstance(i, int) and not isinstance(i, bool)))
+    if not isinstance(is_admin, bool):
+        return jsonify({'success': False, 'message': 'is_admin must be true or false'})
+    if not user_ids:
+        return jsonify({'success': False, 'message': 'No users selected'})
+    
+    # Cannot modify own admin permissions
+    skipped_self = current_user.id in user_ids
+    user_ids = [i for i in user_ids if i != current_user.id]
+    
+    try:
+        updated = User.query.filter(
+            User.id.in_(user_ids),
+            User.is_admin.isnot(is_admin)
+        ).update({'is_admin': is_admin}, synchronize_session=False) if user_ids else 0
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error bulk updating admin privileges: {str(e)}')
+        return jsonify({'success': False, 'message': f'Failed to update users: {str(e)}'})
+    
+    action = 'set as admin' if is_admin else 'removed admin privileges'
+    message = f'{updated} user(s) {action}'
+    if skipped_self:
+        message += ' (your own account was skipped)'
+    return jsonify({'success': True, 'updated': updated, 'message': message})
+
+# 保留旧路由以兼容管理员菜单
+@bp.route('/admin/change_password', methods=['POST'])
+@login_required
+def admin_change_password():
+    """管理员修改密码（重定向到通用修改密码接口）"""
+    return change_password()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""公开的只读 JSON 商品目录 API (/api/v1)"""
+
+from flask import Blueprint, current_app, request, url_for
+from sqlalchemy.orm import load_only
+
+from ..inventory import _effective_stock
+from ..models import Product
+from ..storage import get_storage
+from .storefront import from_json
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+try:
+    import orjson
+
+    def _dumps(payload):
+        return orjson.dumps(payload)
+except ImportError:
+    import json
+
+    def _dumps(payload):
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+# 每个可选字段需要加载的列，fields= 只请求部分字段时只查询这些列
+PRODUCT_API_FIELDS = {
+    'id': [],
+    'name': ['name'],
+    'price': ['price'],
+    'description': ['description'],
+    'stock': ['stock', 'variants'],
+    'images': ['image'],
+    'variants': ['variants', 'stock'],
+    'created_at': ['created_at'],
+    'url': [],
+}
+
+def _json_response(payload, status=200):
+    """Serialize with the fastest available encoder; 200 responses get an ETag and honour If-None-Match"""
+    response = current_app.response_class(_dumps(payload), status=status, mimetype='application/json')
+    if status == 200:
+        response.add_etag()
+        response.headers['Cache-Control'] = f"public, max-age={current_app.config['API_CACHE_SECONDS']}"
+        response.make_conditional(request)
+    return response
+
+def _error(message, status):
+    return _json_response({'success': False, 'message': message}, status)
+
+def _requested_fields():
+    """Fields named in ?fields=a,b (all fields when absent); raises ValueError on unknown names"""
+    value = request.args.get('fields')
+    if not value:
+        return list(PRODUCT_API_FIELDS)
+    fields = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in PRODUCT_API_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(PRODUCT_API_FIELDS)}")
+    return fields
+
+def _product_query(fields):
+    columns = {column for field in fields for column in PRODUCT_API_FIELDS[field]}
+    return Product.query.options(load_only(*[getattr(Product, c) for c in sorted(columns)])) if columns \
+        else Product.query.options(load_only(Product.id))
+
+def _image_urls(value):
+    """Absolute URLs of a product's images (image is a JSON list of filenames, or one filename in old rows)"""
+    images = from_json(value) if value and value.lstrip().startswith('[') else ([value] if value else [])
+    storage = get_storage()
+    return [storage.url(name, external=True) for name in images if isinstance(name, str) and name]
+
+def _variants(value):
+    """Variants as [{"name": ..., "stock": ...}]; old rows store plain names without their own stock"""
+    variants = []
+    for v in from_json(value):
+        if isinstance(v, dict) and v.get('name'):
+            variants.append({'name': v['name'], 'stock': v.get('stock')})
+        elif isinstance(v, str):
+            variants.append({'name': v, 'stock': None})
+    return variants
+
+def _product_json(product, fields):
+    item = {}
+    for field in fields:
+        if field == 'images':
+            item['images'] = _image_urls(product.image)
+        elif field == 'variants':
+            item['variants'] = _variants(product.variants)
+        elif field == 'created_at':
+            item['created_at'] = product.created_at.isoformat() if product.created_at else None
+        elif field == 'url':
+            item['url'] = url_for('storefront.product_detail', product_id=product.id, _external=True)
+        else:
+            item[field] = getattr(product, field)
+    return item
+
+@bp.route('/products')
+def products():
+    """Catalog page ordered by id
+
+    Query parameters: fields (comma-separated projection), limit, cursor (next_cursor of the
+    previous page), in_stock=1, and ids=1,2,3 for a batch lookup returned in the requested order.
+    """
+    try:
+        fields = _requested_fields()
+    except ValueError as e:
+        return _error(str(e), 400)
+    max_page_size = current_app.config['API_MAX_PAGE_SIZE']
+
+    if request.args.get('ids'):
+        try:
+            ids = list(dict.fromkeys(int(i) for i in request.args['ids'].split(',') if i.strip()))
+        except ValueError:
+            return _error('ids must be a comma-separated list of integers', 400)
+        if len(ids) > max_page_size:
+            return _error(f'At most {max_page_size} ids per request', 400)
+        found = {p.id: p for p in _product_query(fields).filter(Product.id.in_(ids)).all()}
+        return _json_response({
+            'success': True,
+            'data': [_product_json(found[i], fields) for i in ids if i in found],
+            'missing': [i for i in ids if i not in found]
+        })
+
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    if not 1 <= limit <= max_page_size:
+        return _error(f'limit must be between 1 and {max_page_size}', 400)
+    cursor = request.args.get('cursor', 0, type=int)
+
+    # Keyset pagination on the primary key: every page is an index range scan
+    query = _product_query(fields).filter(Product.id > cursor)
+    if request.args.get('in_stock') == '1':
+        query = query.filter(_effective_stock() > 0)
+    page = query.order_by(Product.id).limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    return _json_response({
+        'success': True,
+        'data': [_product_json(p, fields) for p in page],
+        'next_cursor': str(page[-1].id) if has_more else None
+    })
+
+@bp.route('/products/<int:product_id>')
+def product(product_id):
+    try:
+        fields = _requested_fields()
+    except ValueError as e:
+        return _error(str(e), 400)
+    found = _product_query(fields).filter(Product.id == product_id).first()
+    if not found:
+        return _error('Product not found', 404)
+    return _json_response({'success': True, 'data': _product_json(found, fields)})
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""购物车"""
+
+from flask import Blueprint, request, jsonify, session
+from flask_login import login_required, current_user
+
+from ..extensions import db
+from ..models import Product, StockReservation
+from ..inventory import _reserve_stock
+from ..storage import get_storage
+
+bp = Blueprint('cart', __name__)
+
+@bp.route('/add_to_cart', methods=['POST'])
+def add_to_cart():
+    if not current_user.is_authenticated:
+        return jsonify({'success': False, 'message': 'Please login first'})
+    
+    product_id = request.json.get('product_id')
+    quantity = request.json.get('quantity', 1)
+    variant = request.json.get('variant', '')  # Get selected variant
+    
+    # Ensure quantity is integer type
+    try:
+        quantity = int(quantity)
+    except (ValueError, TypeError):
+        quantity = 1
+    
+    product = Product.query.get_or_404(product_id)
+    
+    # Use session to store cart with variant info
+    # Cart structure: {product_id: {'quantity': qty, 'variant': variant}}
+    cart = session.get('cart', {})
+    cart_key = str(product_id)
+    
+    # If variant is provided, use product_id:variant as key
+    if variant:
+        cart_key = f"{product_id}:{variant}"
+    
+    current = _parse_cart_entry(cart_key, cart[cart_key]) if cart_key in cart else None
+    new_quantity = (current[1] if current else 0) + quantity
+    
+    # Reserve stock for the whole cart line
+    available = _reserve_stock(product, variant, new_quantity)
+    if available < new_quantity:
+        db.session.rollback()
+        if variant:
+            return jsonify({'success': False, 'message': f'Insufficient stock for variant {variant}. Available: {max(available, 0)}'})
+        return jsonify({'success': False, 'message': 'Insufficient stock'})
+    db.session.commit()
+    
+    cart[cart_key] = {'quantity': new_quantity, 'variant': variant}
+    
+    session['cart'] = cart
+    return jsonify({'success': True, 'message': 'Added to cart'})
+
+def _parse_cart_entry(cart_key, cart_data):
+    """Split a session cart entry into (product_id, quantity, variant), or None if invalid"""
+    # Handle both old format (quantity as int) and new format (dict with quantity and variant)
+    if isinstance(cart_data, dict):
+        quantity = cart_data.get('quantity', 1)
+        variant = cart_data.get('variant', '')
+    else:
+        # Old format: just quantity
+        quantity = cart_data
+        variant = ''
+    
+    # Extract product_id from cart_key (format: "product_id" or "product_id:variant")
+    try:
+        product_id = int(cart_key.split(':')[0])
+    except (ValueError, TypeError):
+        return None
+    
+    # Ensure quantity is integer
+    try:
+        quantity = int(quantity)
+    except (ValueError, TypeError):
+        quantity = 1
+    
+    return product_id, quantity, variant
+
+def _priced_cart(cart):
+    """Build the priced cart payload returned by get_cart and cart_ops"""
+    import json
+    entries = []
+    for cart_key, cart_data in cart.items():
+        entry = _parse_cart_entry(cart_key, cart_data)
+        if entry:
+            entries.append(entry)
+    
+    # Load all products in the cart with a single query
+    product_ids = {product_id for product_id, _, _ in entries}
+    products = {}
+    if product_ids:
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
+    
+    cart_items = []
+    total = 0
+    storage = get_storage()
+    for product_id, quantity, variant in entries:
+        product = products.get(product_id)
+        if not product:
+            continue
+        
+        item_total = product.price * quantity
+        # Get first image (support both old and new format)
+        first_image = None
+        if product.image:
+            try:
+                images = json.loads(product.image)
+                if isinstance(images, list) and len(images) > 0:
+                    first_image = images[0]
+                elif isinstance(images, str):
+                    first_image = images
+            except (json.JSONDecodeError, ValueError, TypeError):
+                first_image = product.image if isinstance(product.image, str) else None
+        
+        cart_items.append({
+            'id': product.id,
+            'name': product.name,
+            'price': product.price,
+            'quantity': quantity,
+            'variant': variant,
+            'total': item_total,
+            'image': first_image,
+            'image_url': storage.url(first_image) if first_image else None
+        })
+        total += item_total
+    
+    return {
+        'items': cart_items,
+        'total': total,
+        'count': sum(item['quantity'] for item in cart_items)
+    }
+
+@bp.route('/get_cart')
+@login_required
+def get_cart():
+    return jsonify(_priced_cart(session.get('cart', {})))
+
+@bp.route('/update_cart', methods=['POST'])
+@login_required
+def update_cart():
+    product_id = request.json.get('product_id')
+    quantity = request.json.get('quantity')
+    variant = request.json.get('variant', '')
+    
+    try:
+        quantity = int(quantity)
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': 'Invalid quantity'}), 400
+    
+    cart = session.get('cart', {})
+    
+    # Build cart key (same format as add_to_cart)
+    cart_key = str(product_id)
+    if variant:
+        cart_key = f"{product_id}:{variant}"
+    
+    product = Product.query.get(product_id)
+    if product:
+        current = _parse_cart_entry(cart_key, cart[cart_key]) if cart_key in cart else None
+        available = _reserve_stock(product, variant, quantity)
+        if quantity > (current[1] if current else 0) and available < quantity:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Insufficient stock. Available: {max(available, 0)}'})
+        db.session.commit()
+    
+    if quantity <= 0:
+        cart.pop(cart_key, None)
+    else:
+        # Update or create cart item with variant info
+        if cart_key in cart:
+            if isinstance(cart[cart_key], dict):
+                cart[cart_key]['quantity'] = quantity
+            else:
+                # Migrate old format
+                cart[cart_key] = {'quantity': quantity, 'variant': variant}
+        else:
+            cart[cart_key] = {'quantity': quantity, 'variant': variant}
+    
+    session['cart'] = cart
+    return jsonify({'success': True})
+
+@bp.route('/cart/ops', methods=['POST'])
+def cart_ops():
+    """Apply a batch of cart operations atomically and return the priced cart
+
+    Request body: {"ops": [{"op": "add" | "set" | "remove", "product_id": 1, "quantity": 2, "variant": "XL"}, ...]}
+    Either every operation is applied or none is; the response carries the updated cart.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'success': False, 'message': 'Please login first'})
+    
+    data = request.get_json(silent=True) or {}
+    ops = data.get('ops')
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'success': False, 'message': 'ops must be a non-empty list'}), 400
+    
+    # Work on a copy so a failing operation leaves the session cart untouched
+    cart = {key: dict(value) if isinstance(value, dict) else value
+            for key, value in session.get('cart', {}).items()}
+    
+    # Load every referenced product with a single query
+    product_ids = set()
+    for op in ops:
+        try:
+            product_ids.add(int(op.get('product_id')))
+        except (AttributeError, ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'Each operation needs a valid product_id'}), 400
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
+    
+    for op in ops:
+        kind = op.get('op')
+        product_id = int(op.get('product_id'))
+        variant = op.get('variant') or ''
+        
+        # Build cart key (same format as add_to_cart)
+        cart_key = f"{product_id}:{variant}" if variant else str(product_id)
+        
+        if kind == 'remove':
+            cart.pop(cart_key, None)
+            StockReservation.query.filter_by(user_id=current_user.id, product_id=product_id,
+                                             variant=variant).delete(synchronize_session=False)
+            continue
+        
+        if kind not in ('add', 'set'):
+            return jsonify({'success': False, 'message': f'Unknown cart operation: {kind}'}), 400
+        
+        try:
+            quantity = int(op.get('quantity', 1))
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': f'Invalid quantity for product {product_id}'}), 400
+        
+        product = products.get(product_id)
+        if not product:
+            return jsonify({'success': False, 'message': f'Product {product_id} not found'}), 404
+        
+        current = _parse_cart_entry(cart_key, cart[cart_key]) if cart_key in cart else None
+        current_quantity = current[1] if current else 0
+        new_quantity = current_quantity + quantity if kind == 'add' else quantity
+        
+        available = _reserve_stock(product, variant, new_quantity)
+        if new_quantity <= 0:
+            cart.pop(cart_key, None)
+            continue
+        
+        if new_quantity > current_quantity and available < new_quantity:
+            db.session.rollback()
+            available = max(available, 0)
+            if variant:
+                message = f'Insufficient stock for variant {variant}. Available: {available}'
+            else:
+                message = f'Insufficient stock for {product.name}. Available: {available}'
+            return jsonify({'success': False, 'message': message})
+        
+        cart[cart_key] = {'quantity': new_quantity, 'variant': variant}
+    
+    db.session.commit()
+    session['cart'] = cart
+    return jsonify({'success': True, 'cart': _priced_cart(cart)})
+
+@bp.route('/clear_cart', methods=['POST'])
+@login_required
+def clear_cart():
+    StockReservation.query.filter_by(user_id=current_user.id).delete(synchronize_session=False)
+    db.session.commit()
+    session.pop('cart', None)
+    return jsonify({'success': True, 'message': 'Cart cleared'})
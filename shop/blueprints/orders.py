@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""下单和用户订单"""
+
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, request, jsonify, session
+from flask_login import login_required, current_user
+
+from ..extensions import db
+from ..models import Order, OrderRecord, Product, ArchivedOrder, ArchivedOrderRecord, StockReservation, record_order_event
+from ..inventory import _available_stock, _held_by_others, _shard_key, _take_from_shards, _take_stock
+from ..idempotency import idempotent
+
+bp = Blueprint('orders', __name__)
+
+def _forget_submitted_cart(replay):
+    """A replayed successful checkout clears the session cart, like the original response did"""
+    if replay.status_code == 200:
+        session.pop('cart', None)
+
+@bp.route('/submit_order', methods=['POST'])
+@login_required
+@idempotent(on_replay=_forget_submitted_cart)
+def submit_order():
+    try:
+        # Check if request has JSON data
+        if not request.is_json:
+            return jsonify({'success': False, 'message': 'Request must be JSON'}), 400
+        
+        if request.json is None:
+            return jsonify({'success': False, 'message': 'Invalid JSON data'}), 400
+        
+        contact_info = request.json.get('contact_info')
+        cart = session.get('cart', {})
+        
+        current_app.logger.info(f'Submit order: User {current_user.id}, Cart items: {cart}, Cart type: {type(cart)}')
+        
+        if not cart:
+            current_app.logger.warning(f'Submit order failed: Cart is empty for user {current_user.id}')
+            return jsonify({'success': False, 'message': 'Cart is empty'})
+        
+        # Order numbers are unique by construction, no existence check needed
+        order_number = current_app.extensions['order_numbers'].next()
+        
+        # Active stock reservations of this user, keyed by (product_id, variant)
+        held_stock = {
+            (hold.product_id, hold.variant): hold.quantity
+            for hold in StockReservation.query.filter(
+                StockReservation.user_id == current_user.id,
+                StockReservation.expires_at > datetime.utcnow()
+            ).all()
+        }
+        
+        # Create separate order for each product (match database structure)
+        orders_created = []
+        current_app.logger.info(f'Processing {len(cart)} items in cart')
+        for cart_key, cart_data in cart.items():
+            # Handle both old format (quantity as int) and new format (dict with quantity and variant)
+            if isinstance(cart_data, dict):
+                quantity = cart_data.get('quantity', 1)
+                variant = cart_data.get('variant', '')
+            else:
+                # Old format: just quantity
+                quantity = cart_data
+                variant = ''
+            
+            # Extract product_id from cart_key (format: "product_id" or "product_id:variant")
+            if ':' in cart_key:
+                product_id_str = cart_key.split(':')[0]
+            else:
+                product_id_str = cart_key
+            
+            current_app.logger.info(f'Processing cart item: product_id={product_id_str}, quantity={quantity}, variant={variant}')
+            # Convert string product_id to integer
+            try:
+                product_id = int(product_id_str)
+            except (ValueError, TypeError):
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'Invalid product ID: {product_id_str}'}), 400
+            
+            # Ensure quantity is integer
+            try:
+                quantity = int(quantity)
+                if quantity <= 0:
+                    db.session.rollback()
+                    return jsonify({'success': False, 'message': f'Invalid quantity for product {product_id_str}'}), 400
+            except (ValueError, TypeError):
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'Invalid quantity format for product {product_id_str}'}), 400
+            
+            product = Product.query.get(product_id)
+            if not product:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'Product {product_id} not found'}), 404
+            
+            # Stock held for this user at add-to-cart is converted without re-checking
+            if held_stock.get((product.id, variant or ''), 0) < quantity:
+                available = _available_stock(product, variant) - _held_by_others(product, variant, current_user.id)
+                if available < quantity:
+                    db.session.rollback()
+                    if variant:
+                        return jsonify({'success': False, 'message': f'Variant {variant} of {product.name} has insufficient stock. Available: {max(available, 0)}, Requested: {quantity}'}), 400
+                    return jsonify({'success': False, 'message': f'Product {product.name} has insufficient stock. Available: {max(available, 0)}, Requested: {quantity}'}), 400
+            
+            # Create order
+            try:
+                # Store original stock for logging
+                original_stock = product.stock
+                
+                order = Order(
+                    order_number=order_number,
+                    user_id=current_user.id,
+                    product_id=product.id,
+                    quantity=quantity,
+                    variant=variant,  # Save selected variant
+                    total_price=product.price * quantity,
+                    contact_info=contact_info  # Save contact information
+                )
+                db.session.add(order)
+                orders_created.append(order)
+                
+                # Flash-sale products: take the units from a stock shard instead of the product row
+                taken = _take_from_shards(product.id, _shard_key(product, variant), quantity)
+                if taken is False:
+                    db.session.rollback()
+                    return jsonify({'success': False, 'message': f'Product {product.name} has insufficient stock. Requested: {quantity}'}), 400
+                if taken:
+                    current_app.logger.info(f'Order item prepared: Product {product.id} ({product.name}), Variant: {variant}, Qty: {quantity}, taken from stock shards')
+                # Reduce stock (variant stock if the variant has its own stock, otherwise product stock)
+                elif not _take_stock(product, variant, quantity):
+                    db.session.rollback()
+                    if variant:
+                        return jsonify({'success': False, 'message': f'Variant {variant} of {product.name} has insufficient stock. Requested: {quantity}'}), 400
+                    return jsonify({'success': False, 'message': f'Product {product.name} has insufficient stock. Requested: {quantity}'}), 400
+                else:
+                    current_app.logger.info(f'Order item prepared: Product {product.id} ({product.name}), Variant: {variant}, Qty: {quantity}, Stock before: {original_stock}')
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f'Error creating order: {str(e)}', exc_info=True)
+                return jsonify({'success': False, 'message': f'Error creating order: {str(e)}'}), 500
+        
+        # Reservations are consumed by the order
+        StockReservation.query.filter_by(user_id=current_user.id).delete(synchronize_session=False)
+        
+        record_order_event('order_created', order_number, user_id=current_user.id,
+                           items=len(orders_created), total=sum(o.total_price for o in orders_created))
+        
+        # Commit all changes
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Database commit error: {str(e)}', exc_info=True)
+            return jsonify({'success': False, 'message': f'Database error: {str(e)}'}), 500
+        current_app.logger.info(f'Order committed successfully: {order_number}, Orders created: {len(orders_created)}')
+        
+        # Clear cart only after successful commit
+        session.pop('cart', None)
+        
+        # The order is committed: a failing check below must not turn it into an error response
+        try:
+            # Verify orders were actually saved and stock was updated
+            saved_orders = Order.query.filter_by(order_number=order_number).all()
+            current_app.logger.info(f'Verification: Found {len(saved_orders)} orders with order_number {order_number}')
+            
+            # Verify stock was updated for all products in the order
+            for order in saved_orders:
+                product = Product.query.get(order.product_id)
+                if product:
+                    current_app.logger.info(f'Stock verification for Product {product.id} ({product.name}): Current stock = {product.stock}')
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Post-commit verification failed for order {order_number}: {str(e)}', exc_info=True)
+        
+        return jsonify({'success': True, 'order_number': order_number})
+    
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Unexpected error in submit_order: {str(e)}', exc_info=True)
+        return jsonify({'success': False, 'message': f'Error submitting order: {str(e)}'}), 500
+
+# 用户订单查看路由
+@bp.route('/my_orders')
+@login_required
+def my_orders():
+    """用户查看自己的订单"""
+    include_archived = request.args.get('include_archived') == '1'
+    
+    # Get all orders for current user, grouped by order_number
+    all_orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
+    if include_archived:
+        all_orders += ArchivedOrder.query.filter_by(user_id=current_user.id).order_by(ArchivedOrder.created_at.desc()).all()
+    
+    # Group orders by order_number
+    from collections import defaultdict
+    orders_by_number = defaultdict(list)
+    for order in all_orders:
+        orders_by_number[order.order_number].append(order)
+    
+    # Convert to list of order groups, each group represents one order with potentially multiple items
+    order_groups = []
+    for order_number, orders in orders_by_number.items():
+        # Sort orders in group by created_at to get the first one as primary
+        orders_sorted = sorted(orders, key=lambda x: x.created_at)
+        order_groups.append({
+            'order_number': order_number,
+            'primary_order': orders_sorted[0],  # First order as primary for display
+            'all_orders': orders_sorted,  # All orders with this order number
+            'total_amount': sum(o.total_price for o in orders_sorted),
+            'total_items': len(orders_sorted),
+            'created_at': orders_sorted[0].created_at,
+            'contact_info': orders_sorted[0].contact_info,  # Contact information from first order
+            'status': orders_sorted[0].status,  # Use first order's status
+            'archived': isinstance(orders_sorted[0], ArchivedOrder)
+        })
+    
+    # Sort order groups by creation time (most recent first)
+    order_groups.sort(key=lambda x: x['created_at'], reverse=True)
+    
+    # Get order records for each order group
+    for group in order_groups:
+        record_model = ArchivedOrderRecord if group['archived'] else OrderRecord
+        records = record_model.query.filter_by(order_number=group['order_number']).order_by(record_model.created_at.desc()).all()
+        group['records'] = records
+    
+    current_app.logger.info(f'My orders page: Found {len(all_orders)} order records, {len(order_groups)} unique orders for user {current_user.username}')
+    return render_template('my_orders.html', order_groups=order_groups, total_orders=len(all_orders),
+                           include_archived=include_archived)
+
+@bp.route('/delete_order', methods=['POST'])
+@login_required
+def delete_my_order():
+    """用户删除自己的已完成订单"""
+    order_number = request.json.get('order_number')
+    if not order_number:
+        return jsonify({'success': False, 'message': 'Order number required'})
+    
+    try:
+        # Get all orders with this order number
+        orders = Order.query.filter_by(order_number=order_number).all()
+        
+        if not orders:
+            return jsonify({'success': False, 'message': 'Order not found'})
+        
+        # Verify that all orders belong to the current user
+        for order in orders:
+            if order.user_id != current_user.id:
+                return jsonify({'success': False, 'message': 'You can only delete your own orders'})
+        
+        # Check if all orders are completed
+        for order in orders:
+            if order.status != 'completed':
+                return jsonify({'success': False, 'message': 'Only completed orders can be deleted'})
+        
+        # Delete all orders with this order number
+        for order in orders:
+            db.session.delete(order)
+        record_order_event('order_deleted', order_number, items=len(orders),
+                           total=sum(o.total_price for o in orders), deleted_by=current_user.id)
+        
+        db.session.commit()
+        return jsonify({'success': True, 'message': f'Order {order_number} deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error deleting order {order_number} for user {current_user.id}: {str(e)}')
+        return jsonify({'success': False, 'message': f'Failed to delete order: {str(e)}'})
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""订单记录（付款凭证、收据、发货凭证）"""
+
+import posixpath
+import uuid
+
+from flask import Blueprint, current_app, request, jsonify, abort
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+
+from ..extensions import db
+from ..models import Order, OrderRecord, ArchivedOrder, ArchivedOrderRecord, record_order_event
+from ..idempotency import idempotent
+from ..storage import PRIVATE_FILE_PREFIX, get_storage
+
+bp = Blueprint('records', __name__)
+
+# 订单记录相关路由
+@bp.route('/upload_order_record', methods=['POST'])
+@login_required
+@idempotent
+def upload_order_record():
+    """上传订单记录（付款凭证、收据、发货凭证）"""
+    try:
+        order_number = request.form.get('order_number')
+        record_type = request.form.get('record_type')  # 'payment', 'receipt', 'shipped'
+        description = request.form.get('description', '')
+        
+        if not order_number or not record_type:
+            return jsonify({'success': False, 'message': '订单号和记录类型是必填的'})
+        
+        # 验证订单号是否存在
+        order = Order.query.filter_by(order_number=order_number).first()
+        if not order:
+            return jsonify({'success': False, 'message': '订单不存在'})
+        
+        # 验证权限：普通用户只能上传自己订单的付款凭证，管理员可以上传所有类型的记录
+        if not current_user.is_admin:
+            if order.user_id != current_user.id:
+                return jsonify({'success': False, 'message': '您只能为自己的订单上传记录'})
+            if record_type != 'payment':
+                return jsonify({'success': False, 'message': '普通用户只能上传付款凭证'})
+        
+        # 验证记录类型
+        if record_type not in ['payment', 'receipt', 'shipped']:
+            return jsonify({'success': False, 'message': '无效的记录类型'})
+        
+        # 处理文件上传
+        if 'image' not in request.files:
+            return jsonify({'success': False, 'message': '请选择要上传的图片'})
+        
+        file = request.files['image']
+        if file.filename == '':
+            return jsonify({'success': False, 'message': '请选择要上传的图片'})
+        
+        # 验证文件类型
+        if file and file.filename:
+            filename = secure_filename(file.filename)
+            if '.' in filename:
+                ext = filename.rsplit('.', 1)[1].lower()
+                if ext not in current_app.config['ALLOWED_EXTENSIONS']:
+                    return jsonify({'success': False, 'message': '不支持的文件类型，只支持 PNG, JPG, JPEG, GIF'})
+            else:
+                return jsonify({'success': False, 'message': '文件必须包含扩展名'})
+            
+            # 生成唯一文件名
+            filename = f"{PRIVATE_FILE_PREFIX}{uuid.uuid4().hex}_{filename}"
+            get_storage().save(filename, file.stream, file.mimetype)
+            
+            # 创建订单记录
+            order_record = OrderRecord(
+                order_number=order_number,
+                record_type=record_type,
+                image_path=filename,
+                uploaded_by=current_user.id,
+                description=description
+            )
+            db.session.add(order_record)
+            db.session.flush()
+            record_order_event('record_uploaded', order_number, record_id=order_record.id,
+                               record_type=record_type, uploaded_by=current_user.id)
+            db.session.commit()
+            
+            return jsonify({
+                'success': True, 
+                'message': '记录上传成功',
+                'record': {
+                    'id': order_record.id,
+                    'record_type': order_record.record_type,
+                    'image_path': order_record.image_path,
+                    'description': order_record.description,
+                    'created_at': order_record.created_at.strftime('%Y-%m-%d %H:%M:%S')
+                }
+            })
+        else:
+            return jsonify({'success': False, 'message': '文件上传失败'})
+    
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error uploading order record: {str(e)}')
+        return jsonify({'success': False, 'message': f'上传失败: {str(e)}'})
+
+@bp.route('/get_order_records', methods=['GET'])
+@login_required
+def get_order_records():
+    """获取订单记录"""
+    try:
+        order_number = request.args.get('order_number')
+        if not order_number:
+            return jsonify({'success': False, 'message': '订单号是必填的'})
+        
+        # 验证订单号是否存在
+        order = Order.query.filter_by(order_number=order_number).first()
+        if not order:
+            return jsonify({'success': False, 'message': '订单不存在'})
+        
+        # 验证权限：普通用户只能查看自己订单的记录
+        if not current_user.is_admin:
+            if order.user_id != current_user.id:
+                return jsonify({'success': False, 'message': '您只能查看自己订单的记录'})
+        
+        # 获取订单记录
+        records = OrderRecord.query.filter_by(order_number=order_number).order_by(OrderRecord.created_at.desc()).all()
+        
+        records_data = []
+        for record in records:
+            records_data.append({
+                'id': record.id,
+                'record_type': record.record_type,
+                'image_path': record.image_path,
+                'description': record.description,
+                'uploaded_by': record.uploader.username if record.uploader else 'Unknown',
+                'created_at': record.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            })
+        
+        return jsonify({'success': True, 'records': records_data})
+    
+    except Exception as e:
+        current_app.logger.error(f'Error getting order records: {str(e)}')
+        return jsonify({'success': False, 'message': f'获取记录失败: {str(e)}'})
+
+# 订单记录图片（付款凭证等）只能通过授权路由访问，不再作为公开静态文件提供
+ORDER_RECORD_FILE_PREFIX = PRIVATE_FILE_PREFIX
+
+@bp.before_app_request
+def block_public_record_files():
+    """Order record images left under static/uploads are served only through order_record_image
+
+    New records are written to RECORD_FOLDER outside static/; this covers older files until
+    they are moved. The path is normalized first, the way the static route resolves it, so
+    spellings like uploads/./ or x/../uploads/ cannot get around the check.
+    """
+    if request.endpoint == 'static':
+        filename = posixpath.normpath((request.view_args or {}).get('filename', '').replace('\\', '/'))
+        if posixpath.basename(filename).startswith(ORDER_RECORD_FILE_PREFIX):
+            abort(404)
+
+@bp.route('/records/<int:record_id>/image')
+@login_required
+def order_record_image(record_id):
+    """Serve an order record image to its order's owner or an admin
+
+    The storage backend sends it without passing the bytes through the worker where it can:
+    X-Accel-Redirect to nginx for local files (RECORD_ACCEL_REDIRECT_PREFIX set), a redirect
+    to a short-lived presigned URL for S3.
+    """
+    archived = request.args.get('archived') == '1'
+    record_model, order_model = (ArchivedOrderRecord, ArchivedOrder) if archived else (OrderRecord, Order)
+    record = db.session.get(record_model, record_id)
+    if not record:
+        abort(404)
+    
+    # 验证权限：与 get_order_records 相同，普通用户只能查看自己订单的记录
+    if not current_user.is_admin:
+        order = order_model.query.filter_by(order_number=record.order_number).first()
+        if not order or order.user_id != current_user.id:
+            abort(404)
+    
+    image_path = record.image_path
+    db.session.close()
+    
+    return get_storage().send(image_path, max_age=3600)
+
+@bp.route('/delete_order_record', methods=['POST'])
+@login_required
+def delete_order_record():
+    """删除订单记录"""
+    try:
+        record_id = request.json.get('record_id')
+        if not record_id:
+            return jsonify({'success': False, 'message': '记录ID是必填的'})
+        
+        record = OrderRecord.query.get_or_404(record_id)
+        
+        # 验证权限：只能删除自己上传的记录，或管理员可以删除任何记录
+        if not current_user.is_admin:
+            if record.uploaded_by != current_user.id:
+                return jsonify({'success': False, 'message': '您只能删除自己上传的记录'})
+        
+        # 删除记录，提交成功后再删除图片文件
+        image_path = record.image_path
+        db.session.delete(record)
+        record_order_event('record_deleted', record.order_number, record_id=record.id,
+                           record_type=record.record_type, deleted_by=current_user.id)
+        db.session.commit()
+        try:
+            get_storage().delete(image_path)
+        except Exception as e:
+            current_app.logger.warning(f'Could not remove image {image_path} of deleted record {record_id}: {str(e)}')
+        
+        return jsonify({'success': True, 'message': '记录删除成功'})
+    
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error deleting order record: {str(e)}')
+        return jsonify({'success': False, 'message': f'删除失败: {str(e)}'})
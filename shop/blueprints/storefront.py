@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""商城前台：首页、商品详情、登录注册和账户"""
+
+import os
+import time
+
+from flask import Blueprint, current_app, render_template, request, jsonify, redirect, url_for, flash, send_from_directory
+from flask_login import login_user, login_required, logout_user, current_user
+
+from ..extensions import db
+from ..models import User, Product
+from ..inventory import _effective_stock
+from ..passwords import PasswordHashBusy
+from ..storage import get_storage
+
+bp = Blueprint('storefront', __name__)
+
+# 添加自定义过滤器
+@bp.app_template_filter('format_currency')
+def format_currency(value):
+    """Format currency with thousand separators"""
+    try:
+        return f"{float(value):,.2f}"
+    except (ValueError, TypeError):
+        return "0.00"
+
+@bp.app_template_filter('from_json')
+def from_json(value):
+    """Parse JSON string to list"""
+    if not value:
+        return []
+    try:
+        import json
+        return json.loads(value)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        return []
+
+@bp.app_template_filter('get_first_image')
+def get_first_image(value):
+    """Get first image from product image field (supports both old and new format)"""
+    if not value:
+        return None
+    try:
+        import json
+        images = json.loads(value)
+        if isinstance(images, list) and len(images) > 0:
+            return images[0]
+        elif isinstance(images, str):
+            return images
+    except (json.JSONDecodeError, ValueError, TypeError):
+        pass
+    # Old format or not JSON: return as is
+    return value if isinstance(value, str) else None
+
+@bp.app_template_filter('upload_url')
+def upload_url(name):
+    """URL of an uploaded file in the configured storage backend"""
+    return get_storage().url(name)
+
+# Favicon route to avoid 404 errors
+@bp.route('/favicon.ico')
+def favicon():
+    """Return favicon to avoid 404 errors"""
+    return redirect(url_for('static', filename='images/favicon.svg'))
+
+@bp.route('/static/images/favicon.ico')
+def favicon_ico():
+    """Return SVG favicon as ICO to avoid 404 errors"""
+    # Return SVG file with appropriate content type
+    return send_from_directory(
+        os.path.join(current_app.root_path, 'static', 'images'),
+        'favicon.svg',
+        mimetype='image/svg+xml'
+    )
+
+# 登录失败跟踪字典
+# 格式: {identifier: {'count': 失败次数, 'lock_time': 锁定时间戳, 'last_attempt': 最近一次失败的时间戳}}
+login_attempts = {}
+MAX_LOGIN_ATTEMPTS = 5
+LOCKOUT_DURATION = 300  # 5分钟（秒）
+
+# 路由
+@bp.route('/')
+def index():
+    products = Product.query.filter(_effective_stock() > 0).all()
+    return render_template('index.html', products=products)
+
+@bp.route('/product/<int:product_id>')
+def product_detail(product_id):
+    product = Product.query.get_or_404(product_id)
+    # Get related products (exclude current product, stock > 0, max 4)
+    related_products = Product.query.filter(
+        Product.id != product_id,
+        _effective_stock() > 0
+    ).limit(4).all()
+    
+    return render_template('product_detail.html', product=product, related_products=related_products)
+
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        
+        # 获取客户端IP地址
+        client_ip = request.remote_addr or request.environ.get('HTTP_X_FORWARDED_FOR', 'unknown')
+        identifier = f"{client_ip}:{username}"
+        
+        # 检查是否被锁定
+        if identifier in login_attempts:
+            attempt_info = login_attempts[identifier]
+            if attempt_info['count'] >= MAX_LOGIN_ATTEMPTS:
+                lock_time = attempt_info.get('lock_time')
+                if lock_time:
+                    elapsed = time.time() - lock_time
+                    if elapsed < LOCKOUT_DURATION:
+                        remaining_minutes = int((LOCKOUT_DURATION - elapsed) / 60)
+                        remaining_seconds = int((LOCKOUT_DURATION - elapsed) % 60)
+                        flash(f'Too many failed login attempts. Please wait {remaining_minutes} minutes and {remaining_seconds} seconds before trying again.')
+                        return render_template('login.html', lockout_remaining=LOCKOUT_DURATION - elapsed)
+                    else:
+                        # 锁定时间已过，清除记录
+                        del login_attempts[identifier]
+        
+        user = User.query.filter_by(username=username).first()
+        
+        try:
+            password_ok = user is not None and user.check_password(password)
+            # 登录成功时将旧的哈希升级为当前配置的方案
+            if password_ok and user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+        except PasswordHashBusy:
+            flash('The server is busy, please try logging in again in a moment.')
+            return render_template('login.html'), 503
+        
+        if password_ok:
+            # 登录成功，清除失败记录
+            if identifier in login_attempts:
+                del login_attempts[identifier]
+            login_user(user)
+            return redirect(url_for('storefront.index'))
+        else:
+            # 登录失败，增加失败计数
+            if identifier not in login_attempts:
+                login_attempts[identifier] = {'count': 0, 'lock_time': None}
+            
+            login_attempts[identifier]['count'] += 1
+            login_attempts[identifier]['last_attempt'] = time.time()
+            
+            # 如果达到最大尝试次数，设置锁定时间
+            if login_attempts[identifier]['count'] >= MAX_LOGIN_ATTEMPTS:
+                login_attempts[identifier]['lock_time'] = time.time()
+                flash(f'Too many failed login attempts. Your account has been locked for 5 minutes.')
+            else:
+                remaining_attempts = MAX_LOGIN_ATTEMPTS - login_attempts[identifier]['count']
+                flash(f'Invalid username or password. {remaining_attempts} attempt(s) remaining.')
+    
+    # 清理过期的锁定记录，以及超过锁定时长没有再失败的记录（否则每个新的用户名/IP 组合都会永久占用内存）
+    current_time = time.time()
+    expired_keys = [key for key, info in login_attempts.items() 
+                    if (current_time - (info.get('lock_time') or info.get('last_attempt') or 0)) >= LOCKOUT_DURATION]
+    for key in expired_keys:
+        del login_attempts[key]
+    
+    return render_template('login.html')
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form['username']
+        email = request.form['email']
+        phone = request.form['phone']
+        password = request.form['password']
+        
+        # Check if user already exists
+        if User.query.filter_by(username=username).first():
+            flash('Username already exists')
+            return render_template('register.html')
+        
+        if User.query.filter_by(email=email).first():
+            flash('Email already exists')
+            return render_template('register.html')
+        
+        # Create new user
+        user = User(username=username, email=email, phone=phone)
+        try:
+            user.set_password(password)
+        except PasswordHashBusy:
+            flash('The server is busy, please try again in a moment.')
+            return render_template('register.html'), 503
+        db.session.add(user)
+        db.session.commit()
+        
+        flash('Registration successful, please login')
+        return redirect(url_for('storefront.login'))
+    
+    return render_template('register.html')
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('storefront.index'))
+
+@bp.route('/change_password', methods=['POST'])
+@login_required
+def change_password():
+    """允许所有登录用户修改自己的密码"""
+    try:
+        user_id = request.json.get('user_id')
+        old_password = request.json.get('old_password')
+        new_password = request.json.get('new_password')
+        
+        # Validate input
+        if not user_id or not old_password or not new_password:
+            return jsonify({'success': False, 'message': '所有字段都是必填的'})
+        
+        # Can only change own password
+        if int(user_id) != current_user.id:
+            return jsonify({'success': False, 'message': '您只能修改自己的密码'})
+        
+        # Validate new password length
+        if len(new_password) < 6:
+            return jsonify({'success': False, 'message': '密码必须至少6个字符'})
+        
+        # Verify old password
+        if not current_user.check_password(old_password):
+            return jsonify({'success': False, 'message': '当前密码不正确'})
+        
+        # Check if new password is different from old password (the old one was just verified, no second hash needed)
+        if new_password == old_password:
+            return jsonify({'success': False, 'message': '新密码必须与当前密码不同'})
+        
+        # Update password
+        current_user.set_password(new_password)
+        db.session.commit()
+        
+        return jsonify({'success': True, 'message': '密码修改成功'})
+    
+    except PasswordHashBusy:
+        return jsonify({'success': False, 'message': '服务器繁忙，请稍后再试'}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'修改密码失败: {str(e)}'})
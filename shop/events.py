@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""订单事件的跨进程通知：事件流等待一个小计数文件变化，而不是反复查询数据库"""
+
+import os
+import struct
+import threading
+import time
+
+from sqlalchemy import event
+
+from .extensions import db
+
+
+class OrderEventNotifier:
+    """Host-wide counter bumped after every commit that recorded order events
+
+    record_order_event() marks the session; the counter file (in ORDER_WORKER_LOCK_DIR, next
+    to the other cross-process lock files) is incremented once the transaction commits, so
+    waiters only touch the database when there is something new to read. Also limits the
+    number of open event streams per process (SSE_MAX_STREAMS).
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self._streams = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        os.makedirs(app.config['ORDER_WORKER_LOCK_DIR'], exist_ok=True)
+        self.path = os.path.join(app.config['ORDER_WORKER_LOCK_DIR'], 'order_events.seq')
+        self._streams = threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS'])
+        app.extensions['order_event_notifier'] = self
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def _after_commit(self, session):
+        if session.info.pop('order_events_added', False):
+            self.bump()
+
+    def _after_rollback(self, session):
+        session.info.pop('order_events_added', None)
+
+    def bump(self):
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            data = os.pread(fd, 8, 0).ljust(8, b'\0')
+            os.pwrite(fd, struct.pack('<Q', struct.unpack('<Q', data)[0] + 1), 0)
+        finally:
+            os.close(fd)
+
+    def current(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return struct.unpack('<Q', f.read(8).ljust(8, b'\0'))[0]
+        except OSError:
+            return 0
+
+    def wait(self, seen, timeout, interval=0.25):
+        """Block until the counter differs from `seen` or `timeout` seconds pass; returns the counter"""
+        deadline = time.monotonic() + timeout
+        while True:
+            value = self.current()
+            if value != seen or time.monotonic() >= deadline:
+                return value
+            time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+
+    def open_stream(self):
+        """Reserve one of this process's stream slots; False when they are all in use"""
+        return self._streams.acquire(blocking=False)
+
+    def close_stream(self):
+        self._streams.release()
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""Flask 扩展实例，由 create_app 绑定到应用"""
+
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+login_manager = LoginManager()
+login_manager.login_view = 'storefront.login'
+login_manager.login_message = 'Please login first'
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Idempotency-Key 请求头处理"""
+
+import hashlib
+import json
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, request, jsonify
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import IdempotencyKey
+
+# 幂等请求处理
+IDEMPOTENCY_PRUNE_INTERVAL = 60  # 秒，两次清理过期幂等键之间的最小间隔
+_last_idempotency_prune = 0
+
+def _request_fingerprint():
+    """Hash of the request payload, used to reject a key reused for a different request"""
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}'.encode())
+    if request.is_json:
+        digest.update(json.dumps(request.get_json(silent=True), sort_keys=True).encode())
+    else:
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f'{name}={value}'.encode())
+        for name, file in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f'{name}:{file.filename}'.encode())
+            for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+                digest.update(chunk)
+            file.stream.seek(0)
+    return digest.hexdigest()
+
+def _prune_idempotency_keys():
+    """Delete expired idempotency keys, at most once per IDEMPOTENCY_PRUNE_INTERVAL per process"""
+    global _last_idempotency_prune
+    now = time.time()
+    if now - _last_idempotency_prune < IDEMPOTENCY_PRUNE_INTERVAL:
+        return
+    _last_idempotency_prune = now
+    cutoff = datetime.utcnow() - current_app.config['IDEMPOTENCY_KEY_TTL']
+    IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+
+@event.listens_for(db.session, 'after_commit')
+def _count_commit(session):
+    session.info['commits'] = session.info.get('commits', 0) + 1
+
+def _commits():
+    return db.session().info.get('commits', 0)
+
+def idempotent(view=None, on_replay=None):
+    """Honour an Idempotency-Key header: replay the stored response instead of re-running the view
+
+    The key is reserved before the view runs so a concurrent retry gets 409 instead of a
+    second execution. Server errors release the key so the client can retry for real, but
+    only if the view committed nothing: once it has committed, the key is completed with
+    whatever came back (a 500 for an exception), so a retry can never apply it twice. The
+    reservation is a lease starting at created_at: if no response was stored within
+    IDEMPOTENCY_IN_FLIGHT_TIMEOUT (the worker was killed mid-request), the next retry takes
+    the key over and runs the view instead of getting 409 until the key expires.
+
+    The stored response carries no cookies, so session changes the view made are lost on a
+    replay; `on_replay(response)` is called before a replay is returned to apply them again.
+    Use as @idempotent or @idempotent(on_replay=...).
+    """
+    if view is None:
+        return lambda view: idempotent(view, on_replay)
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 100:
+            return jsonify({'success': False, 'message': 'Idempotency-Key is too long'}), 400
+        
+        fingerprint = _request_fingerprint()
+        cutoff = datetime.utcnow() - current_app.config['IDEMPOTENCY_KEY_TTL']
+        
+        try:
+            _prune_idempotency_keys()
+            record = IdempotencyKey(key=key, user_id=current_user.id, endpoint=request.endpoint,
+                                    request_hash=fingerprint)
+            db.session.add(record)
+            db.session.commit()
+            record_id, lease = record.id, record.created_at
+        except IntegrityError:
+            db.session.rollback()
+            record = IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).first()
+            if record is None or record.created_at < cutoff:
+                # Expired between the prune and now: drop it and ask the client to retry
+                if record:
+                    db.session.delete(record)
+                    db.session.commit()
+                return jsonify({'success': False, 'message': 'Idempotency key expired, please retry'}), 409
+            if record.endpoint != request.endpoint or record.request_hash != fingerprint:
+                return jsonify({'success': False, 'message': 'Idempotency-Key was already used for a different request'}), 422
+            if record.status_code is None:
+                if record.created_at >= datetime.utcnow() - current_app.config['IDEMPOTENCY_IN_FLIGHT_TIMEOUT']:
+                    return jsonify({'success': False, 'message': 'A request with this Idempotency-Key is still being processed'}), 409
+                # The worker running the original request died before storing a response:
+                # take the key over, unless another retry got there first
+                lease = datetime.utcnow()
+                taken = IdempotencyKey.query.filter_by(id=record.id, status_code=None, created_at=record.created_at) \
+                    .update({'created_at': lease}, synchronize_session=False)
+                db.session.commit()
+                if not taken:
+                    return jsonify({'success': False, 'message': 'A request with this Idempotency-Key is still being processed'}), 409
+                record_id = record.id
+            else:
+                replay = current_app.response_class(record.response_body, status=record.status_code,
+                                                    mimetype=record.response_mimetype)
+                replay.headers['Idempotent-Replayed'] = 'true'
+                if on_replay is not None:
+                    on_replay(replay)
+                return replay
+        
+        # Only touch the key while our lease is current, so an attempt that was taken over
+        # cannot overwrite or release the key of the one that replaced it
+        ours = IdempotencyKey.query.filter_by(id=record_id, created_at=lease)
+        commits = _commits()
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            if _commits() == commits:
+                ours.delete()
+            else:
+                ours.update({
+                    'status_code': 500,
+                    'response_body': json.dumps({'success': False, 'message': 'The request was processed but '
+                                                 'its response was lost, please check before retrying'}),
+                    'response_mimetype': 'application/json'
+                })
+            db.session.commit()
+            raise
+        
+        try:
+            if response.status_code >= 500 and _commits() == commits:
+                # Nothing was committed by the view: release the key so a retry runs again
+                ours.delete()
+            else:
+                ours.update({
+                    'status_code': response.status_code,
+                    'response_body': response.get_data(as_text=True),
+                    'response_mimetype': response.mimetype
+                })
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Error storing idempotent response for key {key}: {str(e)}')
+        return response
+    return wrapper
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""库存：可用库存计算、购物车库存预留和闪购库存分片"""
+
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from flask_login import current_user
+
+from .extensions import db
+from .models import Product, StockReservation, StockShard
+
+# Ids of products in flash-sale mode, cached per process so ordinary product loads skip the shard lookup
+_hot_products = {'ids': frozenset(), 'expires': 0.0}
+_hot_products_lock = threading.Lock()
+
+def _hot_product_ids(connection=None):
+    """Ids of products whose stock is currently sharded (refreshed every FLASH_SALE_CACHE_SECONDS)"""
+    now = time.monotonic()
+    if _hot_products['expires'] > now:
+        return _hot_products['ids']
+    with _hot_products_lock:
+        if _hot_products['expires'] <= now:
+            statement = db.select(StockShard.product_id).distinct()
+            rows = connection.execute(statement) if connection is not None else db.session.execute(statement)
+            _hot_products['ids'] = frozenset(row[0] for row in rows)
+            _hot_products['expires'] = now + current_app.config['FLASH_SALE_CACHE_SECONDS']
+    return _hot_products['ids']
+
+def _invalidate_hot_products():
+    _hot_products['expires'] = 0.0
+
+def _stock_totals(stock, variants):
+    """Stock per shard key: '' for the product stock plus one entry per variant with its own stock"""
+    import json
+    totals = {'': max(stock or 0, 0)}
+    if variants:
+        try:
+            for v in json.loads(variants):
+                if isinstance(v, dict) and v.get('name'):
+                    totals[v['name']] = max(int(v.get('stock', 0)), 0)
+        except (json.JSONDecodeError, ValueError, TypeError):
+            pass
+    return totals
+
+def _shard_key(product, variant):
+    """Shard key a cart line draws from: the variant when it has its own stock, otherwise ''"""
+    if variant and variant in _stock_totals(0, product.variants):
+        return variant
+    return ''
+
+def _shard_totals(product_id, connection=None):
+    """Current sum of the shards of a product per shard key"""
+    statement = db.select(StockShard.variant, db.func.sum(StockShard.quantity)).where(
+        StockShard.product_id == product_id
+    ).group_by(StockShard.variant)
+    rows = connection.execute(statement) if connection is not None else db.session.execute(statement)
+    return {variant: int(total or 0) for variant, total in rows}
+
+def _effective_stock():
+    """SQL expression for a product's own stock: the sum of its shards in flash-sale mode, else Product.stock
+
+    Product.stock is stale while a product is sharded; loaded Product objects get the shard
+    totals from _overlay_sharded_stock, but queries that filter or select the column need this.
+    """
+    shards = db.select(db.func.sum(StockShard.quantity)).where(
+        StockShard.product_id == Product.id, StockShard.variant == ''
+    ).correlate(Product).scalar_subquery()
+    return db.func.coalesce(shards, Product.stock)
+
+def _variant_shard_totals(product_ids):
+    """{product_id: {variant: shard sum}} for the variants with their own sharded stock"""
+    totals = {}
+    rows = db.session.query(StockShard.product_id, StockShard.variant, db.func.sum(StockShard.quantity)).filter(
+        StockShard.product_id.in_(product_ids), StockShard.variant != ''
+    ).group_by(StockShard.product_id, StockShard.variant)
+    for product_id, variant, total in rows:
+        totals.setdefault(product_id, {})[variant] = int(total or 0)
+    return totals
+
+def _apply_variant_totals(variants, totals):
+    """Variants JSON with the stock of each variant found in `totals` replaced; unchanged if unparsable"""
+    import json
+    try:
+        variants_list = json.loads(variants)
+        for v in variants_list:
+            if isinstance(v, dict) and v.get('name') in totals:
+                v['stock'] = totals[v['name']]
+        return json.dumps(variants_list)
+    except (json.JSONDecodeError, ValueError, TypeError):
+        return variants
+
+def _write_shards(product_id, totals, shard_count):
+    """Replace the shards of a product, spreading each total evenly over `shard_count` counters"""
+    StockShard.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+    rows = []
+    for variant, total in totals.items():
+        base, extra = divmod(total, shard_count)
+        rows.extend({'product_id': product_id, 'variant': variant, 'shard': shard,
+                     'quantity': base + (1 if shard < extra else 0)} for shard in range(shard_count))
+    if rows:
+        db.session.execute(StockShard.__table__.insert(), rows)
+
+def _shard_count(product_id):
+    return db.session.query(db.func.count(StockShard.id)).filter(
+        StockShard.product_id == product_id, StockShard.variant == ''
+    ).scalar()
+
+def _take_from_shards(product_id, variant, quantity):
+    """Decrement `quantity` units from the shards of a product/variant
+
+    Returns None when the product/variant is not sharded, otherwise whether the units were taken.
+    Shards are tried in random order so concurrent checkouts write different counters; each
+    decrement is conditional, so a shard never goes negative. On False the caller rolls back.
+    """
+    import random
+    shards = db.session.execute(db.select(StockShard.id, StockShard.quantity).where(
+        StockShard.product_id == product_id, StockShard.variant == variant
+    )).all()
+    if not shards:
+        return None
+    random.shuffle(shards)
+    
+    def take(shard_id, units):
+        result = db.session.execute(db.update(StockShard).where(
+            StockShard.id == shard_id, StockShard.quantity >= units
+        ).values(quantity=StockShard.quantity - units))
+        return result.rowcount == 1
+    
+    # Prefer one shard covering the whole line so only one counter is written
+    for shard_id, available in shards:
+        if available >= quantity and take(shard_id, quantity):
+            return True
+    
+    # Otherwise spread the line over several shards
+    remaining = quantity
+    for shard_id, available in shards:
+        units = min(available, remaining)
+        if units > 0 and take(shard_id, units):
+            remaining -= units
+        if remaining == 0:
+            return True
+    return False
+
+def _take_stock(product, variant, quantity):
+    """Decrement the stock of a product, or of its variant when the variant has its own stock
+
+    Returns whether the units were taken; on False the caller rolls back. The new value is
+    computed by the database, not from the stock loaded earlier in the request, so concurrent
+    checkouts in other workers can neither oversell nor overwrite each other's decrement:
+    product stock uses a conditional UPDATE, and the JSON variants column is swapped only if
+    it still holds the value the new stock was computed from (retried otherwise).
+    """
+    import json
+    from sqlalchemy.orm.attributes import set_committed_value
+    table = Product.__table__
+    key = _shard_key(product, variant)
+    
+    if not key:
+        result = db.session.execute(table.update().where(
+            table.c.id == product.id, table.c.stock >= quantity
+        ).values(stock=table.c.stock - quantity))
+        if result.rowcount != 1:
+            return False
+        set_committed_value(product, 'stock', db.session.execute(
+            db.select(table.c.stock).where(table.c.id == product.id)).scalar())
+        return True
+    
+    for _ in range(10):
+        current = db.session.execute(db.select(table.c.variants).where(table.c.id == product.id)).scalar()
+        variants_list = json.loads(current)
+        for v in variants_list:
+            if isinstance(v, dict) and v.get('name') == key:
+                if int(v.get('stock', 0)) < quantity:
+                    return False
+                v['stock'] = int(v.get('stock', 0)) - quantity
+                break
+        else:
+            return False
+        updated = json.dumps(variants_list)
+        result = db.session.execute(table.update().where(
+            table.c.id == product.id, table.c.variants == current
+        ).values(variants=updated))
+        if result.rowcount == 1:
+            set_committed_value(product, 'variants', updated)
+            return True
+    return False
+
+@db.event.listens_for(Product, 'load')
+def _overlay_sharded_stock(product, context):
+    """Make Product.stock and variant stocks of a sharded product read as the sum of its shards"""
+    from sqlalchemy.orm.attributes import set_committed_value
+    if 'stock' not in product.__dict__ or context.session is None:
+        return
+    connection = context.session.connection()
+    if product.id not in _hot_product_ids(connection):
+        return
+    totals = _shard_totals(product.id, connection)
+    if not totals:
+        return
+    if '' in totals:
+        set_committed_value(product, 'stock', totals[''])
+    if product.variants and 'variants' in product.__dict__:
+        set_committed_value(product, 'variants', _apply_variant_totals(product.variants, totals))
+
+@db.event.listens_for(Product, 'refresh')
+def _overlay_sharded_stock_on_refresh(product, context, attrs):
+    _overlay_sharded_stock(product, context)
+
+def _available_stock(product, variant):
+    """Stock available for a product, or for one of its variants when a variant is given"""
+    if variant and product.variants:
+        import json
+        try:
+            for v in json.loads(product.variants):
+                if isinstance(v, dict) and v.get('name') == variant:
+                    return v.get('stock', 0)
+                elif isinstance(v, str) and v == variant:
+                    # Old format: use product stock
+                    return product.stock
+        except (json.JSONDecodeError, ValueError, TypeError):
+            pass
+    return product.stock
+
+def _held_by_others(product, variant, user_id):
+    """Units of a product's stock pool held by other users' active reservations
+
+    Holds are grouped by _shard_key, the same key availability uses: a variant without its own
+    stock draws from the product stock, so its holds count against the product, not the variant.
+    """
+    key = _shard_key(product, variant)
+    rows = db.session.query(StockReservation.variant, db.func.sum(StockReservation.quantity)).filter(
+        StockReservation.product_id == product.id,
+        StockReservation.expires_at > datetime.utcnow(),
+        StockReservation.user_id != user_id
+    ).group_by(StockReservation.variant)
+    return sum(int(total or 0) for held_variant, total in rows if _shard_key(product, held_variant) == key)
+
+def _reserve_stock(product, variant, quantity):
+    """Hold `quantity` units of a product/variant for the current user until RESERVATION_TTL elapses
+
+    The hold is written before other holds are read, so concurrent reservations serialize on
+    the database write lock. Returns the units this user may hold (stock minus other users'
+    active holds); the caller commits, or rolls back when the hold exceeds that.
+    """
+    variant = variant or ''
+    hold = StockReservation.query.filter_by(user_id=current_user.id, product_id=product.id, variant=variant).first()
+    if quantity <= 0:
+        if hold:
+            db.session.delete(hold)
+        return _available_stock(product, variant)
+    
+    expires_at = datetime.utcnow() + current_app.config['RESERVATION_TTL']
+    if hold:
+        hold.quantity = quantity
+        hold.expires_at = expires_at
+    else:
+        db.session.add(StockReservation(product_id=product.id, variant=variant, user_id=current_user.id,
+                                        quantity=quantity, expires_at=expires_at))
+    db.session.flush()
+    db.session.refresh(product)
+    return _available_stock(product, variant) - _held_by_others(product, variant, current_user.id)
+
+def sweep_expired_reservations(batch_size=1000):
+    """Delete expired stock reservations in batches; returns the number removed
+
+    Expired holds are already ignored by availability checks, this only keeps the table small.
+    """
+    removed = 0
+    while True:
+        expired_ids = db.select(StockReservation.id).where(
+            StockReservation.expires_at <= datetime.utcnow()
+        ).limit(batch_size)
+        count = StockReservation.query.filter(StockReservation.id.in_(expired_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        removed += count
+        if count < batch_size:
+            return removed
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""进程内存统计和可选的内存分析（tracemalloc）"""
+
+import os
+import threading
+import tracemalloc
+from datetime import datetime
+
+from flask import g, request
+
+
+def process_memory(pid='self'):
+    """Memory of a process in KB: rss, pss and private (pages not shared with the gunicorn master)
+
+    Reads /proc/<pid>/smaps_rollup on Linux; elsewhere only the peak RSS from getrusage is known.
+    """
+    stats = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    stats[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        import resource
+        return {'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'pss': None, 'private': None}
+    return {
+        'rss': stats.get('Rss'),
+        'pss': stats.get('Pss'),
+        'private': stats.get('Private_Clean', 0) + stats.get('Private_Dirty', 0)
+    }
+
+
+def current_rss_kb():
+    """Resident set size of this process in KB (cheap enough to read on every request)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MemoryProfiler:
+    """Opt-in per-process memory instrumentation (MEMORY_PROFILING)
+
+    Traces allocations with tracemalloc, records the RSS growth of every request per endpoint,
+    and compares allocation sites against a baseline snapshot. Each worker process keeps its
+    own state; reports name the pid they come from.
+    """
+
+    def __init__(self, app=None):
+        self.frames = 1
+        self.dump_dir = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._baseline = None
+        self._baseline_at = None
+        self._routes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.frames = app.config['MEMORY_PROFILING_FRAMES']
+        self.dump_dir = app.config['MEMORY_DUMP_DIR']
+        app.extensions['memory_profiler'] = self
+        self._start()
+        
+        @app.before_request
+        def _record_rss_before():
+            self._start()
+            g._rss_before = current_rss_kb()
+        
+        @app.teardown_request
+        def _record_rss_growth(exc=None):
+            before = g.pop('_rss_before', None)
+            if before is None:
+                return
+            growth = current_rss_kb() - before
+            with self._lock:
+                stats = self._routes.setdefault(request.endpoint or '<unmatched>',
+                                                {'requests': 0, 'rss_growth_kb': 0, 'max_growth_kb': 0})
+                stats['requests'] += 1
+                stats['rss_growth_kb'] += growth
+                stats['max_growth_kb'] = max(stats['max_growth_kb'], growth)
+
+    def _start(self):
+        """Start tracing in this process; state from a parent process (before fork) is discarded"""
+        if self._pid == os.getpid():
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._pid = os.getpid()
+        self._baseline = None
+        self._baseline_at = None
+        self._routes = {}
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+
+    def baseline(self):
+        """Take the snapshot later reports are compared against"""
+        self._start()
+        with self._lock:
+            self._baseline = self._snapshot()
+            self._baseline_at = datetime.utcnow()
+            self._routes = {}
+
+    def report(self, limit=25):
+        """Top allocation sites (growth since the baseline when one exists) and per-endpoint RSS growth"""
+        self._start()
+        snapshot = self._snapshot()
+        if self._baseline is not None:
+            stats = snapshot.compare_to(self._baseline, 'lineno')
+        else:
+            stats = snapshot.statistics('lineno')
+        traced, peak = tracemalloc.get_traced_memory()
+        memory = process_memory()
+        with self._lock:
+            routes = [{'endpoint': endpoint, **values} for endpoint, values in self._routes.items()]
+        routes.sort(key=lambda r: r['rss_growth_kb'], reverse=True)
+        
+        return {
+            'pid': os.getpid(),
+            'rss_kb': memory['rss'],
+            'private_kb': memory['private'],
+            'traced_kb': traced // 1024,
+            'traced_peak_kb': peak // 1024,
+            'baseline_at': self._baseline_at.strftime('%Y-%m-%d %H:%M:%S') if self._baseline_at else None,
+            'top_allocations': [{
+                'site': str(stat.traceback[0]),
+                'size_kb': round(stat.size / 1024, 1),
+                'size_diff_kb': round(getattr(stat, 'size_diff', stat.size) / 1024, 1),
+                'count': stat.count,
+                'count_diff': getattr(stat, 'count_diff', stat.count)
+            } for stat in stats[:limit]],
+            'routes': routes
+        }
+
+    def dump(self, reason='manual', limit=50):
+        """Write a report to MEMORY_DUMP_DIR; returns the file path"""
+        report = self.report(limit)
+        os.makedirs(self.dump_dir, exist_ok=True)
+        path = os.path.join(self.dump_dir, f"memory_{report['pid']}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.txt")
+        lines = [
+            f"# Memory report ({reason}) pid={report['pid']} at {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC",
+            f"rss={report['rss_kb']} KB private={report['private_kb']} KB traced={report['traced_kb']} KB "
+            f"peak={report['traced_peak_kb']} KB baseline={report['baseline_at'] or 'none'}",
+            '',
+            '## Top allocation sites' + (' (growth since baseline)' if report['baseline_at'] else ''),
+        ]
+        lines += [f"{a['size_diff_kb']:>10} KB {a['count_diff']:>+8} blocks  {a['site']}  (now {a['size_kb']} KB)"
+                  for a in report['top_allocations']]
+        lines += ['', '## RSS growth per endpoint']
+        lines += [f"{r['rss_growth_kb']:>10} KB  max {r['max_growth_kb']:>6} KB  {r['requests']:>7} requests  {r['endpoint']}"
+                  for r in report['routes']]
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def install_signal_handler(self, signum=None):
+        """Dump on a signal (SIGUSR2 by default): the first signal takes the baseline, later ones report the growth"""
+        import signal
+        
+        def handle(signum, frame):
+            if self._baseline is None or self._pid != os.getpid():
+                self.baseline()
+                self.dump('signal: baseline')
+            else:
+                self.dump('signal')
+        
+        signal.signal(signum or signal.SIGUSR2, handle)
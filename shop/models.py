@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""数据库模型"""
+
+from datetime import datetime
+
+from flask import current_app
+from flask_login import UserMixin
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from .extensions import db, login_manager
+from .passwords import _password_task
+
+# 订单状态流转顺序，只允许向后流转
+ORDER_STATUS_FLOW = ['pending', 'processing', 'shipped', 'completed']
+
+# 数据库模型
+class User(UserMixin, db.Model):
+    __table_args__ = (
+        # 用户管理页按注册时间倒序分页 (created_at, id)
+        db.Index('ix_user_created_at_id', 'created_at', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    phone = db.Column(db.String(20), nullable=False, index=True)
+    password_hash = db.Column(db.String(255), nullable=False)
+    is_admin = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def set_password(self, password):
+        self.password_hash = _password_task(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+    def check_password(self, password):
+        return _password_task(check_password_hash, self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Whether the stored hash was made with a different scheme or cost than PASSWORD_HASH_METHOD"""
+        return self.password_hash.split('$', 1)[0] != current_app.config['PASSWORD_HASH_METHOD']
+
+class Product(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    description = db.Column(db.Text)
+    stock = db.Column(db.Integer, default=0)
+    image = db.Column(db.String(200))
+    variants = db.Column(db.Text)  # JSON string storing variant options like ["XL", "2XL", "3XL"]
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Order(db.Model):
+    __tablename__ = 'orders'
+    # AUTOINCREMENT: ids are never reused after the highest row is deleted or archived, so the
+    # archive (which keeps the ids) and id watermarks stay valid
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_number = db.Column(db.String(50), nullable=False, index=True)  # Removed unique constraint to allow multiple items per order
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    variant = db.Column(db.String(50))  # Selected variant like "XL", "2XL", etc.
+    total_price = db.Column(db.Float, nullable=False)
+    contact_info = db.Column(db.Text)  # Contact information provided by user during checkout
+    status = db.Column(db.String(20), default='pending')  # pending, processing, shipped, completed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # 关联
+    user = db.relationship('User', backref=db.backref('orders', lazy=True))
+    product = db.relationship('Product', backref=db.backref('orders', lazy=True))
+
+class OrderItem(db.Model):
+    __tablename__ = 'order_item'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    
+    # 关联
+    order = db.relationship('Order', backref=db.backref('items', lazy=True, cascade='all, delete-orphan'))
+    product = db.relationship('Product', backref=db.backref('order_items', lazy=True))
+
+class OrderRecord(db.Model):
+    """订单记录：存储付款凭证、收据、发货凭证等图片"""
+    __tablename__ = 'order_records'
+    __table_args__ = {'sqlite_autoincrement': True}  # Archived with their ids, see Order
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_number = db.Column(db.String(50), nullable=False, index=True)  # 订单号
+    record_type = db.Column(db.String(20), nullable=False)  # 'payment' (付款凭证), 'receipt' (收据), 'shipped' (发货凭证)
+    image_path = db.Column(db.String(500), nullable=False)  # 图片路径
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # 上传者
+    description = db.Column(db.Text)  # 描述信息
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 关联
+    uploader = db.relationship('User', backref=db.backref('order_records', lazy=True))
+
+class ArchivedOrder(db.Model):
+    """归档订单：已完成且超过保留期的订单从 orders 表移到此表"""
+    __tablename__ = 'orders_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Same id as in the orders table
+    order_number = db.Column(db.String(50), nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    product_name = db.Column(db.String(100))  # Snapshot: the product may be deleted later
+    unit_price = db.Column(db.Float)  # Snapshot of the product price at archive time
+    quantity = db.Column(db.Integer, nullable=False)
+    variant = db.Column(db.String(50))
+    total_price = db.Column(db.Float, nullable=False)
+    contact_info = db.Column(db.Text)
+    status = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    live_product = db.relationship('Product', primaryjoin='ArchivedOrder.product_id == Product.id',
+                                   foreign_keys=[product_id], viewonly=True)
+    
+    @property
+    def product(self):
+        """Current product if it still exists, otherwise the archived snapshot"""
+        if self.live_product:
+            return self.live_product
+        from types import SimpleNamespace
+        return SimpleNamespace(id=self.product_id, name=self.product_name or 'Deleted product',
+                               price=self.unit_price or 0, image=None)
+
+class ArchivedOrderRecord(db.Model):
+    """归档订单记录：随订单一起归档的付款凭证、收据、发货凭证"""
+    __tablename__ = 'order_records_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Same id as in the order_records table
+    order_number = db.Column(db.String(50), nullable=False, index=True)
+    record_type = db.Column(db.String(20), nullable=False)
+    image_path = db.Column(db.String(500), nullable=False)
+    uploaded_by = db.Column(db.Integer, nullable=False)
+    description = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OrderEvent(db.Model):
+    """订单事件：与订单变更在同一事务中追加写入，id 作为可续传的事件ID"""
+    __tablename__ = 'order_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # 'order_created', 'status_changed', 'record_uploaded', 'record_deleted', 'order_deleted',
+    # 'order_items_deleted', 'order_archived'
+    event_type = db.Column(db.String(30), nullable=False)
+    order_number = db.Column(db.String(50), nullable=False, index=True)
+    payload = db.Column(db.Text)  # JSON string with event details
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def payload_json(self):
+        """Event payload including order number, as a JSON string"""
+        import json
+        payload = json.loads(self.payload) if self.payload else {}
+        payload['order_number'] = self.order_number
+        payload['created_at'] = self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
+        return json.dumps(payload)
+
+def record_order_event(event_type, order_number, **payload):
+    """Add an order event to the current session; it is committed with the change it describes"""
+    import json
+    db.session.add(OrderEvent(event_type=event_type, order_number=order_number, payload=json.dumps(payload)))
+    # 提交后通知等待中的事件流（shop/events.py）
+    db.session.info['order_events_added'] = True
+
+def current_order_status(order_number):
+    """Status of an order as the admin page shows it: its first item's status (None once no item is left)"""
+    return db.session.query(Order.status).filter(Order.order_number == order_number).order_by(Order.id).limit(1).scalar()
+
+class StockReservation(db.Model):
+    """库存预留：加入购物车时为用户暂时保留的库存，过期后自动失效"""
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', 'variant', name='uq_reservation_user_line'),
+        db.Index('ix_reservation_product_variant_expiry', 'product_id', 'variant', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    variant = db.Column(db.String(50), nullable=False, default='')  # '' when the product has no variant
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StockShard(db.Model):
+    """闪购库存分片：热门商品的库存拆分为多个计数器，并发下单时分散写入"""
+    __tablename__ = 'stock_shards'
+    __table_args__ = (db.UniqueConstraint('product_id', 'variant', 'shard', name='uq_stock_shard'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    variant = db.Column(db.String(50), nullable=False, default='')  # '' for the product's own stock
+    shard = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+class DailySales(db.Model):
+    """每日销售总计：订单数按订单号去重"""
+    __tablename__ = 'sales_daily'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, unique=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyProductSales(db.Model):
+    """每日商品销售汇总：由 rollup_sales_daily 增量生成，分析页面只读取汇总表"""
+    __tablename__ = 'sales_daily_product'
+    __table_args__ = (db.UniqueConstraint('day', 'product_id', name='uq_sales_daily_product'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)  # No foreign key: rollups outlive deleted products
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyVariantSales(db.Model):
+    """每日商品规格销售汇总"""
+    __tablename__ = 'sales_daily_variant'
+    __table_args__ = (db.UniqueConstraint('day', 'product_id', 'variant', name='uq_sales_daily_variant'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
+    variant = db.Column(db.String(50), nullable=False, default='')  # '' when ordered without a variant
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+class RollupWatermark(db.Model):
+    """汇总任务的进度：已汇总的最大订单行ID"""
+    __tablename__ = 'rollup_watermarks'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_order_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class EventConsumerOffset(db.Model):
+    """订单事件消费者的进度：已处理的最大事件ID"""
+    __tablename__ = 'event_consumer_offsets'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class OrderProjection(db.Model):
+    """订单读模型：每个订单号一行，由订单事件增量维护"""
+    __tablename__ = 'order_projections'
+    __table_args__ = (db.Index('ix_order_projection_awaiting', 'status', 'payment_records', 'created_at'),)
+    
+    order_number = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(20), nullable=False)  # Status of the order's first item; 'archived' once archived
+    total = db.Column(db.Float, nullable=False, default=0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+    payment_records = db.Column(db.Integer, nullable=False, default=0)  # Uploaded payment proofs
+    created_at = db.Column(db.DateTime)
+
+class OrderStatusTotal(db.Model):
+    """每个订单状态的订单数和金额，由订单事件增量维护"""
+    __tablename__ = 'order_status_totals'
+    
+    status = db.Column(db.String(20), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class IdempotencyKey(db.Model):
+    """已处理请求的幂等键：重放相同请求时直接返回保存的响应"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_idempotency_user_key'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # Fingerprint of the original request
+    status_code = db.Column(db.Integer)  # None while the original request is still running
+    response_body = db.Column(db.Text)
+    response_mimetype = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+def ensure_indexes():
+    """Create indexes declared on the models that are missing from an existing database
+
+    db.create_all() only creates indexes together with new tables.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def ensure_monotonic_ids():
+    """Rebuild orders and order_records with AUTOINCREMENT if they were created without it
+
+    Without it SQLite hands out max(id) + 1 again once the highest row is gone, and an
+    archived id could come back. Each table is copied into a new AUTOINCREMENT table in one
+    transaction, and the id sequence starts above every id already used, archived ones and
+    the sales rollup watermark included. Only needed once per database (SQLite only); returns the rebuilt table names.
+    """
+    from sqlalchemy.schema import CreateTable
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    
+    rebuilt = []
+    for model, archive in ((Order, ArchivedOrder), (OrderRecord, ArchivedOrderRecord)):
+        table = model.__table__
+        with db.engine.connect() as connection:
+            # Other tables reference these: foreign key checks must be off while the table is swapped
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+            with connection.begin():
+                # pysqlite would only BEGIN at the first INSERT: start the transaction before the DDL
+                connection.exec_driver_sql('BEGIN IMMEDIATE')
+                sql = connection.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+                ).scalar()
+                if sql is None or 'AUTOINCREMENT' in sql.upper():
+                    continue
+                existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+                columns = ', '.join(f'"{c.name}"' for c in table.columns if c.name in existing)
+                new_name = f'{table.name}__rebuild'
+                create = str(CreateTable(table).compile(db.engine)).strip()
+                connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{new_name}"')
+                connection.exec_driver_sql(create.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE "{new_name}" ', 1))
+                connection.exec_driver_sql(f'INSERT INTO "{new_name}" ({columns}) SELECT {columns} FROM "{table.name}"')
+                connection.exec_driver_sql(f'DROP TABLE "{table.name}"')
+                connection.exec_driver_sql(f'ALTER TABLE "{new_name}" RENAME TO "{table.name}"')
+                for index in table.indexes:
+                    index.create(connection)
+                
+                highest = max(connection.execute(db.select(db.func.max(table.c.id))).scalar() or 0,
+                              connection.execute(db.select(db.func.max(archive.__table__.c.id))).scalar() or 0)
+                if model is Order:
+                    # Ids up to the sales rollup watermark count as already aggregated
+                    highest = max(highest, connection.execute(
+                        db.select(db.func.max(RollupWatermark.__table__.c.last_order_id))).scalar() or 0)
+                connection.exec_driver_sql('DELETE FROM sqlite_sequence WHERE name = ?', (table.name,))
+                connection.exec_driver_sql('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table.name, highest))
+            rebuilt.append(table.name)
+    return rebuilt
+
+@login_manager.user_loader
+def load_user(user_id):
+    # 每次请求时从数据库重新加载用户，确保权限信息是最新的
+    user = User.query.get(int(user_id))
+    if user:
+        # 强制刷新用户对象，确保获取最新的is_admin状态
+        db.session.refresh(user)
+    return user
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""订单号生成"""
+
+import os
+import threading
+import time
+
+# 订单号生成器
+class OrderNumberGenerator:
+    """Time-ordered order numbers that are unique by construction
+
+    Layout (63 bits): 41 bits milliseconds since ORDER_EPOCH_MS, 4 bits node id
+    (one per host, from config), 6 bits worker slot (one per process on the host)
+    and 12 bits per-millisecond sequence. The number is rendered zero-padded so
+    string order matches creation order and index inserts stay append-only.
+    """
+    ORDER_EPOCH_MS = 1735689600000  # 2025-01-01 00:00:00 UTC
+    NODE_BITS = 4
+    SLOT_BITS = 6
+    SEQUENCE_BITS = 12
+    MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+    def __init__(self, node_id=0, lock_dir=None):
+        if not 0 <= node_id < (1 << self.NODE_BITS):
+            raise ValueError(f'ORDER_NODE_ID must be between 0 and {(1 << self.NODE_BITS) - 1}')
+        self.node_id = node_id
+        self.lock_dir = lock_dir
+        self._lock = threading.Lock()
+        self._pid = None
+        self._slot = None
+        self._slot_file = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _claim_slot(self):
+        """Claim a worker slot that no other live process on this host holds"""
+        if self._slot_file:
+            self._slot_file.close()
+            self._slot_file = None
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows development): fall back to the process id
+            return os.getpid() % (1 << self.SLOT_BITS)
+        
+        os.makedirs(self.lock_dir, exist_ok=True)
+        for slot in range(1 << self.SLOT_BITS):
+            f = open(os.path.join(self.lock_dir, f'order_worker_{self.node_id}_{slot}.lock'), 'w')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            # Keep the file open: the lock is released when this process exits
+            self._slot_file = f
+            return slot
+        raise RuntimeError('No free order worker slot; too many processes on this node')
+
+    def next(self):
+        with self._lock:
+            # Slots are claimed lazily so each forked worker gets its own
+            if self._pid != os.getpid():
+                self._slot = self._claim_slot()
+                self._pid = os.getpid()
+                self._last_ms = -1
+            
+            now_ms = int(time.time() * 1000)
+            if now_ms < self._last_ms:
+                # Clock moved backwards: keep issuing from the last timestamp
+                now_ms = self._last_ms
+            
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) & self.MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond: move on to the next one
+                    now_ms = self._last_ms + 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            
+            value = ((now_ms - self.ORDER_EPOCH_MS) << (self.NODE_BITS + self.SLOT_BITS + self.SEQUENCE_BITS)) \
+                | (self.node_id << (self.SLOT_BITS + self.SEQUENCE_BITS)) \
+                | (self._slot << self.SEQUENCE_BITS) \
+                | self._sequence
+            return f"ORD{value:019d}"
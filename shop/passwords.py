@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""密码哈希：整台主机共享的并发上限，可选的哈希进程池"""
+
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import current_app
+
+# 密码哈希：所有工作进程共享 PASSWORD_HASH_CONCURRENCY 个槽位，登录高峰时不占满整台主机的 CPU
+class PasswordHashBusy(Exception):
+    """Raised when no hashing slot frees up in time; the request should be retried later"""
+
+_password_pool = {'pid': None, 'executor': None, 'files': None, 'held': set()}
+_password_pool_lock = threading.Lock()
+
+def _reset_after_fork():
+    """Reopen the slot files and drop the executor inherited from the parent process"""
+    if _password_pool['pid'] != os.getpid():
+        for f in _password_pool['files'] or ():
+            f.close()
+        _password_pool['executor'] = None
+        _password_pool['files'] = None
+        _password_pool['held'] = set()
+        _password_pool['pid'] = os.getpid()
+
+def _acquire_hash_slot():
+    """Take one of the host-wide hashing slots, waiting up to PASSWORD_HASH_WAIT seconds
+
+    Each slot is a lock file in ORDER_WORKER_LOCK_DIR taken with a non-blocking flock, like
+    the admission slots, so the limit holds across all workers and a crashed worker never
+    leaks a slot. Returns the slot number (None without flock), or raises PasswordHashBusy.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows development): no limit
+        return None
+
+    config = current_app.config
+    deadline = time.monotonic() + config['PASSWORD_HASH_WAIT']
+    while True:
+        with _password_pool_lock:
+            _reset_after_fork()
+            if _password_pool['files'] is None:
+                lock_dir = config['ORDER_WORKER_LOCK_DIR']
+                os.makedirs(lock_dir, exist_ok=True)
+                _password_pool['files'] = [open(os.path.join(lock_dir, f'password_hash_{slot}.lock'), 'w')
+                                           for slot in range(config['PASSWORD_HASH_CONCURRENCY'])]
+            held = _password_pool['held']
+            for slot, f in enumerate(_password_pool['files']):
+                # flock does not exclude other threads of this process, so skip slots we hold
+                if slot in held:
+                    continue
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+                held.add(slot)
+                return slot
+        if time.monotonic() >= deadline:
+            raise PasswordHashBusy()
+        time.sleep(0.02)
+
+def _release_hash_slot(slot):
+    if slot is None:
+        return
+    import fcntl
+    with _password_pool_lock:
+        if slot in _password_pool['held']:
+            fcntl.flock(_password_pool['files'][slot], fcntl.LOCK_UN)
+            _password_pool['held'].discard(slot)
+
+def _hash_executor():
+    """This process's hashing pool, created lazily so forked workers each get their own"""
+    from concurrent.futures import ProcessPoolExecutor
+    with _password_pool_lock:
+        _reset_after_fork()
+        if _password_pool['executor'] is None:
+            _password_pool['executor'] = ProcessPoolExecutor(max_workers=current_app.config['PASSWORD_HASH_WORKERS'])
+        return _password_pool['executor']
+
+def _password_task(func, *args):
+    """Run a Werkzeug hashing function while holding a host-wide hashing slot, or raise PasswordHashBusy
+
+    With PASSWORD_HASH_WORKERS = 0 (the default) the hash runs in the request thread; hashlib
+    releases the GIL while it works, so other threads of the worker keep serving. Otherwise it
+    runs in this process's hashing pool, and a hash that exceeds PASSWORD_HASH_TIMEOUT keeps
+    its slot until it really finishes, so timed-out jobs still count against the limit.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+    slot = _acquire_hash_slot()
+    if current_app.config['PASSWORD_HASH_WORKERS'] <= 0:
+        try:
+            return func(*args)
+        finally:
+            _release_hash_slot(slot)
+
+    try:
+        future = _hash_executor().submit(func, *args)
+    except BaseException:
+        _release_hash_slot(slot)
+        raise
+    future.add_done_callback(lambda _: _release_hash_slot(slot))
+    try:
+        return future.result(timeout=current_app.config['PASSWORD_HASH_TIMEOUT'])
+    except FutureTimeoutError:
+        # concurrent.futures.TimeoutError is not the builtin TimeoutError before Python 3.11
+        raise PasswordHashBusy()
+    except BrokenProcessPool:
+        # A pool process died: start a fresh pool on the next call and hash inline this time.
+        # The done-callback has already released the slot, so the inline hash takes a new one
+        current_app.logger.warning('Password hashing pool is broken, recreating it')
+        with _password_pool_lock:
+            _password_pool['executor'] = None
+        slot = _acquire_hash_slot()
+        try:
+            return func(*args)
+        finally:
+            _release_hash_slot(slot)
+
+def shutdown_password_pool():
+    """Stop this process's hashing pool; needed in multiprocessing children, which skip the atexit shutdown"""
+    with _password_pool_lock:
+        executor = _password_pool['executor'] if _password_pool['pid'] == os.getpid() else None
+        _password_pool['executor'] = None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""订单事件的消费者与读模型（投影）"""
+
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import inspect
+
+from .extensions import db
+from .models import (Order, OrderRecord, ArchivedOrder, OrderEvent, EventConsumerOffset,
+                     OrderProjection, OrderStatusTotal)
+
+
+class Projection(ABC):
+    """A consumer of the order event journal that keeps a read model up to date
+
+    Subclasses set `name` (the key of their offset) and define on_<event_type>(event, payload)
+    handlers; events without a handler are skipped. rebuild() recreates the read model from
+    the order tables so a projection can start (or restart) at the current end of the journal.
+    """
+    name = None
+
+    def begin_batch(self, events):
+        """Called before a batch of events is applied, e.g. to load the rows it touches in one query"""
+
+    def apply(self, event):
+        handler = getattr(self, 'on_' + event.event_type, None)
+        if handler:
+            handler(event, json.loads(event.payload) if event.payload else {})
+
+    def end_batch(self):
+        """Called after the batch, before the offset is committed with it"""
+
+    @abstractmethod
+    def rebuild(self):
+        """Recreate the read model from the order tables"""
+
+
+class OrderSummaryProjection(Projection):
+    """Orders and revenue per status, and the orders still waiting for a payment proof
+
+    One OrderProjection row per order number carries what the handlers need (status, total,
+    payment proofs), so every event is applied by looking at one row; the per-status totals
+    are adjusted by the batch's net change in a single UPDATE per status. Archived orders
+    move to the 'archived' status and keep counting towards revenue.
+    """
+    name = 'order_summary'
+
+    def begin_batch(self, events):
+        order_numbers = {event.order_number for event in events}
+        self._rows = {row.order_number: row for row in
+                      OrderProjection.query.filter(OrderProjection.order_number.in_(order_numbers)).all()}
+        self._deltas = {}
+
+    def _move(self, status, orders, revenue):
+        delta = self._deltas.setdefault(status, [0, 0.0])
+        delta[0] += orders
+        delta[1] += revenue
+
+    def _set_status(self, row, status):
+        if status and status != row.status:
+            self._move(row.status, -1, -row.total)
+            self._move(status, 1, row.total)
+            row.status = status
+
+    def on_order_created(self, event, payload):
+        if event.order_number in self._rows:
+            return
+        row = OrderProjection(order_number=event.order_number, status='pending', total=payload.get('total') or 0,
+                              items=payload.get('items') or 0, payment_records=0, created_at=event.created_at)
+        db.session.add(row)
+        self._rows[row.order_number] = row
+        self._move(row.status, 1, row.total)
+
+    def on_status_changed(self, event, payload):
+        row = self._rows.get(event.order_number)
+        if row and row.status != 'archived':
+            self._set_status(row, payload.get('order_status', payload.get('status')))
+
+    def on_record_uploaded(self, event, payload):
+        row = self._rows.get(event.order_number)
+        if row and payload.get('record_type') == 'payment':
+            row.payment_records += 1
+
+    def on_record_deleted(self, event, payload):
+        row = self._rows.get(event.order_number)
+        if row and payload.get('record_type') == 'payment':
+            row.payment_records = max(row.payment_records - 1, 0)
+
+    def on_order_items_deleted(self, event, payload):
+        row = self._rows.get(event.order_number)
+        if not row:
+            return
+        if payload.get('order_status') is None:
+            self.on_order_deleted(event, payload)
+            return
+        removed = payload.get('total') or 0
+        row.total -= removed
+        row.items = max(row.items - (payload.get('items') or 0), 0)
+        self._move(row.status, 0, -removed)
+        self._set_status(row, payload['order_status'])
+
+    def on_order_deleted(self, event, payload):
+        row = self._rows.pop(event.order_number, None)
+        if row:
+            self._move(row.status, -1, -row.total)
+            if inspect(row).pending:
+                # Created earlier in this batch
+                db.session.expunge(row)
+            else:
+                db.session.delete(row)
+
+    def on_order_archived(self, event, payload):
+        row = self._rows.get(event.order_number)
+        if row:
+            self._set_status(row, 'archived')
+
+    def end_batch(self):
+        table = OrderStatusTotal.__table__
+        for status, (orders, revenue) in self._deltas.items():
+            if not orders and not revenue:
+                continue
+            updated = db.session.execute(table.update().where(table.c.status == status).values(
+                orders=table.c.orders + orders, revenue=table.c.revenue + revenue)).rowcount
+            if not updated:
+                db.session.execute(table.insert().values(status=status, orders=orders, revenue=revenue))
+        self._rows = {}
+        self._deltas = {}
+
+    def rebuild(self):
+        OrderProjection.query.delete(synchronize_session=False)
+        OrderStatusTotal.query.delete(synchronize_session=False)
+
+        first_items = db.select(db.func.min(Order.id)).group_by(Order.order_number)
+        statuses = dict(db.session.query(Order.order_number, Order.status).filter(Order.id.in_(first_items)).all())
+        payments = dict(db.session.query(OrderRecord.order_number, db.func.count(OrderRecord.id)).filter(
+            OrderRecord.record_type == 'payment').group_by(OrderRecord.order_number).all())
+        rows = []
+        for order_number, total, items, created_at in db.session.query(
+            Order.order_number, db.func.sum(Order.total_price), db.func.count(Order.id), db.func.min(Order.created_at)
+        ).group_by(Order.order_number).all():
+            rows.append({'order_number': order_number, 'status': statuses[order_number], 'total': total or 0,
+                         'items': items, 'payment_records': payments.get(order_number, 0), 'created_at': created_at})
+        for order_number, total, items, created_at in db.session.query(
+            ArchivedOrder.order_number, db.func.sum(ArchivedOrder.total_price), db.func.count(ArchivedOrder.id),
+            db.func.min(ArchivedOrder.created_at)
+        ).group_by(ArchivedOrder.order_number).all():
+            if order_number not in statuses:
+                rows.append({'order_number': order_number, 'status': 'archived', 'total': total or 0,
+                             'items': items, 'payment_records': 0, 'created_at': created_at})
+        if rows:
+            db.session.execute(OrderProjection.__table__.insert(), rows)
+
+        totals = {}
+        for row in rows:
+            status_total = totals.setdefault(row['status'], {'status': row['status'], 'orders': 0, 'revenue': 0.0})
+            status_total['orders'] += 1
+            status_total['revenue'] += row['total']
+        if totals:
+            db.session.execute(OrderStatusTotal.__table__.insert(), list(totals.values()))
+
+
+PROJECTIONS = [OrderSummaryProjection()]
+
+def rebuild_projection(projection):
+    """Recreate a projection from the order tables and start its offset at the newest event
+
+    The offset row is rewritten first: that statement takes SQLite's write lock, so the
+    snapshot and the event id it is paired with are read with no other writer in between.
+    """
+    try:
+        db.session.execute(EventConsumerOffset.__table__.delete().where(
+            EventConsumerOffset.name == projection.name))
+        projection.rebuild()
+        last_event_id = db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+        db.session.add(EventConsumerOffset(name=projection.name, last_event_id=last_event_id))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    current_app.logger.info(f'Projection {projection.name}: rebuilt at event {last_event_id}')
+    return last_event_id
+
+def consume_events(projection, batch_size=500):
+    """Apply the events after the projection's offset, one batch per transaction
+
+    A batch is claimed with a conditional UPDATE of the offset before it is applied, and the
+    read model changes commit together with it, so every event is applied exactly once even
+    when the scheduled job and an admin request catch up at the same time: the one that
+    loses the race finds the offset moved and stops. This relies on SQLite's single writer,
+    which hands out event ids in commit order, and on events never being deleted.
+    A projection without an offset is rebuilt first. Returns the number of events applied.
+    """
+    offset = db.session.get(EventConsumerOffset, projection.name)
+    if offset is None:
+        rebuild_projection(projection)
+        offset = db.session.get(EventConsumerOffset, projection.name)
+
+    applied = 0
+    while True:
+        start_id = offset.last_event_id
+        events = OrderEvent.query.filter(OrderEvent.id > start_id).order_by(OrderEvent.id).limit(batch_size).all()
+        if not events:
+            break
+        try:
+            table = EventConsumerOffset.__table__
+            claimed = db.session.execute(table.update().where(
+                table.c.name == projection.name, table.c.last_event_id == start_id
+            ).values(last_event_id=events[-1].id, updated_at=datetime.utcnow())).rowcount
+            if not claimed:
+                db.session.rollback()
+                break
+            projection.begin_batch(events)
+            for event in events:
+                projection.apply(event)
+            projection.end_batch()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        applied += len(events)
+        if len(events) < batch_size:
+            break
+
+    if applied:
+        current_app.logger.info(f'Projection {projection.name}: applied {applied} events')
+    return applied
+
+def run_projections(batch_size=500):
+    """Bring every projection up to date; returns {name: events applied}"""
+    return {projection.name: consume_events(projection, batch_size) for projection in PROJECTIONS}
+
+def order_summary(limit=50):
+    """Order counts and revenue per status, and the oldest orders awaiting a payment proof, from the read model"""
+    offset = db.session.get(EventConsumerOffset, OrderSummaryProjection.name)
+    last_event_id = offset.last_event_id if offset else 0
+    behind = db.session.query(db.func.count(OrderEvent.id)).filter(OrderEvent.id > last_event_id).scalar()
+
+    statuses = {row.status: {'orders': row.orders, 'revenue': round(row.revenue, 2)}
+                for row in OrderStatusTotal.query.order_by(OrderStatusTotal.status).all()}
+    awaiting = OrderProjection.query.filter_by(status='pending', payment_records=0)
+    return {
+        'last_event_id': last_event_id,
+        'events_behind': behind,
+        'updated_at': offset.updated_at.strftime('%Y-%m-%d %H:%M:%S') if offset and offset.updated_at else None,
+        'statuses': statuses,
+        'revenue': round(sum(s['revenue'] for s in statuses.values()), 2),
+        'awaiting_payment_proof': {
+            'count': awaiting.count(),
+            'orders': [{'order_number': row.order_number, 'total': row.total, 'items': row.items,
+                        'created_at': row.created_at.strftime('%Y-%m-%d %H:%M:%S') if row.created_at else None}
+                       for row in awaiting.order_by(OrderProjection.created_at).limit(limit).all()]
+        }
+    }
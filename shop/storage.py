@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""上传文件存储：本地目录或 S3 兼容对象存储（多台应用服务器共享）"""
+
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from flask import current_app, redirect, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+CHUNK_SIZE = 1024 * 1024
+# 以此开头的文件（订单记录图片）只能在权限检查后访问，永远不会得到公开链接
+PRIVATE_FILE_PREFIX = 'order_record_'
+
+
+class StorageError(Exception):
+    pass
+
+
+class LocalStorage:
+    """Files in a directory on this host (UPLOAD_FOLDER), served as static/uploads/<name>
+
+    Private files (order records, PRIVATE_FILE_PREFIX) go to private_root instead, outside
+    static/, so only send() after an access check can serve them. Records written before
+    private_root existed are still read from root until they are moved.
+    Only works with a single app node, or with the directories on a shared filesystem.
+    """
+
+    def __init__(self, root, accel_redirect_prefix=None, private_root=None):
+        self.root = root
+        self.accel_redirect_prefix = accel_redirect_prefix
+        self.private_root = private_root
+        os.makedirs(root, exist_ok=True)
+        if private_root:
+            os.makedirs(private_root, exist_ok=True)
+
+    def _dir(self, name):
+        if self.private_root and name.startswith(PRIVATE_FILE_PREFIX):
+            return self.private_root
+        return self.root
+
+    def _path(self, name):
+        path = safe_join(self._dir(name), name)
+        if path is None or not name:
+            raise StorageError(f'Invalid file name: {name!r}')
+        return path
+
+    def _existing_path(self, name):
+        """Path of an existing file, falling back to the old location of a private file"""
+        path = self._path(name)
+        if not os.path.exists(path) and self._dir(name) != self.root:
+            legacy = safe_join(self.root, name)
+            if legacy and os.path.exists(legacy):
+                return legacy
+        return path
+
+    def save(self, name, stream, content_type=None):
+        """Copy a file-like object to `name` in chunks; readers never see a partly written file"""
+        path = self._path(name)
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir(name), prefix='.upload_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(stream, f, CHUNK_SIZE)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, name):
+        """Binary file-like object to read `name` from; raises FileNotFoundError"""
+        return open(self._existing_path(name), 'rb')
+
+    def delete(self, name):
+        for path in {self._path(name), self._existing_path(name)}:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def size(self, name):
+        """Size in bytes, or None if the file does not exist"""
+        try:
+            return os.path.getsize(self._existing_path(name))
+        except FileNotFoundError:
+            return None
+
+    def names(self):
+        seen = set()
+        for directory in dict.fromkeys(filter(None, (self.root, self.private_root))):
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.startswith('.') and entry.name not in seen:
+                    seen.add(entry.name)
+                    yield entry.name
+
+    def url(self, name, expires=None, external=False):
+        """Public static URL; files on local disk do not expire"""
+        return url_for('static', filename='uploads/' + name, _external=external)
+
+    def send(self, name, max_age=3600):
+        """Response with a private file, after the caller has checked access
+
+        Behind nginx (accel_redirect_prefix set, pointing at private_root) the file is handed
+        to an internal location with X-Accel-Redirect, so no bytes pass through the worker;
+        otherwise Flask sends it.
+        """
+        path = self._existing_path(name)
+        if self.accel_redirect_prefix and os.path.dirname(path) == os.path.normpath(self._dir(name)):
+            response = current_app.response_class(mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+            response.headers['X-Accel-Redirect'] = self.accel_redirect_prefix.rstrip('/') + '/' + quote(name)
+        else:
+            response = send_from_directory(os.path.dirname(path), name)
+        response.headers['Cache-Control'] = f'private, max-age={max_age}'
+        return response
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, ...) under a key prefix
+
+    Needs boto3; credentials come from the usual AWS environment variables or instance
+    profile. Each process creates its own client on first use, so clients (and their
+    connection pools) are never shared across a Gunicorn fork.
+
+    Private files (order records, PRIVATE_FILE_PREFIX) are stored under private_prefix,
+    outside the public prefix, and are only ever linked through presigned URLs. Other files
+    are linked through public_url when set (a CDN, or a public-read policy covering only
+    `prefix`), otherwise through presigned URLs that are reused for half their lifetime so
+    pages and API responses (and their ETags) stay the same between requests.
+    """
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, public_url=None,
+                 url_expires=3600, max_connections=10, private_prefix='private/'):
+        try:
+            import boto3  # noqa: F401
+        except ImportError:
+            raise StorageError('STORAGE_BACKEND=s3 requires boto3: pip install boto3')
+        if not bucket:
+            raise StorageError('STORAGE_BACKEND=s3 requires S3_BUCKET')
+        if not private_prefix or private_prefix == prefix:
+            raise StorageError('S3_PRIVATE_PREFIX must be set and differ from S3_PREFIX')
+        if public_url and private_prefix.startswith(prefix):
+            raise StorageError('S3_PRIVATE_PREFIX must not be inside S3_PREFIX when S3_PUBLIC_URL is set')
+        self.bucket = bucket
+        self.prefix = prefix
+        self.private_prefix = private_prefix
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.public_url = public_url
+        self.url_expires = url_expires
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._pid = None
+        self._client = None
+        self._urls = {}  # name -> (reuse until, presigned URL)
+
+    @property
+    def client(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    import boto3
+                    from botocore.config import Config as BotoConfig
+                    self._client = boto3.session.Session().client(
+                        's3', endpoint_url=self.endpoint_url, region_name=self.region,
+                        config=BotoConfig(signature_version='s3v4', max_pool_connections=self.max_connections,
+                                          retries={'max_attempts': 3, 'mode': 'standard'})
+                    )
+                    self._pid = os.getpid()
+        return self._client
+
+    def _key(self, name):
+        if not name or '/' in name or '\\' in name or name in ('.', '..'):
+            raise StorageError(f'Invalid file name: {name!r}')
+        if name.startswith(PRIVATE_FILE_PREFIX):
+            return self.private_prefix + name
+        return self.prefix + name
+
+    @staticmethod
+    def _missing(error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def save(self, name, stream, content_type=None):
+        """Stream a file-like object to the bucket (multipart for large files)"""
+        content_type = content_type or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.client.upload_fileobj(stream, self.bucket, self._key(name), ExtraArgs={'ContentType': content_type})
+
+    def open(self, name):
+        """Streaming body to read `name` from; raises FileNotFoundError"""
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(name))['Body']
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(name)
+            raise
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def size(self, name):
+        """Size in bytes, or None if the object does not exist"""
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))['ContentLength']
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def names(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for prefix in (self.prefix, self.private_prefix):
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                for item in page.get('Contents', []):
+                    name = item['Key'][len(prefix):]
+                    if name and '/' not in name and self._key(name) == item['Key']:
+                        yield name
+
+    def url(self, name, expires=None, external=False):
+        """public_url link for public files when no expiry is asked for, otherwise a presigned URL
+
+        Without `expires` the presigned URL is valid for url_expires seconds and the same URL
+        is returned until half of that has passed; with `expires` a fresh one is signed.
+        """
+        private = name.startswith(PRIVATE_FILE_PREFIX)
+        if expires is None and self.public_url and not private:
+            return self.public_url.rstrip('/') + '/' + quote(self._key(name))
+        if expires is not None:
+            return self._presign(name, expires)
+
+        now = time.monotonic()
+        cached = self._urls.get(name)
+        if cached and cached[0] > now:
+            return cached[1]
+        url = self._presign(name, self.url_expires)
+        with self._lock:
+            if len(self._urls) >= 10000:
+                self._urls = {key: value for key, value in self._urls.items() if value[0] > now}
+            self._urls[name] = (now + self.url_expires / 2, url)
+        return url
+
+    def _presign(self, name, expires):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self._key(name)}, ExpiresIn=expires
+        )
+
+    def send(self, name, max_age=3600):
+        """Redirect to a short-lived presigned URL; the redirect is cached for less than the URL lives"""
+        expires = current_app.config['RECORD_URL_EXPIRES']
+        response = redirect(self.url(name, expires=expires))
+        response.headers['Cache-Control'] = f'private, max-age={min(max_age, expires // 2)}'
+        return response
+
+
+def create_storage(config):
+    """The upload storage backend selected by STORAGE_BACKEND"""
+    backend = config['STORAGE_BACKEND']
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'], config.get('RECORD_ACCEL_REDIRECT_PREFIX'),
+                            private_root=config.get('RECORD_FOLDER'))
+    if backend == 's3':
+        return S3Storage(
+            config['S3_BUCKET'], prefix=config['S3_PREFIX'], endpoint_url=config['S3_ENDPOINT_URL'],
+            region=config['S3_REGION'], public_url=config['S3_PUBLIC_URL'], url_expires=config['STORAGE_URL_EXPIRES'],
+            private_prefix=config['S3_PRIVATE_PREFIX']
+        )
+    raise StorageError(f'Unknown STORAGE_BACKEND: {backend}')
+
+def get_storage():
+    return current_app.extensions['storage']
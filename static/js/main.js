@@ -3,10 +3,49 @@ let cart = {};
 
 // Initialize after page load
 document.addEventListener('DOMContentLoaded', function() {
-    updateCartCount();
-    loadCart();
+    refreshCart();
 });
 
+// Send a batch of cart operations; resolves with the server response including the updated cart
+function cartOps(ops) {
+    return fetch('/cart/ops', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ ops: ops })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success && data.cart) {
+            renderCart(data.cart);
+        }
+        return data;
+    });
+}
+
+// Render the cart badge, item list and total from a priced cart
+function renderCart(cartData) {
+    const count = cartData.count !== undefined
+        ? cartData.count
+        : cartData.items.reduce((sum, item) => sum + item.quantity, 0);
+    const cartCount = document.getElementById('cart-count');
+    if (cartCount) cartCount.textContent = count;
+    if (document.getElementById('cart-items')) displayCartItems(cartData.items);
+    const cartTotal = document.getElementById('cart-total');
+    if (cartTotal) cartTotal.textContent = formatNumber(cartData.total);
+}
+
+// Fetch the cart once and refresh badge, items and total together
+function refreshCart() {
+    fetch('/get_cart')
+    .then(response => response.json())
+    .then(data => renderCart(data))
+    .catch(error => {
+        console.error('Error:', error);
+    });
+}
+
 // Add to cart
 function addToCart(productId, quantity = 1, event = null, variant = '') {
     if (!isLoggedIn()) {
@@ -38,23 +77,15 @@ function addToCart(productId, quantity = 1, event = null, variant = '') {
         }
     }
 
-    fetch('/add_to_cart', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            product_id: productId,
-            quantity: parseInt(quantity) || 1,
-            variant: variant || ''
-        })
-    })
-    .then(response => response.json())
+    cartOps([{
+        op: 'add',
+        product_id: productId,
+        quantity: parseInt(quantity) || 1,
+        variant: variant || ''
+    }])
     .then(data => {
         if (data.success) {
             showMessage('Added to cart', 'success');
-            updateCartCount();
-            loadCart();
             // Trigger fly to cart animation
             if (productImage && addButton) {
                 createFlyToCartAnimation(productImage, addButton, parseInt(quantity) || 1);
@@ -69,32 +100,6 @@ function addToCart(productId, quantity = 1, event = null, variant = '') {
     });
 }
 
-// Update cart count display
-function updateCartCount() {
-    fetch('/get_cart')
-    .then(response => response.json())
-    .then(data => {
-        const count = data.items.reduce((sum, item) => sum + item.quantity, 0);
-        document.getElementById('cart-count').textContent = count;
-    })
-    .catch(error => {
-        console.error('Error:', error);
-    });
-}
-
-// Load cart content
-function loadCart() {
-    fetch('/get_cart')
-    .then(response => response.json())
-    .then(data => {
-        displayCartItems(data.items);
-        document.getElementById('cart-total').textContent = formatNumber(data.total);
-    })
-    .catch(error => {
-        console.error('Error:', error);
-    });
-}
-
 // Display cart items
 function displayCartItems(items) {
     const cartItemsContainer = document.getElementById('cart-items');
@@ -112,7 +117,7 @@ function displayCartItems(items) {
 
     cartItemsContainer.innerHTML = items.map(item => `
         <div class="cart-item d-flex align-items-center">
-            <img src="${item.image ? '/static/uploads/' + item.image : '/static/images/no-image.svg'}" 
+            <img src="${item.image_url || '/static/images/no-image.svg'}" 
                  class="cart-item-image me-3" alt="${item.name}">
             <div class="flex-grow-1">
                 <h6 class="mb-1">${item.name}${item.variant ? ' <span class="badge bg-info">' + item.variant + '</span>' : ''}</h6>
@@ -142,22 +147,16 @@ function displayCartItems(items) {
 function updateQuantity(productId, quantity, variant = '') {
     if (quantity < 0) quantity = 0;
     
-    fetch('/update_cart', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            product_id: productId,
-            quantity: quantity,
-            variant: variant || ''
-        })
-    })
-    .then(response => response.json())
+    cartOps([{
+        op: 'set',
+        product_id: productId,
+        quantity: parseInt(quantity) || 0,
+        variant: variant || ''
+    }])
     .then(data => {
-        if (data.success) {
-            updateCartCount();
-            loadCart();
+        if (!data.success) {
+            showMessage(data.message, 'error');
+            refreshCart();
         }
     })
     .catch(error => {
@@ -188,8 +187,7 @@ function clearCart() {
     .then(data => {
         if (data.success) {
             showMessage('Cart cleared', 'success');
-            updateCartCount();
-            loadCart();
+            refreshCart();
         } else {
             showMessage(data.message, 'error');
         }
@@ -207,7 +205,7 @@ function showCart() {
         return;
     }
     
-    loadCart();
+    refreshCart();
     const cartModal = new bootstrap.Modal(document.getElementById('cartModal'));
     cartModal.show();
 }
@@ -223,24 +221,16 @@ function quickBuy(productId, quantity = 1, variant = '') {
     sessionStorage.setItem('quickBuy', JSON.stringify({productId, quantity, variant}));
     
     // Add product to cart (without clearing existing items)
-    fetch('/add_to_cart', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            product_id: productId,
-            quantity: quantity,
-            variant: variant || ''
-        })
-    })
-    .then(response => response.json())
+    cartOps([{
+        op: 'add',
+        product_id: productId,
+        quantity: parseInt(quantity) || 1,
+        variant: variant || ''
+    }])
     .then(data => {
         if (data.success) {
-            // After adding product successfully, update cart display and open checkout page
+            // After adding product successfully, cart display is already updated; open checkout page
             showMessage('Product added to cart', 'success');
-            updateCartCount();
-            loadCart();
             
             // Open checkout page directly
             setTimeout(function() {
@@ -268,6 +258,17 @@ function checkout() {
     checkoutModal.show();
 }
 
+// Generate a key for the Idempotency-Key header, reused when the same request is retried
+function newIdempotencyKey() {
+    if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+        return window.crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+}
+
+// Idempotency key of the checkout currently being submitted (kept until the server answers)
+let pendingOrderKey = null;
+
 // Submit order
 function submitOrder() {
     const contactInfo = document.getElementById('contact-info').value.trim();
@@ -282,16 +283,23 @@ function submitOrder() {
     submitBtn.innerHTML = '<span class="loading"></span> Submitting...';
     submitBtn.disabled = true;
 
+    // Reuse the key after a network failure so a retry cannot create a second order
+    if (!pendingOrderKey) pendingOrderKey = newIdempotencyKey();
+
     fetch('/submit_order', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
+            'Idempotency-Key': pendingOrderKey,
         },
         body: JSON.stringify({
             contact_info: contactInfo
         })
     })
     .then(async response => {
+        // The server answered: the next submission is a new request
+        if (response.status !== 409) pendingOrderKey = null;
+
         // Check if response is ok
         if (!response.ok) {
             // Try to parse error response as JSON
@@ -327,8 +335,7 @@ function submitOrder() {
             document.getElementById('contact-info').value = '';
             
             // Update cart
-            updateCartCount();
-            loadCart();
+            refreshCart();
             
             // If on admin order management page, refresh to show new order
             if (window.location.pathname === '/admin' || window.location.pathname.includes('/admin')) {
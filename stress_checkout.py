@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：多进程下单并发压力测试
+- 在共享的临时 SQLite 数据库中准备商品和用户，依次用 1、2、4、8 个进程（模拟 Gunicorn 工作进程）
+  同时对同一批商品和规格循环执行「加入购物车 → 提交订单」
+- 每轮结束后检查不变量：库存不为负；每个商品/规格的已售数量等于库存减少量（无超卖、无规格库存丢失更新）；
+  客户端收到的成功订单与数据库中的订单一致
+- 报告每秒成功下单数、下单延迟、写语句耗时（SQLite 的锁等待发生在写语句中）和 database is locked 错误数
+使用方法:
+    python stress_checkout.py
+    python stress_checkout.py --workers 1,4,16 --duration 20 --stock 500
+    python stress_checkout.py --flash-sale   # 商品使用闪购库存分片
+任一轮不变量被破坏时以非零状态退出。
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+# 必须在导入应用之前指定临时数据库；测试账号使用低强度哈希，避免登录本身成为瓶颈
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+_db_file.close()
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_file.name
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+# 直接测量下单路径本身，不经过准入控制
+os.environ['ADMISSION_CONTROL'] = '0'
+
+from sqlalchemy import event
+
+from app import app
+from shop.extensions import db
+from shop.inventory import _stock_totals, _write_shards
+from shop.models import Order, Product, StockShard, User
+from shop.passwords import shutdown_password_pool
+
+VARIANTS = ['XL', 'L']
+
+def seed(workers, stock, flash_sale):
+    """Recreate the tables; returns the starting stock per (product_id, variant)"""
+    import json
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for i in range(workers):
+            user = User(username=f'stress{i}', email=f'stress{i}@example.com', phone='1')
+            user.set_password('stress')
+            db.session.add(user)
+        plain = Product(name='Stress plain', price=10, stock=stock, description='')
+        with_variants = Product(name='Stress variants', price=20, stock=0, description='',
+                                variants=json.dumps([{'name': name, 'stock': stock} for name in VARIANTS]))
+        db.session.add_all([plain, with_variants])
+        db.session.commit()
+        if flash_sale:
+            for product in (plain, with_variants):
+                _write_shards(product.id, _stock_totals(product.stock, product.variants), app.config['FLASH_SALE_SHARDS'])
+            db.session.commit()
+        targets = [(plain.id, '')] + [(with_variants.id, name) for name in VARIANTS]
+        db.session.remove()
+        # 不把主进程的连接带进子进程
+        db.engine.dispose()
+    return {target: stock for target in targets}
+
+def current_stock(targets):
+    """Remaining stock per (product_id, variant), from the shards for flash-sale products"""
+    with app.app_context():
+        remaining = {}
+        for product_id, variant in targets:
+            shards = StockShard.query.filter_by(product_id=product_id, variant=variant).all()
+            if shards:
+                remaining[(product_id, variant)] = sum(shard.quantity for shard in shards)
+                continue
+            product = db.session.get(Product, product_id)
+            remaining[(product_id, variant)] = _stock_totals(product.stock, product.variants)[variant]
+        sold = Counter()
+        for order in Order.query.all():
+            sold[(order.product_id, order.variant or '')] += order.quantity
+        db.session.remove()
+    return remaining, sold
+
+def worker(index, targets, duration, start, results):
+    """One simulated Gunicorn worker: add to cart and submit orders in a loop until the deadline"""
+    with app.app_context():
+        db.engine.dispose(close=False)
+        write_seconds = [0.0]
+
+        # SQLite 在第一条写语句处获取写锁，等待锁的时间计入写语句耗时
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info['stress_started'] = time.perf_counter()
+
+        @event.listens_for(db.engine, 'after_cursor_execute')
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+                write_seconds[0] += time.perf_counter() - conn.info.pop('stress_started', time.perf_counter())
+
+    app.logger.setLevel(logging.CRITICAL)
+    client = app.test_client()
+    client.post('/login', data={'username': f'stress{index}', 'password': 'stress'})
+    rng = random.Random(index)
+    outcomes = Counter()
+    sold = Counter()
+    latencies = []
+
+    start.wait()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        product_id, variant = rng.choice(targets)
+        quantity = rng.randint(1, 2)
+        started = time.perf_counter()
+        response = client.post('/add_to_cart', json={'product_id': product_id, 'quantity': quantity, 'variant': variant})
+        body = response.get_json(silent=True) or {}
+        if response.status_code >= 500:
+            outcomes['locked' if 'locked' in response.get_data(as_text=True) else 'error'] += 1
+            continue
+        if not body.get('success'):
+            outcomes['out_of_stock'] += 1
+            continue
+        response = client.post('/submit_order', json={'contact_info': f'stress{index}'})
+        body = response.get_json(silent=True) or {}
+        if body.get('success'):
+            outcomes['checkout'] += 1
+            sold[(product_id, variant)] += quantity
+            latencies.append(time.perf_counter() - started)
+            continue
+        if response.status_code >= 500:
+            outcomes['locked' if 'locked' in str(body.get('message', '')) else 'error'] += 1
+        else:
+            outcomes['out_of_stock'] += 1
+        # 放弃这次购物车，释放预留库存
+        client.post('/clear_cart')
+
+    shutdown_password_pool()
+    results.put({'outcomes': outcomes, 'sold': sold, 'latencies': latencies, 'write_seconds': write_seconds[0]})
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def run_round(workers, args):
+    initial = seed(workers, args.stock, args.flash_sale)
+    targets = list(initial)
+    context = multiprocessing.get_context('fork')
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(i, targets, args.duration, start, results)) for i in range(workers)]
+    for process in processes:
+        process.start()
+    # 等待所有进程登录完成后同时开始
+    time.sleep(1)
+    start.set()
+    began = time.monotonic()
+    reports = [results.get() for _ in processes]
+    elapsed = time.monotonic() - began
+    for process in processes:
+        process.join()
+
+    outcomes = Counter()
+    client_sold = Counter()
+    latencies = []
+    write_seconds = 0.0
+    for report in reports:
+        outcomes.update(report['outcomes'])
+        client_sold.update(report['sold'])
+        latencies.extend(report['latencies'])
+        write_seconds += report['write_seconds']
+
+    remaining, db_sold = current_stock(targets)
+    violations = []
+    for target in targets:
+        label = f"商品 {target[0]}{'/' + target[1] if target[1] else ''}"
+        delta = initial[target] - remaining[target]
+        if remaining[target] < 0:
+            violations.append(f"{label} 库存为负: {remaining[target]}")
+        if db_sold[target] != delta:
+            violations.append(f"{label} 已售 {db_sold[target]} 件，但库存只减少了 {delta} 件")
+        if client_sold[target] != db_sold[target]:
+            violations.append(f"{label} 客户端确认售出 {client_sold[target]} 件，数据库中为 {db_sold[target]} 件")
+
+    checkouts = outcomes['checkout']
+    return {
+        'workers': workers,
+        'checkouts': checkouts,
+        'per_second': checkouts / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'write_ms': write_seconds * 1000 / max(checkouts, 1),
+        'locked': outcomes['locked'],
+        'errors': outcomes['error'],
+        'out_of_stock': outcomes['out_of_stock'],
+        'sold_out': all(remaining[target] == 0 for target in targets),
+        'violations': violations,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程下单并发压力测试')
+    parser.add_argument('--workers', default='1,2,4,8', help='依次测试的进程数，逗号分隔（默认 1,2,4,8）')
+    parser.add_argument('--duration', type=float, default=10, help='每轮持续秒数（默认 10）')
+    parser.add_argument('--stock', type=int, default=300, help='每个商品/规格的初始库存（默认 300，售罄后继续检查超卖）')
+    parser.add_argument('--flash-sale', action='store_true', help='商品使用闪购库存分片')
+    args = parser.parse_args()
+
+    try:
+        rounds = []
+        for workers in [int(n) for n in args.workers.split(',')]:
+            print(f"正在测试 {workers} 个进程（{args.duration:g} 秒）...")
+            rounds.append(run_round(workers, args))
+
+        print(f"\n{'进程':>4} {'成功下单':>8} {'下单/秒':>8} {'p50 ms':>8} {'p95 ms':>8} {'写语句 ms/单':>12} "
+              f"{'locked':>7} {'其他错误':>8} {'库存不足':>8} {'不变量':>6}")
+        for r in rounds:
+            print(f"{r['workers']:>4} {r['checkouts']:>8} {r['per_second']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+                  f"{r['write_ms']:>12.1f} {r['locked']:>7} {r['errors']:>8} {r['out_of_stock']:>8} "
+                  f"{'✅' if not r['violations'] else '❌':>6}{'（已售罄）' if r['sold_out'] else ''}")
+
+        failed = [r for r in rounds if r['violations']]
+        for r in failed:
+            print(f"\n❌ {r['workers']} 个进程时不变量被破坏:")
+            for violation in r['violations']:
+                print(f"   {violation}")
+        if failed:
+            sys.exit(1)
+        print("\n✅ 所有轮次的不变量均成立")
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(_db_file.name + suffix):
+                os.remove(_db_file.name + suffix)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+脚本：清理过期的库存预留
+- 过期预留在库存计算中已被忽略，此脚本只负责分批删除，保持预留表精简
+- 单次执行: python sweep_reservations.py
+- 常驻执行: python sweep_reservations.py --interval 60
+"""
+
+import argparse
+import time
+
+from app import app
+from shop.extensions import db
+from shop.inventory import sweep_expired_reservations
+
+def main():
+    parser = argparse.ArgumentParser(description='清理过期的库存预留')
+    parser.add_argument('--batch-size', type=int, default=1000, help='每批删除的预留数（默认 1000）')
+    parser.add_argument('--interval', type=int, default=0, help='常驻模式下两次清理的间隔秒数（默认 0 表示只执行一次）')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        db.create_all()
+        while True:
+            removed = sweep_expired_reservations(batch_size=args.batch_size)
+            print(f"✅ 已清理 {removed} 条过期库存预留")
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()